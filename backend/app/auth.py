@@ -54,7 +54,7 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> models.User:
@@ -0,0 +1,78 @@
+"""
+دریافت دسته‌ای با ?ids= و embed کردن اسلایدرها با ?expand=slider
+
+به جای یک درخواست `/api/sliders/{id}` برای هر کارت، لیست‌ها می‌توانند
+همه اسلایدرهای ارجاع شده را با یک کوئری IN بخوانند و در فیلد `slider`
+هر آیتم قرار دهند.
+"""
+from typing import List, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app import models, schemas, serialization
+
+MAX_IDS = 100
+EXPANDABLE = {"slider"}
+
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    """'1,2,3' -> [1, 2, 3] (بدون تکرار و با حفظ ترتیب)؛ مقدار نامعتبر خطای 400"""
+    if ids is None:
+        return None
+    try:
+        values = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="پارامتر ids باید لیستی از اعداد باشد")
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise HTTPException(status_code=400, detail="پارامتر ids خالی است")
+    if len(values) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"حداکثر {MAX_IDS} شناسه در هر درخواست مجاز است")
+    return values
+
+
+def parse_expand(expand: Optional[str]) -> Set[str]:
+    if not expand:
+        return set()
+    values = {value.strip() for value in expand.split(",") if value.strip()}
+    unknown = values - EXPANDABLE
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"expand نامعتبر: {', '.join(sorted(unknown))}")
+    return values
+
+
+def in_order(rows: list, ids: List[int]) -> list:
+    """ردیف‌ها به ترتیب ids درخواست (شناسه‌های ناموجود حذف می‌شوند)"""
+    by_id = {row.id: row for row in rows}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+
+# ============= expand=slider =============
+
+def _slider_query(items: list):
+    slider_ids = sorted({item["slider_id"] for item in items if item.get("slider_id")})
+    if not slider_ids:
+        return None
+    return select(models.Slider).where(models.Slider.id.in_(slider_ids))
+
+
+def _attach(items: list, sliders: list) -> list:
+    by_id = {slider["id"]: slider for slider in serialization.dump_list(schemas.Slider, sliders)}
+    for item in items:
+        item["slider"] = by_id.get(item.get("slider_id"))
+    return items
+
+
+def embed_sliders(db, items: list) -> list:
+    """افزودن فیلد slider به آیتم‌های serialize شده (Session همگام)"""
+    query = _slider_query(items)
+    sliders = db.execute(query).scalars().all() if query is not None else []
+    return _attach(items, sliders)
+
+
+async def embed_sliders_async(db, items: list) -> list:
+    """افزودن فیلد slider به آیتم‌های serialize شده (AsyncSession)"""
+    query = _slider_query(items)
+    sliders = (await db.execute(query)).scalars().all() if query is not None else []
+    return _attach(items, sliders)
@@ -0,0 +1,370 @@
+"""
+ورود و خروج دسته‌ای NDJSON / CSV برای موجودیت‌های محتوایی
+
+ENTITIES همه مدل‌های محتوایی models.py را با schema ساخت (…Create) و کلید
+طبیعی‌شان ثبت می‌کند. جداول بازدید، dictionaryها و rollupها اینجا نیستند؛
+بازدیدها خروجی خودشان را در app/exports.py دارند و بقیه از روی آن‌ها
+ساخته می‌شوند.
+
+خروجی: همه ستون‌های جدول (به جز hashed_password کاربران) به ترتیب id با
+همان cursor سمت سرور و رمزگذاری app/exports.py؛ پس خروجی هر موجودیت
+بدون تغییر دوباره قابل ورود است، به جز کاربران که برای ورود ستون password
+لازم دارند.
+
+ورود:
+- رکوردها دسته به دسته (BULK_IMPORT_BATCH_SIZE) خوانده و هر رکورد با
+  schema ساخت موجودیت (به همراه id و ستون‌های وضعیت مثل approved / read /
+  views / created_at) اعتبارسنجی می‌شود؛ رکورد نامعتبر با شماره ردیف و
+  خطاهای هر فیلد در گزارش می‌آید و بقیه دسته ادامه می‌دهند
+- upsert با کلید طبیعی (name اسلایدر، email خبرنامه و کاربر، key تنظیمات)
+  و برای بقیه با id؛ رکورد بدون کلید درج می‌شود. هر دسته با یک
+  executemany (INSERT … ON CONFLICT DO UPDATE) نوشته می‌شود و در به‌روزرسانی
+  فقط فیلدهایی که در رکورد آمده‌اند تغییر می‌کنند. با کلید طبیعی id ردیف
+  موجود هیچ‌وقت عوض نمی‌شود (کلیدهای خارجی مثل slider_id به آن اشاره
+  دارند)؛ id فایل فقط در درج ردیف جدید به کار می‌رود
+- اگر نوشتن یک دسته خطای دیتابیس بدهد، دسته ردیف به ردیف تکرار می‌شود تا
+  فقط ردیف‌های مشکل‌دار در گزارش خطا بیایند
+- در CSV خانه خالی یعنی مقدار داده نشده، ستون‌های JSON (tags و …) متن JSON
+  هستند و پیشوند ' خنثی‌سازی فرمول خروجی برداشته می‌شود؛ ورودی gzip از روی
+  امضای فایل تشخیص داده می‌شود؛ فایل خراب ورود را از همان‌جا متوقف می‌کند
+  (aborted در گزارش) و ردیف‌های خوانده شده تا آن‌جا ثبت می‌مانند
+- رمز کاربران (password) هنگام ورود hash می‌شود
+- بعد از ورود، کش‌های جدول باطل و ایندکس جستجوی مقالات / گالری دوباره
+  ساخته می‌شود. cache.invalidate فقط کش‌های همین پروسه را باطل می‌کند؛ در
+  ورود از bulk_cli.py کش پاسخ‌ها، شمارش‌ها، ETagها و snapshot داشبورد در
+  سرور در حال اجرا تا پایان TTL خودشان (تا COUNT_CACHE_TTL_SECONDS) کهنه
+  می‌مانند. اگر باید فوراً دیده شود، ورود را از /api/admin/bulk انجام دهید
+  یا سرور را ری‌استارت کنید
+"""
+import csv
+import gzip
+import io
+from datetime import datetime
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import orjson
+from pydantic import ValidationError, create_model
+from sqlalchemy import JSON, func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app import auth, cache, exports, models, schemas, search, visit_dictionary
+from app.config import settings
+
+FORMATS = exports.FORMATS
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Entity(NamedTuple):
+    model: type
+    schema: type
+    # ستون upsert؛ باید unique یا کلید اصلی باشد
+    key: str = "id"
+    # ستون‌های مدل خارج از schema ساخت که در ورود پذیرفته می‌شوند
+    extra: tuple = ("created_at",)
+    # ستون‌هایی که خروجی گرفته نمی‌شوند
+    hidden: tuple = ()
+    # تبدیل مقادیر معتبر پیش از نوشتن (values، fields)
+    prepare: Optional[Callable] = None
+
+
+def _hash_password(values: dict, fields: set):
+    values["hashed_password"] = auth.get_password_hash(values.pop("password"))
+    fields.discard("password")
+    fields.add("hashed_password")
+
+
+ENTITIES = {
+    "articles": Entity(models.Article, schemas.ArticleCreate, extra=("views", "created_at")),
+    "gallery": Entity(models.GalleryItem, schemas.GalleryItemCreate, extra=("views", "comments", "created_at")),
+    "testimonials": Entity(models.Testimonial, schemas.TestimonialCreate, extra=("approved", "created_at")),
+    "certificates": Entity(models.Certificate, schemas.CertificateCreate),
+    "statistics": Entity(models.Statistic, schemas.StatisticCreate, extra=()),
+    "contacts": Entity(models.Contact, schemas.ContactCreate, extra=("read", "created_at")),
+    "newsletter": Entity(models.Newsletter, schemas.NewsletterCreate, key="email", extra=("active", "created_at")),
+    "services": Entity(models.Service, schemas.ServiceCreate),
+    "sliders": Entity(models.Slider, schemas.SliderCreate, key="name"),
+    "videos": Entity(models.Video, schemas.VideoCreate, extra=("views", "created_at")),
+    "settings": Entity(models.Settings, schemas.SettingsCreate, key="key", extra=()),
+    "users": Entity(models.User, schemas.UserCreate, key="email", hidden=("hashed_password",),
+                    prepare=_hash_password),
+}
+
+_import_schemas: dict = {}
+
+
+def columns(name: str) -> tuple:
+    entity = ENTITIES[name]
+    return tuple(column.name for column in entity.model.__table__.columns if column.name not in entity.hidden)
+
+
+def describe() -> list:
+    return [{"entity": name, "key": entity.key, "columns": columns(name)} for name, entity in ENTITIES.items()]
+
+
+def import_schema(name: str):
+    """schema ساخت موجودیت به همراه id و ستون‌های extra (همه اختیاری)"""
+    if name not in _import_schemas:
+        entity = ENTITIES[name]
+        table = entity.model.__table__
+        fields = {"id": (Optional[int], None)}
+        for column in entity.extra:
+            fields[column] = (Optional[table.c[column].type.python_type], None)
+        _import_schemas[name] = create_model(f"{entity.schema.__name__}Import", __base__=entity.schema, **fields)
+    return _import_schemas[name]
+
+
+# ============= Export =============
+
+def export(name: str, db_engine, fmt: str = "ndjson", compress: bool = False,
+           batch_size: int = None) -> Iterator[bytes]:
+    """خروجی همه ردیف‌های یک موجودیت به صورت تکه‌های بایت"""
+    model = ENTITIES[name].model
+    names = columns(name)
+    query = select(*(model.__table__.c[column] for column in names)).order_by(model.__table__.c.id)
+    batches = exports.stream_query(db_engine, query, batch_size or settings.EXPORT_BATCH_SIZE)
+    return exports.encode(names, batches, fmt, compress)
+
+
+def filename(name: str, fmt: str, compress: bool = False) -> str:
+    return f"{name}-{datetime.utcnow():%Y%m%d}.{fmt}" + (".gz" if compress else "")
+
+
+# ============= Parsing =============
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for extension, fmt in EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return None
+
+
+def _open_text(raw) -> io.TextIOWrapper:
+    """فایل باینری (ساده یا gzip) به متن UTF-8 بدون BOM"""
+    signature = raw.read(2)
+    raw.seek(0)
+    if signature == b"\x1f\x8b":
+        raw = gzip.GzipFile(fileobj=raw, mode="rb")
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+
+
+def _read_ndjson(stream) -> Iterator[tuple]:
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            yield number, ValueError(f"JSON نامعتبر: {exc}")
+            continue
+        if not isinstance(record, dict):
+            yield number, ValueError("هر خط باید یک شیء JSON باشد")
+        else:
+            yield number, record
+
+
+def _csv_cell(value: str, json_column: bool):
+    if json_column:
+        return orjson.loads(value)
+    if value[:1] == "'" and value[1:].startswith(exports.FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def _read_csv(stream, json_columns: set) -> Iterator[tuple]:
+    reader = csv.DictReader(stream)
+    for number, row in enumerate(reader, 1):
+        try:
+            yield number, {
+                field: _csv_cell(value, field in json_columns)
+                for field, value in row.items()
+                if field and value not in (None, "")
+            }
+        except orjson.JSONDecodeError as exc:
+            yield number, ValueError(f"JSON نامعتبر در ستون لیست: {exc}")
+
+
+def read_records(name: str, raw, fmt: str) -> Iterator[tuple]:
+    """(شماره ردیف، دیکشنری یا خطا) برای هر رکورد فایل"""
+    stream = _open_text(raw)
+    if fmt == "csv":
+        table = ENTITIES[name].model.__table__
+        json_columns = {column.name for column in table.columns if isinstance(column.type, JSON)}
+        return _read_csv(stream, json_columns)
+    return _read_ndjson(stream)
+
+
+# ============= Import =============
+
+def _error(report: dict, row: int, errors: list):
+    report["failed"] += 1
+    if len(report["errors"]) < settings.BULK_IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": row, "errors": errors})
+
+
+def _validate(name: str, batch: list, report: dict) -> list:
+    """(شماره ردیف، مقادیر درج، فیلدهای داده شده) برای رکوردهای معتبر"""
+    entity = ENTITIES[name]
+    schema = import_schema(name)
+    valid = []
+    for number, record in batch:
+        if isinstance(record, Exception):
+            _error(report, number, [{"field": None, "message": str(record)}])
+            continue
+        try:
+            item = schema.model_validate(record)
+        except ValidationError as exc:
+            _error(report, number, [
+                {"field": ".".join(str(part) for part in error["loc"]) or None, "message": error["msg"]}
+                for error in exc.errors()
+            ])
+            continue
+        # فیلدهای schema ساخت با مقدار پیش‌فرض در درج؛ id و extra فقط اگر با مقدار داده شده باشند
+        skipped = {column for column in ("id", *entity.extra) if getattr(item, column) is None}
+        fields = set(item.model_fields_set) - skipped
+        values = item.model_dump(exclude=skipped)
+        if entity.prepare:
+            entity.prepare(values, fields)
+        valid.append((number, values, fields))
+    return valid
+
+
+def _statement(conn, entity: Entity, fields: set):
+    table = entity.model.__table__
+    if entity.key not in fields:
+        return table.insert()
+    statement = visit_dictionary.dialect_insert(conn, entity.model)
+    # با کلید طبیعی id ردیف موجود بازنویسی نمی‌شود
+    updates = {column: statement.excluded[column] for column in fields if column not in (entity.key, "id")}
+    if not updates:
+        return statement.on_conflict_do_nothing(index_elements=[entity.key])
+    if "updated_at" in table.c:
+        updates["updated_at"] = func.now()
+    return statement.on_conflict_do_update(index_elements=[entity.key], set_=updates)
+
+
+def _existing(conn, entity: Entity, keys: list) -> set:
+    if not keys:
+        return set()
+    column = entity.model.__table__.c[entity.key]
+    return set(conn.execute(select(column).where(column.in_(keys))).scalars())
+
+
+def _execute(conn, entity: Entity, fields: frozenset, rows: list, existing: set):
+    """درج / upsert؛ با کلید طبیعی ردیف‌هایی که کلیدشان هست بدون id فایل نوشته می‌شوند"""
+    if entity.key == "id" or "id" not in fields or not existing:
+        conn.execute(_statement(conn, entity, fields), rows)
+        return
+    matched = [
+        {column: value for column, value in values.items() if column != "id"}
+        for values in rows if values[entity.key] in existing
+    ]
+    fresh = [values for values in rows if values[entity.key] not in existing]
+    conn.execute(_statement(conn, entity, fields - {"id"}), matched)
+    if fresh:
+        conn.execute(_statement(conn, entity, fields), fresh)
+
+
+def _write(db_engine, name: str, valid: list, report: dict):
+    entity = ENTITIES[name]
+    # کلید تکراری در یک دسته: آخرین رکورد می‌ماند (ON CONFLICT در PostgreSQL
+    # یک ردیف را در یک دستور دو بار به‌روز نمی‌کند)
+    latest = {}
+    for position, (number, values, fields) in enumerate(valid):
+        key = values.get(entity.key) if entity.key in fields else None
+        latest[key if key is not None else ("new", position)] = (number, values, fields)
+    report["duplicates"] += len(valid) - len(latest)
+
+    groups: dict = {}
+    for number, values, fields in latest.values():
+        groups.setdefault(frozenset(fields), []).append((number, values))
+
+    with db_engine.connect() as conn:
+        for fields, rows in groups.items():
+            keyed = entity.key in fields
+            keys = [values[entity.key] for _, values in rows] if keyed else []
+            try:
+                with conn.begin():
+                    existing = _existing(conn, entity, keys)
+                    _execute(conn, entity, fields, [values for _, values in rows], existing)
+            except DBAPIError:
+                _write_rows(conn, entity, fields, rows, report)
+                continue
+            report["updated"] += len(existing)
+            report["inserted"] += len(rows) - len(existing)
+            if "id" in fields:
+                report["explicit_ids"] = True
+
+
+def _write_rows(conn, entity: Entity, fields: frozenset, rows: list, report: dict):
+    """تکرار دسته شکست خورده ردیف به ردیف برای پیدا کردن ردیف‌های مشکل‌دار"""
+    keyed = entity.key in fields
+    for number, values in rows:
+        try:
+            with conn.begin():
+                existed = keyed and bool(_existing(conn, entity, [values[entity.key]]))
+                _execute(conn, entity, fields, [values], {values[entity.key]} if existed else set())
+        except DBAPIError as exc:
+            _error(report, number, [{"field": None, "message": str(exc.orig).splitlines()[0]}])
+            continue
+        report["updated" if existed else "inserted"] += 1
+        if "id" in fields:
+            report["explicit_ids"] = True
+
+
+def _sync_sequence(db_engine, table: str):
+    """بعد از درج id صریح در PostgreSQL، sequence باید از بیشترین id جلوتر باشد"""
+    if db_engine.dialect.name != "postgresql":
+        return
+    with db_engine.begin() as conn:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def import_records(name: str, records: Iterator[tuple], db_engine, dry_run: bool = False,
+                   batch_size: int = None) -> dict:
+    """ورود رکوردها (خروجی read_records) و گزارش نتیجه"""
+    table = ENTITIES[name].model.__table__.name
+    batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+    report = {"entity": name, "dry_run": dry_run, "rows": 0, "valid": 0, "inserted": 0, "updated": 0,
+              "duplicates": 0, "failed": 0, "aborted": None, "errors": []}
+
+    def flush(batch: list):
+        report["rows"] += len(batch)
+        valid = _validate(name, batch, report)
+        report["valid"] += len(valid)
+        if valid and not dry_run:
+            _write(db_engine, name, valid, report)
+
+    batch = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+    except (UnicodeDecodeError, OSError, EOFError, csv.Error) as exc:
+        # دسته‌های قبلی ثبت شده‌اند؛ ردیف‌های خوانده شده همین دسته هم ثبت می‌شوند
+        report["aborted"] = f"فایل از ردیف {report['rows'] + len(batch) + 1} قابل خواندن نیست: {exc}"
+    if batch:
+        flush(batch)
+
+    if report.pop("explicit_ids", False):
+        _sync_sequence(db_engine, table)
+    if report["inserted"] or report["updated"]:
+        cache.invalidate({table})
+        if search.backend is not None and table in search.SOURCES:
+            with Session(bind=db_engine) as session:
+                search.rebuild_index(session, table)
+                session.commit()
+    return report
+
+
+def import_file(name: str, raw, fmt: str, db_engine, dry_run: bool = False, batch_size: int = None) -> dict:
+    """ورود یک فایل باینری NDJSON / CSV (ساده یا gzip)"""
+    return import_records(name, read_records(name, raw, fmt), db_engine, dry_run=dry_run, batch_size=batch_size)
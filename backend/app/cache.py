@@ -0,0 +1,131 @@
+"""
+کش‌های درون‌پردازشی و invalidation بر اساس نوشتن در دیتابیس
+
+هر commit یک Session (همگام یا async) نام جداولی را که در آن ردیف
+اضافه، ویرایش یا حذف شده به شنونده‌های ثبت شده اعلام می‌کند؛ بنابراین
+نوشتن‌های admin.py و روترها بدون فراخوانی دستی کش‌ها را باطل می‌کنند.
+کش‌ها per-process هستند و در حالت چند worker، TTL حداکثر کهنگی را
+محدود می‌کند.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+
+class TTLCache:
+    """کش LRU با انقضای زمانی، امن برای چند thread"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """حذف کلیدهایی که predicate برایشان True است"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+# ============= Invalidation bus =============
+
+_listeners: List[Callable[[set], None]] = []
+
+
+def on_invalidate(callback: Callable[[set], None]) -> Callable[[set], None]:
+    """ثبت تابعی که با مجموعه نام جداول تغییر کرده صدا زده می‌شود"""
+    _listeners.append(callback)
+    return callback
+
+
+def invalidate(tables: Iterable[str]):
+    """اعلام تغییر جداول به همه کش‌ها"""
+    tables = set(tables)
+    if not tables:
+        return
+    for callback in _listeners:
+        try:
+            callback(tables)
+        except Exception as exc:
+            print("cache invalidation error", exc)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_touched_tables(session, flush_context):
+    touched = session.info.setdefault("touched_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            touched.add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    touched = session.info.pop("touched_tables", None)
+    if touched:
+        invalidate(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("touched_tables", None)
+
+
+# ============= Total count cache =============
+
+count_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_MAX_ENTRIES,
+    ttl=settings.COUNT_CACHE_TTL_SECONDS,
+)
+
+
+def count_key(table: str, category: Optional[str], search: Optional[str]) -> tuple:
+    """کلید کش تعداد: (جدول، دسته‌بندی، عبارت جستجو)"""
+    if category == "همه":
+        category = None
+    search = " ".join(search.split()).lower() if search else None
+    return (table, category or None, search)
+
+
+@on_invalidate
+def _invalidate_counts(tables: set):
+    count_cache.invalidate(lambda key: key[0] in tables)
@@ -0,0 +1,189 @@
+"""
+درخواست‌های شرطی (ETag / Last-Modified)
+
+- لیست‌ها: ETag از max(coalesce(updated_at, created_at))، تعداد ردیف‌ها
+  و پارامترهای query ساخته می‌شود (برای مرتب‌سازی popular/trending مجموع
+  بازدیدها هم در آن حساب می‌شود). این aggregate روی همان فیلترهای لیست
+  و پیش از خواندن ردیف‌ها اجرا و تا invalidation جدول cache می‌شود.
+- جزئیات: ETag از id و updated_at/created_at همان ردیف. افزایش بازدید
+  updated_at را تغییر نمی‌دهد، پس صفحه جزئیات هم 304 می‌گیرد.
+
+در صورت تطابق If-None-Match (یا If-Modified-Since) پاسخ 304 بدون
+serialize کردن ردیف‌ها برگردانده می‌شود.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, null, select
+
+from app.cache import TTLCache, on_invalidate
+from app.config import settings
+
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[datetime]
+
+
+validator_cache = TTLCache(
+    maxsize=settings.COUNT_CACHE_MAX_ENTRIES,
+    ttl=settings.COUNT_CACHE_TTL_SECONDS,
+)
+
+
+@on_invalidate
+def _invalidate_validators(tables: set):
+    validator_cache.invalidate(lambda key: key[0] in tables)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite تاریخ‌ها را بدون منطقه زمانی (UTC) برمی‌گرداند
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _build(parts: tuple, last_modified) -> Validators:
+    if last_modified is not None:
+        last_modified = _as_utc(last_modified)
+    return Validators(_make_etag(*parts), last_modified)
+
+
+# ============= Lists =============
+
+def _stamp(columns):
+    if "updated_at" in columns and "created_at" in columns:
+        return func.coalesce(columns.updated_at, columns.created_at)
+    if "updated_at" in columns:
+        return columns.updated_at
+    if "created_at" in columns:
+        return columns.created_at
+    return null()
+
+
+def aggregate(query, sort: Optional[str] = None):
+    """aggregate نسخه لیست روی فیلترهای همان query (بدون order/limit)"""
+    subquery = query.order_by(None).subquery()
+    columns = [func.max(_stamp(subquery.c)), func.count()]
+    if sort in ("popular", "trending") and "views" in subquery.c:
+        columns.append(func.coalesce(func.sum(subquery.c.views), 0))
+    return select(*columns).select_from(subquery)
+
+
+def list_key(table: str, request: Request) -> tuple:
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if v != "")
+    return (table, request.url.path, tuple(params))
+
+
+def _list_validators(key: tuple, row) -> Validators:
+    last_modified = row[0]
+    if isinstance(last_modified, str):
+        last_modified = datetime.fromisoformat(last_modified)
+    validators = _build((key, last_modified, *row[1:]), last_modified)
+    validator_cache.set(key, validators)
+    return validators
+
+
+def list_validators(db, table: str, query, request: Request, sort: Optional[str] = None) -> Validators:
+    """ETag/Last-Modified لیست برای Session همگام"""
+    key = list_key(table, request)
+    validators = validator_cache.get(key)
+    if validators is None:
+        validators = _list_validators(key, db.execute(aggregate(query, sort)).one())
+    return validators
+
+
+async def list_validators_async(db, table: str, query, request: Request, sort: Optional[str] = None) -> Validators:
+    """ETag/Last-Modified لیست برای AsyncSession"""
+    key = list_key(table, request)
+    validators = validator_cache.get(key)
+    if validators is None:
+        validators = _list_validators(key, (await db.execute(aggregate(query, sort))).one())
+    return validators
+
+
+def combine(*parts: Validators) -> Validators:
+    """validator پاسخی که از چند جدول ساخته شده (مثلا expand=slider)"""
+    stamps = [part.last_modified for part in parts if part.last_modified is not None]
+    return Validators(_make_etag(*(part.etag for part in parts)), max(stamps) if stamps else None)
+
+
+# ============= Details =============
+
+def stamp_columns(model) -> list:
+    """ستون‌هایی که برای validator یک ردیف خوانده می‌شوند"""
+    return [getattr(model, name) for name in ("updated_at", "created_at") if hasattr(model, name)]
+
+
+def row_validators(table: str, row_id, *stamps) -> Validators:
+    """ETag/Last-Modified یک ردیف از روی updated_at/created_at"""
+    last_modified = next((stamp for stamp in stamps if stamp is not None), None)
+    return _build((table, row_id, *stamps), last_modified)
+
+
+def object_validators(obj) -> Validators:
+    """ETag/Last-Modified یک ردیف ORM که از قبل خوانده شده"""
+    stamps = [getattr(obj, column.key) for column in stamp_columns(type(obj))]
+    return row_validators(obj.__tablename__, obj.id, *stamps)
+
+
+# ============= HTTP =============
+
+def headers(validators: Validators) -> dict:
+    result = {"ETag": validators.etag, "Cache-Control": "no-cache"}
+    if validators.last_modified is not None:
+        result["Last-Modified"] = format_datetime(validators.last_modified, usegmt=True)
+    return result
+
+
+def _weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [_weak(tag) for tag in if_none_match.split(",")]
+    return "*" in tags or _weak(etag) in tags
+
+
+def check(if_none_match: Optional[str], if_modified_since: Optional[str], validators: Validators) -> bool:
+    """If-None-Match بر If-Modified-Since مقدم است"""
+    if if_none_match is not None:
+        return etag_matches(if_none_match, validators.etag)
+
+    if not if_modified_since or validators.last_modified is None:
+        return False
+    try:
+        since = _as_utc(parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+        return False
+    return validators.last_modified.replace(microsecond=0) <= since
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    return check(request.headers.get("if-none-match"), request.headers.get("if-modified-since"), validators)
+
+
+def from_headers(etag: Optional[str], last_modified: Optional[str]) -> Optional[Validators]:
+    """بازسازی validatorها از هدرهای یک پاسخ ذخیره شده"""
+    if not etag:
+        return None
+    try:
+        modified = parsedate_to_datetime(last_modified) if last_modified else None
+    except (TypeError, ValueError):
+        modified = None
+    return Validators(etag, _as_utc(modified) if modified else None)
+
+
+def not_modified(validators: Validators) -> Response:
+    return Response(status_code=304, headers=headers(validators))
@@ -19,7 +19,82 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./bim.db"
+    # پروفایل موتور دیتابیس: auto, sqlite-wal, postgres-pooled, basic
+    DB_PROFILE: str = "auto"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    # Read replicas (خواندن‌های عمومی به صورت round-robin)
+    READ_DATABASE_URLS: Optional[List[str]] = None
+    # پس از نوشتن ادمین، خواندن‌ها تا این مدت از primary انجام می‌شود
+    READ_YOUR_WRITES_SECONDS: int = 10
     
+    # Cache
+    COUNT_CACHE_TTL_SECONDS: int = 300
+    COUNT_CACHE_MAX_ENTRIES: int = 1024
+    # کش پاسخ GETهای عمومی (تازه / stale-while-revalidate / stale-if-error)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: int = 60
+    RESPONSE_CACHE_STALE_SECONDS: int = 300
+    RESPONSE_CACHE_STALE_IF_ERROR_SECONDS: int = 3600
+    # شمارنده بازدید write-behind (فاصله flush به دیتابیس)
+    VIEW_FLUSH_INTERVAL_SECONDS: float = 5
+    # صف ثبت بازدیدها: flush هر N میلی‌ثانیه یا N رویداد، ظرفیت و سیاست صف پر (drop / reject)
+    VISIT_FLUSH_INTERVAL_MS: int = 500
+    VISIT_FLUSH_BATCH_SIZE: int = 500
+    VISIT_QUEUE_MAX_SIZE: int = 10000
+    VISIT_QUEUE_POLICY: str = "drop"
+    # دسته‌ای که با خطای غیرگذرا (نه قطع اتصال / قفل) این تعداد بار شکست بخورد ردیف به ردیف نوشته و ردیف خراب دور ریخته می‌شود
+    VISIT_FLUSH_MAX_ATTEMPTS: int = 5
+    # /api/visit/batch: حداکثر رویداد در هر درخواست و حداکثر قدمت زمان کلاینت
+    VISIT_BATCH_MAX_EVENTS: int = 200
+    VISIT_CLIENT_TS_MAX_AGE_SECONDS: int = 86400
+    # حذف بازدیدهای تکراری (ip، path) در یک پنجره زمانی؛ 0 یعنی غیرفعال
+    VISIT_DEDUPE_WINDOW_SECONDS: int = 10
+    VISIT_DEDUPE_CACHE_SIZE: int = 100000
+    # نمونه‌برداری تطبیقی بالاتر از این نرخ (بازدید در ثانیه، هر worker)؛ 0 یعنی غیرفعال
+    VISIT_SAMPLING_RATE_THRESHOLD: float = 200
+    VISIT_SAMPLING_WINDOW_SECONDS: int = 10
+    VISIT_SAMPLING_MAX_FACTOR: int = 100
+    # کش نگاشت path / referer / user agent به id جداول dictionary
+    VISIT_DICTIONARY_CACHE_SIZE: int = 50000
+    # تجمیع افزایشی بازدیدها در جداول روزانه
+    VISIT_ROLLUP_INTERVAL_SECONDS: int = 60
+    VISIT_ROLLUP_BATCH_SIZE: int = 5000
+    # شکاف در idهای visits (INSERT همزمانی که هنوز commit نشده) تا این مدت منتظر می‌ماند
+    VISIT_ID_GAP_GRACE_SECONDS: int = 60
+    # دقت sketchهای HyperLogLog بازدیدکننده یکتا (روزانه / هر مسیر)؛ خطا حدود 1.04/sqrt(2^p)
+    # تغییر آن نیاز به POST /api/admin/visits/rollup/rebuild دارد
+    HLL_PRECISION: int = 12
+    HLL_PATH_PRECISION: int = 10
+    # snapshot آمار داشبورد ادمین
+    DASHBOARD_CACHE_TTL_SECONDS: int = 30
+    # پارتیشن‌های ماهانه visits و آرشیو gzip NDJSON ماه‌های خارج از بازه نگهداری
+    VISIT_PARTITION_INTERVAL_SECONDS: int = 3600
+    VISIT_RETENTION_MONTHS: int = 6
+    VISIT_ARCHIVE_DIR: str = "./data/archive/visits"
+    VISIT_ARCHIVE_VACUUM: bool = False
+    # آرایه‌های ستونی memory-mapped برای برش‌های دلخواه گزارش بازدید
+    VISIT_ANALYTICS_DIR: str = "./data/analytics/visits"
+    # تعداد ردیف هر دسته در خروجی‌های جریانی CSV / NDJSON ادمین
+    EXPORT_BATCH_SIZE: int = 2000
+    # ورود دسته‌ای NDJSON / CSV موجودیت‌ها (app/bulk.py): رکورد در هر دسته و سقف خطاهای گزارش
+    BULK_IMPORT_BATCH_SIZE: int = 500
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    # جریان زنده بازدیدها (SSE) برای پنل ادمین؛ بافر و شمارنده‌ها در حافظه هر worker
+    VISIT_LIVE_BUFFER_SIZE: int = 200
+    VISIT_LIVE_WINDOW_MINUTES: int = 60
+    VISIT_LIVE_TICK_SECONDS: int = 5
+    VISIT_LIVE_STREAM_SECONDS: int = 60
+    VISIT_LIVE_RETRY_MS: int = 3000
+
     # Security
     SECRET_KEY: str = "bim-secret-key-change-in-production-2024"
     ALGORITHM: str = "HS256"
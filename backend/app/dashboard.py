@@ -0,0 +1,81 @@
+"""
+آمار داشبورد ادمین
+
+همه شمارش‌های داشبورد با دو کوئری ساخته می‌شوند:
+- محتوا: تعداد هر جدول به همراه پیام‌های خوانده نشده و نظرات در انتظار
+  تایید با conditional aggregation (COUNT ... FILTER) در یک SELECT
+- بازدیدها: visit_rollup.summary از جداول تجمیع روزانه
+
+نتیجه به صورت یک snapshot با TTL کوتاه (DASHBOARD_CACHE_TTL_SECONDS) نگه
+داشته می‌شود و با commit روی جداول محتوا باطل می‌شود. بازدیدها از طریق
+ORM نوشته نمی‌شوند، پس کهنگی آن‌ها حداکثر TTL به علاوه فاصله اجرای rollup است.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select, true
+
+from app import models, visit_rollup
+from app.cache import TTLCache, on_invalidate
+from app.config import settings
+
+# جدول -> مدل؛ کلید خروجی همان کلیدهای قبلی API است
+COUNTED = {
+    "articles": models.Article,
+    "gallery": models.GalleryItem,
+    "testimonials": models.Testimonial,
+    "contacts": models.Contact,
+    "sliders": models.Slider,
+    "certificates": models.Certificate,
+    "services": models.Service,
+}
+
+TABLES = frozenset(model.__tablename__ for model in COUNTED.values())
+
+snapshot_cache = TTLCache(maxsize=1, ttl=settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+
+@on_invalidate
+def _invalidate_snapshot(tables: set):
+    if not TABLES.isdisjoint(tables):
+        snapshot_cache.clear()
+
+
+def content_query():
+    """یک SELECT با یک زیرکوئری تک‌ردیفی برای هر جدول"""
+    parts = {
+        name: select(func.count().label(name)).select_from(model).subquery()
+        for name, model in COUNTED.items()
+        if name not in ("contacts", "testimonials")
+    }
+    parts["contacts"] = select(
+        func.count().label("contacts"),
+        func.count().filter(models.Contact.read == False).label("unread_contacts"),
+    ).subquery()
+    parts["testimonials"] = select(
+        func.count().label("testimonials"),
+        func.count().filter(models.Testimonial.approved == False).label("pending_testimonials"),
+    ).subquery()
+
+    subqueries = list(parts.values())
+    source = subqueries[0]
+    for subquery in subqueries[1:]:
+        source = source.join(subquery, true())
+    return select(*(column for subquery in subqueries for column in subquery.c)).select_from(source)
+
+
+def build(db) -> dict:
+    row = db.execute(content_query()).one()._mapping
+    stats = {name: row[name] for name in COUNTED}
+    stats["unread_contacts"] = row["unread_contacts"]
+    stats["pending_testimonials"] = row["pending_testimonials"]
+    stats["visits"] = visit_rollup.summary(db, datetime.utcnow().date())
+    return stats
+
+
+def snapshot(db) -> dict:
+    """snapshot کش شده؛ در صورت نبود با دو کوئری ساخته می‌شود"""
+    stats = snapshot_cache.get("stats")
+    if stats is None:
+        stats = build(db)
+        snapshot_cache.set("stats", stats)
+    return stats
@@ -1,20 +1,209 @@
-from sqlalchemy import create_engine, text
+from fastapi import Request
+from sqlalchemy import create_engine, event, exc, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.config import settings
+from typing import Optional
+import hashlib
+import itertools
+import threading
+import weakref
 import time
 import sys
 
 
+# ============= Engine profiles =============
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool که زمان انتظار برای گرفتن connection را اندازه می‌گیرد"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.wait_count = self.wait_count
+        new_pool.wait_total = self.wait_total
+        new_pool.wait_max = self.wait_max
+        new_pool.timeouts = self.timeouts
+        return new_pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.wait_count += 1
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+
+
+def resolve_profile(url: str, profile: str) -> str:
+    """تعیین پروفایل موتور بر اساس DB_PROFILE و نوع DATABASE_URL"""
+    if profile != "auto":
+        return profile
+    if url.startswith("sqlite"):
+        return "basic" if ":memory:" in url or url.rstrip("/") == "sqlite:" else "sqlite-wal"
+    if url.startswith("postgresql"):
+        return "postgres-pooled"
+    return "basic"
+
+
+def engine_options(url: str, profile: str) -> dict:
+    """آرگومان‌های create_engine برای هر پروفایل"""
+    is_sqlite = url.startswith("sqlite")
+    connect_args = {"check_same_thread": False} if is_sqlite else {}
+
+    if profile == "sqlite-wal":
+        connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        return {
+            "connect_args": connect_args,
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        }
+
+    if profile == "postgres-pooled":
+        return {
+            "connect_args": connect_args,
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+
+    return {"connect_args": connect_args}
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """اعمال PRAGMAهای WAL روی هر connection جدید SQLite"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        # مقدار منفی یعنی اندازه بر حسب KiB
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    finally:
+        cursor.close()
+
+
+# پروفایل اعمال‌شده روی هر engine
+ENGINE_PROFILES = weakref.WeakKeyDictionary()
+
+
+def build_engine(url: str, profile: str = None):
+    """ساخت engine با پروفایل مناسب"""
+    profile = resolve_profile(url, profile or settings.DB_PROFILE)
+    db_engine = create_engine(url, **engine_options(url, profile))
+    if profile == "sqlite-wal":
+        event.listen(db_engine, "connect", apply_sqlite_pragmas)
+    ENGINE_PROFILES[db_engine] = profile
+    return db_engine
+
+
+# درایورهای async متناظر با هر دیتابیس
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """تبدیل DATABASE_URL به آدرس درایور async (aiosqlite / asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def build_async_engine(url: str, profile: str = None):
+    """ساخت async engine با همان پروفایل engine همگام"""
+    profile = resolve_profile(url, profile or settings.DB_PROFILE)
+    options = engine_options(url, profile)
+    if options.pop("poolclass", None) is not None:
+        options["poolclass"] = AsyncAdaptedQueuePool
+    db_engine = create_async_engine(to_async_url(url), **options)
+    if profile == "sqlite-wal":
+        event.listen(db_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    ENGINE_PROFILES[db_engine.sync_engine] = profile
+    return db_engine
+
+
+def get_pool_stats(db_engine=None) -> dict:
+    """آمار pool برای تعیین اندازه مناسب آن"""
+    db_engine = db_engine or engine
+    pool = db_engine.pool
+    stats = {
+        "profile": ENGINE_PROFILES.get(db_engine),
+        "pool_class": type(pool).__name__,
+        "status": pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "checkouts": pool.wait_count,
+            "timeouts": pool.timeouts,
+            "wait_avg_ms": round(pool.wait_total / pool.wait_count * 1000, 3) if pool.wait_count else 0.0,
+            "wait_max_ms": round(pool.wait_max * 1000, 3),
+        })
+    return stats
+
+
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = build_engine(settings.DATABASE_URL)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine برای روت‌های async (خواندن‌های عمومی)
+async_engine = build_async_engine(settings.DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+# Read replicas
+read_engines = [build_engine(url) for url in settings.READ_DATABASE_URLS or []]
+read_async_engines = [build_async_engine(url) for url in settings.READ_DATABASE_URLS or []]
+_read_sessions = itertools.cycle([
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+] or [SessionLocal])
+_async_read_sessions = itertools.cycle([
+    async_sessionmaker(read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    for read_engine in read_async_engines
+] or [AsyncSessionLocal])
+
+# کلید کاربر -> زمان پایان چسبندگی به primary (read-your-writes)
+_primary_sticky = {}
+_sticky_lock = threading.Lock()
+
 # Create Base class
 Base = declarative_base()
 
@@ -28,6 +217,64 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency برای دریافت AsyncSession (بدون بلاک کردن event loop)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def sticky_key(authorization: Optional[str]) -> Optional[str]:
+    """کلید چسبندگی بر اساس توکن Authorization (بدون نگهداری خود توکن)"""
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def mark_primary_sticky(authorization: Optional[str]):
+    """ثبت نوشتن کاربر تا خواندن‌های بعدی او مدتی از primary انجام شود"""
+    key = sticky_key(authorization)
+    if key is None or not read_engines:
+        return
+    now = time.monotonic()
+    with _sticky_lock:
+        _primary_sticky[key] = now + settings.READ_YOUR_WRITES_SECONDS
+        # پاک‌سازی کلیدهای منقضی شده
+        for expired in [k for k, until in _primary_sticky.items() if until < now]:
+            del _primary_sticky[expired]
+
+
+def is_primary_sticky(authorization: Optional[str]) -> bool:
+    key = sticky_key(authorization)
+    if key is None:
+        return False
+    with _sticky_lock:
+        until = _primary_sticky.get(key)
+    return until is not None and until >= time.monotonic()
+
+
+def get_read_db(request: Request):
+    """Dependency برای روت‌های فقط-خواندنی: replica به صورت round-robin"""
+    if is_primary_sticky(request.headers.get("authorization")):
+        factory = SessionLocal
+    else:
+        factory = next(_read_sessions)
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    """نسخه async از get_read_db"""
+    if is_primary_sticky(request.headers.get("authorization")):
+        factory = AsyncSessionLocal
+    else:
+        factory = next(_async_read_sessions)
+    async with factory() as db:
+        yield db
+
+
 def init_db(retries: int = 5, delay: int = 3):
     """ایجاد جداول در دیتابیس
 
@@ -37,6 +284,8 @@ def init_db(retries: int = 5, delay: int = 3):
     # If using SQLite just create tables immediately
     if "sqlite" in settings.DATABASE_URL:
         Base.metadata.create_all(bind=engine)
+        create_missing_columns()
+        create_missing_indexes()
         return
 
     # For other DBs (Postgres) attempt to connect before creating tables
@@ -53,3 +302,29 @@ def init_db(retries: int = 5, delay: int = 3):
             time.sleep(delay)
 
     Base.metadata.create_all(bind=engine)
+    create_missing_columns()
+    create_missing_indexes()
+
+
+def create_missing_columns():
+    """create_all ستون جدید به جداول موجود اضافه نمی‌کند؛ ستون‌های nullable جدید اینجا اضافه می‌شوند"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.primary_key or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+
+def create_missing_indexes():
+    """create_all روی جداول موجود ایندکس نمی‌سازد؛ ایندکس‌های جدید اینجا ساخته می‌شوند"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
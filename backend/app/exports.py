@@ -0,0 +1,199 @@
+"""
+خروجی جریانی CSV / NDJSON برای بازدیدها، پیام‌های تماس و مشترکین خبرنامه
+
+هر خروجی با یک اتصال جداگانه و cursor سمت سرور (stream_results و
+yield_per با EXPORT_BATCH_SIZE ردیف) خوانده و دسته به دسته به بایت تبدیل
+می‌شود؛ StreamingResponse هر دسته را همان موقع می‌فرستد، پس حافظه مستقل
+از تعداد ردیف‌هاست. اتصال Session روت پیش از ارسال بدنه بسته می‌شود و
+generator اتصال خودش را روی همان engine (primary یا replica) باز می‌کند.
+
+- فیلتر بازه تاریخ روی created_at (روزهای start و end شامل)
+- بازدیدها از آرشیوهای gzip، جداول ماهانه و جدول visits (به همین ترتیب) با
+  رشته‌های path / referer / user agent و weight نمونه‌برداری؛ منابع خارج
+  از بازه بر اساس ماهشان اصلا خوانده نمی‌شوند
+- CSV با BOM (برای نمایش درست فارسی در Excel) و خنثی کردن فرمول‌ها در
+  مقادیر متنی (= + - @ در ابتدای مقدار)؛ لیست‌ها و دیکشنری‌ها به صورت JSON
+- gzip=True: فشرده‌سازی همزمان با zlib و خروجی .gz
+"""
+import csv
+import io
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import select
+
+from app import models, visit_dictionary, visit_partitions
+from app.config import settings
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# همان ترتیب visit_dictionary.decoded_select و رکوردهای آرشیو
+VISIT_COLUMNS = ("id", "path", "ip", "user_agent", "referer", "weight", "client_ts", "created_at")
+CONTACT_COLUMNS = ("id", "created_at", "name", "email", "subject", "message", "read")
+NEWSLETTER_COLUMNS = ("id", "created_at", "email", "active")
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _bounds(start: Optional[date], end: Optional[date]) -> tuple:
+    low = datetime(start.year, start.month, start.day) if start else None
+    high = datetime(end.year, end.month, end.day) + timedelta(days=1) if end else None
+    return low, high
+
+
+def _naive(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _in_range(value, low: Optional[datetime], high: Optional[datetime]) -> bool:
+    value = _naive(value)
+    if value is None:
+        return low is None and high is None
+    return (low is None or value >= low) and (high is None or value < high)
+
+
+def stream_query(db_engine, query, batch_size: int) -> Iterator[list]:
+    """ردیف‌های یک کوئری دسته به دسته با cursor سمت سرور"""
+    with db_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+
+def _where_created(query, column, low: Optional[datetime], high: Optional[datetime]):
+    if low is not None:
+        query = query.where(column >= low)
+    if high is not None:
+        query = query.where(column < high)
+    return query
+
+
+# ============= Datasets =============
+
+def _month_overlaps(month: datetime, low: Optional[datetime], high: Optional[datetime]) -> bool:
+    return (high is None or month < high) and (low is None or visit_partitions.add_months(month, 1) > low)
+
+
+def _visit_table_query(table, low, high):
+    query = visit_dictionary.decoded_select(table).order_by(table.c.id)
+    return _where_created(query, table.c.created_at, low, high)
+
+
+def visits(db_engine, low, high, batch_size: int, **_) -> Iterator[list]:
+    """آرشیوها، جداول ماهانه و جدول visits در بازه"""
+    for path in visit_partitions.archive_files():
+        match = visit_partitions.ARCHIVE_FILE.match(path.name)
+        if not _month_overlaps(datetime(int(match.group(1)), int(match.group(2)), 1), low, high):
+            continue
+        batch = []
+        for record in visit_partitions.iter_archive(path):
+            if _in_range(record.get("created_at"), low, high):
+                batch.append(tuple(record.get(column) for column in VISIT_COLUMNS))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    for month, name in visit_partitions.month_tables(db_engine):
+        if _month_overlaps(month, low, high):
+            table = visit_partitions.month_table(name)
+            yield from stream_query(db_engine, _visit_table_query(table, low, high), batch_size)
+
+    yield from stream_query(db_engine, _visit_table_query(visit_partitions.visits, low, high), batch_size)
+
+
+def contacts(db_engine, low, high, batch_size: int, read: Optional[bool] = None, **_) -> Iterator[list]:
+    contact = models.Contact
+    query = select(*(getattr(contact, column) for column in CONTACT_COLUMNS)).order_by(contact.id)
+    if read is not None:
+        query = query.where(contact.read == read)
+    yield from stream_query(db_engine, _where_created(query, contact.created_at, low, high), batch_size)
+
+
+def newsletter(db_engine, low, high, batch_size: int, active: Optional[bool] = None, **_) -> Iterator[list]:
+    subscriber = models.Newsletter
+    query = select(*(getattr(subscriber, column) for column in NEWSLETTER_COLUMNS)).order_by(subscriber.id)
+    if active is not None:
+        query = query.where(subscriber.active == active)
+    yield from stream_query(db_engine, _where_created(query, subscriber.created_at, low, high), batch_size)
+
+
+DATASETS = {
+    "visits": (VISIT_COLUMNS, visits),
+    "contacts": (CONTACT_COLUMNS, contacts),
+    "newsletter": (NEWSLETTER_COLUMNS, newsletter),
+}
+
+
+# ============= Encoding =============
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, dict)):
+        return orjson.dumps(value).decode()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv(columns: tuple, batches: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield ("\ufeff" + buffer.getvalue()).encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(columns: tuple, batches: Iterator[list]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(
+            orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE) for row in batch
+        )
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(dataset: str, db_engine, fmt: str = "csv", start: date = None, end: date = None,
+           compress: bool = False, batch_size: int = None, **filters) -> Iterator[bytes]:
+    """بدنه خروجی به صورت تکه‌های بایت (برای StreamingResponse)"""
+    columns, source = DATASETS[dataset]
+    low, high = _bounds(start, end)
+    batches = source(db_engine, low, high, batch_size or settings.EXPORT_BATCH_SIZE, **filters)
+    return encode(columns, batches, fmt, compress)
+
+
+def encode(columns: tuple, batches: Iterator[list], fmt: str = "csv", compress: bool = False) -> Iterator[bytes]:
+    """دسته‌های ردیف (تاپل‌هایی به ترتیب columns) به تکه‌های بایت CSV / NDJSON"""
+    chunks = _csv(columns, batches) if fmt == "csv" else _ndjson(columns, batches)
+    return _gzip(chunks) if compress else chunks
+
+
+def filename(dataset: str, fmt: str, start: date = None, end: date = None, compress: bool = False) -> str:
+    parts = [dataset] + [day.isoformat() for day in (start, end) if day]
+    return "-".join(parts) + f".{fmt}" + (".gz" if compress else "")
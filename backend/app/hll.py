@@ -0,0 +1,88 @@
+"""
+HyperLogLog برای شمارش تقریبی بازدیدکنندگان یکتا
+
+هر sketch با m = 2^p ثبات (register) یک بایتی تعداد مقادیر یکتا را تخمین
+می‌زند و sketchها با max ثبات به ثبات ادغام می‌شوند؛ پس تعداد یکتای هر
+بازه زمانی از ادغام sketchهای روزانه به دست می‌آید، بدون COUNT(DISTINCT).
+
+خطای استاندارد نسبی تخمین 1.04 / sqrt(m) است:
+- p=12 (4096 ثبات، sketch روزانه): حدود ۱.۶٪
+- p=10 (1024 ثبات، sketch هر مسیر): حدود ۳.۳٪
+یعنی در حدود ۹۵٪ موارد خطا کمتر از دو برابر این مقدار است. برای
+تعدادهای کوچک (کمتر از 2.5m) از linear counting استفاده می‌شود که تقریبا
+دقیق است. درستی روی داده مصنوعی با bench_hll_accuracy.py بررسی می‌شود.
+
+hash ورودی blake2b (۶۴ بیتی) است تا بین پردازش‌ها ثابت بماند. در دیتابیس
+sketch به صورت یک بایت precision و ثبات‌های فشرده با zlib ذخیره می‌شود.
+"""
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+HASH_BITS = 64
+
+
+def relative_error(precision: int) -> float:
+    """خطای استاندارد نسبی sketch با این precision"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+class HyperLogLog:
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        rest_bits = HASH_BITS - self.precision
+        index = hashed >> rest_bits
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]) -> "HyperLogLog":
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """ادغام در همین sketch (اجتماع دو مجموعه)"""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data[0], bytearray(zlib.decompress(data[1:])))
+
+
+def merge_all(blobs: Iterable[Optional[bytes]], precision: int) -> HyperLogLog:
+    """ادغام sketchهای ذخیره شده (None نادیده گرفته می‌شود)"""
+    sketches = [HyperLogLog.from_bytes(blob) for blob in blobs if blob]
+    if any(sketch.precision != precision for sketch in sketches):
+        raise ValueError("cannot merge sketches with different precision")
+    if len(sketches) < 2:
+        return sketches[0] if sketches else HyperLogLog(precision)
+    # یک max برای هر ثبات روی همه sketchها؛ سریع‌تر از ادغام دو به دو
+    return HyperLogLog(precision, bytearray(map(max, *(sketch.registers for sketch in sketches))))
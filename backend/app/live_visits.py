@@ -0,0 +1,180 @@
+"""
+جریان زنده بازدیدها برای پنل ادمین (Server-Sent Events)
+
+روت‌های ثبت بازدید هر رویداد را علاوه بر صف نوشتن، در یک ring buffer
+حافظه‌ای (VISIT_LIVE_BUFFER_SIZE بازدید آخر) و شمارنده‌های دقیقه‌ای
+(VISIT_LIVE_WINDOW_MINUTES دقیقه آخر) ثبت می‌کنند؛ /api/admin/visits/stream
+از همین داده‌ها تغذیه می‌شود و هیچ کوئری‌ای به دیتابیس نمی‌زند.
+
+پیام‌های جریان:
+- snapshot: بازدیدهای بافر و شمارنده‌ها هنگام اتصال
+- visits: بازدیدهای جدید (چند رویداد نزدیک به هم در یک پیام)؛ id پیام
+  شماره آخرین بازدید است تا اتصال دوباره با Last-Event-ID ادامه یابد
+- counters: هر VISIT_LIVE_TICK_SECONDS ثانیه (و heartbeat اتصال)
+
+هر اتصال پس از VISIT_LIVE_STREAM_SECONDS بسته می‌شود و کلاینت با
+Last-Event-ID دوباره وصل می‌شود؛ چون uvicorn در shutdown منتظر پایان
+اتصال‌های باز می‌ماند، این زمان سقف انتظار آن است.
+
+داده‌ها per-process هستند؛ در حالت چند worker هر اتصال فقط بازدیدهای
+همان worker را می‌بیند.
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import orjson
+
+from app import visit_dictionary
+from app.config import settings
+
+# بازدیدکننده فعال: IP دیده شده در این تعداد دقیقه آخر
+ACTIVE_MINUTES = 5
+# فاصله جمع کردن رویدادهای نزدیک به هم در یک پیام
+COALESCE_SECONDS = 0.25
+
+_recent: deque = deque(maxlen=settings.VISIT_LIVE_BUFFER_SIZE)
+# هر عنصر: [دقیقه از epoch، بازدید، ربات، مجموعه hash IPها]
+_minutes: deque = deque(maxlen=settings.VISIT_LIVE_WINDOW_MINUTES)
+_sequence = itertools.count(1)
+_changed: Optional[asyncio.Event] = None
+
+counters = {"published": 0, "clients": 0}
+
+
+def _current_event() -> asyncio.Event:
+    global _changed
+    if _changed is None:
+        _changed = asyncio.Event()
+    return _changed
+
+
+def _notify():
+    # همه اتصال‌های منتظر بیدار می‌شوند و بعدی‌ها Event تازه می‌گیرند
+    global _changed
+    if _changed is not None:
+        _changed.set()
+        _changed = None
+
+
+def _iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def publish(row: dict):
+    """ثبت یک بازدید (خروجی visit_queue.build_row) در بافر و شمارنده‌ها"""
+    agent = row.get("user_agent")
+    is_bot = bool(agent) and visit_dictionary.parse_user_agent(agent)["is_bot"]
+    referer = row.get("referer")
+    _recent.append({
+        "id": next(_sequence),
+        "at": _iso(row.get("created_at")),
+        "path": row.get("path"),
+        "section": visit_dictionary.section_for(row.get("path")),
+        "referer_host": visit_dictionary.referer_host(referer) if referer else None,
+        "bot": is_bot,
+    })
+
+    minute = int(time.time() // 60)
+    if not _minutes or _minutes[-1][0] != minute:
+        _minutes.append([minute, 0, 0, set()])
+    bucket = _minutes[-1]
+    if is_bot:
+        bucket[2] += 1
+    else:
+        bucket[1] += 1
+        if row.get("ip"):
+            bucket[3].add(hash(row["ip"]))
+    counters["published"] += 1
+    _notify()
+
+
+def last_id() -> int:
+    return _recent[-1]["id"] if _recent else 0
+
+
+def events_after(event_id: int) -> list:
+    return [event for event in _recent if event["id"] > event_id]
+
+
+def snapshot_counters() -> dict:
+    """بازدید و ربات هر دقیقه پنجره (قدیمی به جدید از minute_start) و بازدیدکنندگان فعال"""
+    current = int(time.time() // 60)
+    first = current - settings.VISIT_LIVE_WINDOW_MINUTES + 1
+    counts = [0] * settings.VISIT_LIVE_WINDOW_MINUTES
+    bots = [0] * settings.VISIT_LIVE_WINDOW_MINUTES
+    active = set()
+    for minute, count, bot_count, visitors in _minutes:
+        if minute >= first:
+            counts[minute - first] = count
+            bots[minute - first] = bot_count
+        if minute > current - ACTIVE_MINUTES:
+            active |= visitors
+    return {
+        "minute_start": datetime.fromtimestamp(first * 60, tz=timezone.utc).isoformat(),
+        "per_minute": counts,
+        "bots_per_minute": bots,
+        "last_minute": counts[-1],
+        "active_visitors": len(active),
+        "published": counters["published"],
+    }
+
+
+def _message(event: str, data, event_id: int = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: ".encode() + orjson.dumps(data) + b"\n\n"
+
+
+async def stream(resume_from: Optional[int] = None) -> AsyncIterator[bytes]:
+    """بدنه پاسخ text/event-stream یک اتصال"""
+    counters["clients"] += 1
+    try:
+        yield f"retry: {settings.VISIT_LIVE_RETRY_MS}\n\n".encode()
+        # بدون Last-Event-ID، یا وقتی بافر رویدادهای از دست رفته را ندارد
+        # (یا سرور از نو شروع شده) snapshot کامل فرستاده می‌شود
+        latest = last_id()
+        if (resume_from is None or resume_from > latest
+                or (_recent and resume_from < _recent[0]["id"] - 1)):
+            yield _message("snapshot", {"recent": list(_recent), "counters": snapshot_counters()}, latest)
+            resume_from = latest
+
+        closes_at = time.monotonic() + settings.VISIT_LIVE_STREAM_SECONDS
+        next_tick = time.monotonic() + settings.VISIT_LIVE_TICK_SECONDS
+        while True:
+            # در هر دور، حتی با ترافیک پیوسته، تا اتصال بسته شود و counters برسد
+            now = time.monotonic()
+            if now >= closes_at:
+                return
+            if now >= next_tick:
+                yield _message("counters", snapshot_counters())
+                next_tick = now + settings.VISIT_LIVE_TICK_SECONDS
+
+            changed = _current_event()
+            pending = events_after(resume_from)
+            if pending:
+                resume_from = pending[-1]["id"]
+                yield _message("visits", pending, resume_from)
+                await asyncio.sleep(COALESCE_SECONDS)
+                continue
+            try:
+                timeout = min(next_tick, closes_at) - time.monotonic()
+                await asyncio.wait_for(changed.wait(), timeout=max(timeout, 0.01))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        counters["clients"] -= 1
+
+
+def stats() -> dict:
+    return {
+        **counters,
+        "buffered": len(_recent),
+        "capacity": settings.VISIT_LIVE_BUFFER_SIZE,
+    }
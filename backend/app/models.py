@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, Float, JSON, Index, LargeBinary
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -31,6 +31,13 @@ class Article(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # ایندکس‌های keyset pagination
+    __table_args__ = (
+        Index("ix_articles_created_at_id", "created_at", "id"),
+        Index("ix_articles_views_id", "views", "id"),
+        Index("ix_articles_featured_views_id", "featured", "views", "id"),
+    )
+
 
 class GalleryItem(Base):
     """مدل آیتم‌های گالری"""
@@ -59,6 +66,10 @@ class GalleryItem(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_gallery_items_created_at_id", "created_at", "id"),
+    )
+
 
 class Testimonial(Base):
     """مدل نظرات مشتریان"""
@@ -74,6 +85,7 @@ class Testimonial(Base):
     project = Column(String(255))
     approved = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
 class Certificate(Base):
@@ -106,6 +118,7 @@ class Statistic(Base):
     label = Column(String(100), nullable=False)
     icon = Column(String(10))
     order = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
 class Contact(Base):
@@ -181,13 +194,109 @@ class Visit(Base):
     __tablename__ = "visits"
 
     id = Column(Integer, primary_key=True, index=True)
-    path = Column(String(500), index=True)
+    # رشته‌های path / referer / user agent در جداول dictionary (app/visit_dictionary.py)
+    path_id = Column(Integer, nullable=True, index=True)
     ip = Column(String(100), index=True)
-    user_agent = Column(Text)
-    referer = Column(String(500))
+    user_agent_id = Column(Integer, nullable=True)
+    referer_id = Column(Integer, nullable=True)
+    # تعداد بازدیدی که این ردیف نمایندگی می‌کند (نمونه‌برداری app/visit_ingest.py)؛ NULL یعنی 1
+    weight = Column(Integer, nullable=True)
+    # زمان رویداد از دید کلاینت (رویدادهای صف شده در مرورگر)
+    client_ts = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
+# ============= Visit dictionaries =============
+# هر مقدار متنی یک بار ذخیره و هنگام ثبت غنی‌سازی می‌شود؛ visits فقط id نگه می‌دارد
+
+class VisitPath(Base):
+    """مسیرهای بازدید شده به همراه بخش سایت و موجودیت متناظر"""
+    __tablename__ = "visit_paths"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(500), unique=True, nullable=False)
+    section = Column(String(50), nullable=False)
+    # مثلا article / 12 برای /article/12
+    entity_type = Column(String(50), nullable=True)
+    entity_id = Column(Integer, nullable=True)
+
+
+class VisitReferer(Base):
+    """referer کامل و دامنه آن"""
+    __tablename__ = "visit_referers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    referer = Column(String(500), unique=True, nullable=False)
+    host = Column(String(255), nullable=False, index=True)
+
+
+class VisitUserAgent(Base):
+    """user agent یکتا (با hash) به همراه نتیجه تجزیه آن"""
+    __tablename__ = "visit_user_agents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    digest = Column(String(32), unique=True, nullable=False)
+    user_agent = Column(Text, nullable=False)
+    is_bot = Column(Boolean, nullable=False, default=False)
+    browser = Column(String(50), nullable=True)
+    os = Column(String(50), nullable=True)
+    device = Column(String(20), nullable=True)
+
+
+# ============= Visit rollups =============
+# تجمیع روزانه visits که به صورت افزایشی توسط app/visit_rollup.py نگه داشته می‌شود
+
+class VisitRollupState(Base):
+    """watermark پردازش rollup (آخرین id بازدید تجمیع شده)"""
+    __tablename__ = "visit_rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    last_visit_id = Column(Integer, nullable=False, default=0)
+    # sketch HyperLogLog همه IPها از ابتدا (بازدیدکننده یکتای کل)
+    sketch = Column(LargeBinary, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class VisitDaily(Base):
+    """تعداد بازدید هر روز"""
+    __tablename__ = "visit_daily"
+
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    # بازدید رباتها جدا شمرده می‌شود و در بقیه rollupها نیست
+    bots = Column(Integer, nullable=True, default=0)
+    # sketch HyperLogLog از IPهای روز (app/hll.py)
+    sketch = Column(LargeBinary, nullable=True)
+
+
+class VisitDailyPath(Base):
+    """تعداد بازدید هر مسیر (visit_paths.id) در هر روز"""
+    __tablename__ = "visit_daily_path_ids"
+
+    day = Column(Date, primary_key=True)
+    path_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sketch = Column(LargeBinary, nullable=True)
+
+
+class VisitDailySection(Base):
+    """تعداد بازدید هر بخش سایت (articles، gallery، ...) در هر روز"""
+    __tablename__ = "visit_daily_sections"
+
+    day = Column(Date, primary_key=True)
+    section = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class VisitDailyReferer(Base):
+    """تعداد بازدید از هر referer (visit_referers.id) در هر روز"""
+    __tablename__ = "visit_daily_referer_ids"
+
+    day = Column(Date, primary_key=True)
+    referer_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
 class Video(Base):
     """مدل ویدیوها برای نمایش در صفحه اصلی"""
     __tablename__ = "videos"
@@ -0,0 +1,92 @@
+"""
+Keyset (cursor) pagination
+
+به جای offset، مقدار کلیدهای مرتب‌سازی آخرین ردیف صفحه در یک cursor
+مبهم (base64) به کلاینت داده می‌شود و صفحه بعد با شرط
+`(a, b, ...) < (va, vb, ...)` خوانده می‌شود. این کار روی صفحات عمیق هم
+سریع است و با درج محتوای جدید ردیف تکراری یا جاافتاده ایجاد نمی‌کند.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, literal, or_
+
+
+def sort_columns(model, sort: str) -> list:
+    """ستون‌های کلید مرتب‌سازی (همه نزولی) برای هر نوع sort"""
+    if sort == "popular":
+        return [model.views, model.id]
+    if sort == "trending":
+        return [model.featured, model.views, model.id]
+    return [model.created_at, model.id]
+
+
+def order_by_clause(columns: Sequence) -> list:
+    return [column.desc() for column in columns]
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort: str, row, columns: Sequence) -> str:
+    """ساخت cursor از مقادیر کلید آخرین ردیف"""
+    payload = {
+        "s": sort,
+        "v": [_encode_value(getattr(row, column.key)) for column in columns],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, columns: Sequence) -> list:
+    """خواندن cursor؛ cursor نامعتبر یا مربوط به sort دیگر خطای 400 می‌دهد"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(value) for value in payload["v"]]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="cursor نامعتبر است")
+
+    if payload.get("s") != sort or len(values) != len(columns):
+        raise HTTPException(status_code=400, detail="cursor با مرتب‌سازی فعلی سازگار نیست")
+    return values
+
+
+def _bind(column, value, dialect_name: str):
+    # SQLite تاریخ‌ها را به صورت متن ذخیره می‌کند و CURRENT_TIMESTAMP
+    # میکروثانیه ندارد؛ مقایسه باید با همان قالب متنی انجام شود
+    if isinstance(value, datetime) and dialect_name == "sqlite":
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        if value.microsecond:
+            text += f".{value.microsecond:06d}"
+        return literal(text, String)
+    return literal(value, column.type)
+
+
+def keyset_filter(columns: Sequence, values: List, dialect_name: str):
+    """شرط «بعد از cursor» برای مرتب‌سازی نزولی روی چند ستون"""
+    values = [_bind(column, value, dialect_name) for column, value in zip(columns, values)]
+    clauses = []
+    for index, column in enumerate(columns):
+        equal_prefix = [columns[i] == values[i] for i in range(index)]
+        clauses.append(and_(*equal_prefix, column < values[index]))
+    return or_(*clauses)
+
+
+def next_cursor(sort: str, rows: list, limit: int, columns: Sequence) -> Optional[str]:
+    """اگر ردیف اضافه (limit + 1) خوانده شده باشد cursor صفحه بعد را برمی‌گرداند"""
+    if len(rows) <= limit:
+        return None
+    return encode_cursor(sort, rows[limit - 1], columns)
@@ -0,0 +1,229 @@
+"""
+کش پاسخ HTTP برای GETهای عمومی محتوا
+
+یک middleware خالص ASGI که پاسخ‌های 200 روت‌های عمومی (مقالات، گالری،
+خدمات، اسلایدرها، نظرات، گواهینامه‌ها، آمار، ویدیوها و صفحه اصلی) را با کلید
+«مسیر + پارامترهای query مرتب‌شده» نگه می‌دارد:
+
+- تازه (RESPONSE_CACHE_TTL_SECONDS): مستقیما از کش
+- stale-while-revalidate (RESPONSE_CACHE_STALE_SECONDS): پاسخ کهنه فورا
+  برگردانده می‌شود و یک درخواست پس‌زمینه آن را تازه می‌کند
+- stale-if-error (RESPONSE_CACHE_STALE_IF_ERROR_SECONDS): اگر روت خطا
+  بدهد (مثلا دیتابیس در دسترس نباشد) پاسخ کهنه برگردانده می‌شود
+
+هر ورودی با نام جداول (entity tag) برچسب می‌خورد و با commit هر Session
+که آن جداول را تغییر دهد (از طریق cache.on_invalidate) حذف می‌شود.
+روت‌های جزئیاتی که بازدید را افزایش می‌دهند کش نمی‌شوند. اگر ETag یا
+Last-Modified پاسخ کش شده با هدرهای شرطی درخواست بخواند 304 برگردانده می‌شود.
+"""
+import asyncio
+import re
+import time
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from app.cache import TTLCache, on_invalidate
+from app import conditional
+from app.config import settings
+from app.database import is_primary_sticky
+
+
+# مسیر -> جداولی که پاسخ به آن‌ها وابسته است
+CACHEABLE_ROUTES = [
+    (re.compile(r"^/api/articles(/categories/list)?$"), frozenset({"articles"})),
+    (re.compile(r"^/api/gallery(/categories/list)?$"), frozenset({"gallery_items"})),
+    (re.compile(r"^/api/services(/\d+)?$"), frozenset({"services"})),
+    (re.compile(r"^/api/sliders(/\d+)?$"), frozenset({"sliders"})),
+    (re.compile(r"^/api/testimonials$"), frozenset({"testimonials"})),
+    (re.compile(r"^/api/certificates(/\d+)?$"), frozenset({"certificates"})),
+    (re.compile(r"^/api/statistics$"), frozenset({"statistics"})),
+    (re.compile(r"^/api/videos$"), frozenset({"videos"})),
+    (re.compile(r"^/api/home$"), frozenset({
+        "sliders", "services", "statistics", "testimonials",
+        "certificates", "videos", "articles", "gallery_items",
+    })),
+]
+
+
+def tags_for(path: str, query_string: bytes = b"") -> Optional[frozenset]:
+    """جداول وابسته به مسیر؛ None یعنی مسیر کش‌پذیر نیست"""
+    for pattern, tags in CACHEABLE_ROUTES:
+        if pattern.match(path):
+            # expand=slider اسلایدرها را داخل پاسخ قرار می‌دهد
+            if b"expand=" in query_string and any(
+                "slider" in value.split(",")
+                for name, value in parse_qsl(query_string.decode("latin-1")) if name == "expand"
+            ):
+                return tags | {"sliders"}
+            return tags
+    return None
+
+
+def cache_key(path: str, query_string: bytes) -> tuple:
+    """کلید کش: مسیر و پارامترهای غیرخالی query به ترتیب الفبایی"""
+    params = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=False))
+    return (path, urlencode(params))
+
+
+class CachedResponse:
+    __slots__ = ("status", "headers", "body", "tags", "stored_at")
+
+    def __init__(self, status: int, headers: list, body: bytes, tags: frozenset):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.tags = tags
+        self.stored_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+response_cache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS + max(
+        settings.RESPONSE_CACHE_STALE_SECONDS,
+        settings.RESPONSE_CACHE_STALE_IF_ERROR_SECONDS,
+    ),
+)
+
+# شمارنده نسخه هر جدول؛ پاسخی که پیش از invalidation ساخته شده ذخیره نمی‌شود
+_generations: dict = {}
+
+
+def _snapshot(tags: frozenset) -> tuple:
+    return tuple(_generations.get(tag, 0) for tag in sorted(tags))
+
+
+@on_invalidate
+def _invalidate_responses(tables: set):
+    for table in tables:
+        _generations[table] = _generations.get(table, 0) + 1
+    response_cache.invalidate(lambda key: not tables.isdisjoint(key[0]))
+
+
+def stats() -> dict:
+    return response_cache.stats()
+
+
+class ResponseCacheMiddleware:
+    """Middleware کش پاسخ؛ باید داخل CORSMiddleware اضافه شود"""
+
+    def __init__(self, app):
+        self.app = app
+        self._refreshing = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not settings.RESPONSE_CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        tags = tags_for(scope["path"], scope.get("query_string", b""))
+        headers = dict(scope["headers"])
+        # پس از نوشتن ادمین (read-your-writes) پاسخ مستقیما از primary ساخته می‌شود
+        authorization = headers.get(b"authorization")
+        if tags is None or (authorization and is_primary_sticky(authorization.decode("latin-1"))):
+            await self.app(scope, receive, send)
+            return
+
+        key = (tags, cache_key(scope["path"], scope.get("query_string", b"")))
+        entry = response_cache.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age <= settings.RESPONSE_CACHE_TTL_SECONDS:
+                await self._send(send, entry, "HIT", headers)
+                return
+            if age <= settings.RESPONSE_CACHE_TTL_SECONDS + settings.RESPONSE_CACHE_STALE_SECONDS:
+                self._schedule_refresh(scope, key)
+                await self._send(send, entry, "STALE", headers)
+                return
+
+        try:
+            fresh = await self._fetch(scope, key)
+        except Exception:
+            if self._can_serve_stale(entry):
+                await self._send(send, entry, "STALE-IF-ERROR")
+                return
+            raise
+        if fresh.status >= 500 and self._can_serve_stale(entry):
+            await self._send(send, entry, "STALE-IF-ERROR")
+            return
+        await self._send(send, fresh, "MISS")
+
+    def _can_serve_stale(self, entry: Optional[CachedResponse]) -> bool:
+        return entry is not None and entry.age() <= (
+            settings.RESPONSE_CACHE_TTL_SECONDS + settings.RESPONSE_CACHE_STALE_IF_ERROR_SECONDS
+        )
+
+    async def _fetch(self, scope, key) -> CachedResponse:
+        """اجرای روت و ذخیره پاسخ 200 در کش"""
+        generation = _snapshot(key[0])
+        start = {}
+        chunks = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(dict(scope), receive, capture)
+        response = CachedResponse(start["status"], list(start.get("headers", [])), b"".join(chunks), key[0])
+        if response.status == 200 and generation == _snapshot(key[0]):
+            response_cache.set(key, response)
+        return response
+
+    def _schedule_refresh(self, scope, key):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        # درخواست پس‌زمینه باید پاسخ کامل بگیرد نه 304
+        scope = dict(scope, headers=[
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"if-none-match", b"if-modified-since")
+        ])
+
+        async def refresh():
+            try:
+                await self._fetch(scope, key)
+            except Exception as exc:
+                print("response cache refresh error", exc)
+            finally:
+                self._refreshing.discard(key)
+
+        asyncio.get_running_loop().create_task(refresh())
+
+    @staticmethod
+    def _not_modified(entry: CachedResponse, request_headers: dict) -> bool:
+        stored = {name.lower(): value.decode("latin-1") for name, value in entry.headers}
+        validators = conditional.from_headers(stored.get(b"etag"), stored.get(b"last-modified"))
+        if validators is None:
+            return False
+        if_none_match = request_headers.get(b"if-none-match")
+        if_modified_since = request_headers.get(b"if-modified-since")
+        return conditional.check(
+            if_none_match.decode("latin-1") if if_none_match is not None else None,
+            if_modified_since.decode("latin-1") if if_modified_since is not None else None,
+            validators,
+        )
+
+    async def _send(self, send, entry: CachedResponse, state: str, request_headers: Optional[dict] = None):
+        headers = [(name, value) for name, value in entry.headers if name.lower() != b"x-cache"]
+        headers.append((b"x-cache", state.encode()))
+        if state != "MISS":
+            headers.append((b"age", str(int(entry.age())).encode()))
+
+        if request_headers and self._not_modified(entry, request_headers):
+            headers = [
+                (name, value) for name, value in headers
+                if name.lower() not in (b"content-length", b"content-type")
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
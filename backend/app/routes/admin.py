@@ -1,30 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from fastapi import APIRouter, Depends, HTTPException, Header, status, UploadFile, File
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session, defer
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import shutil
 import os
 from pathlib import Path
 
-from app.database import get_db
-from app import models, schemas, auth
+from app.database import get_db, get_read_db, get_pool_stats, read_engines
+from app import models, schemas, auth, search, serialization, cache, bulk, exports, response_cache, view_counter, live_visits, visit_ingest, visit_queue, visit_rollup, visit_partitions, visit_dictionary, visit_analytics, dashboard
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
 
 
 # ==================== مقالات ====================
 
-@router.get("/articles", response_model=List[schemas.Article])
+@router.get("/articles", response_model=List[schemas.ArticleSummary])
 def get_all_articles_admin(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_admin_user)
 ):
-    """دریافت همه مقالات (ادمین)"""
-    articles = db.query(models.Article).offset(skip).limit(limit).all()
-    return articles
+    """دریافت همه مقالات (ادمین) - بدون full_content"""
+    articles = db.query(models.Article)\
+        .options(defer(models.Article.full_content, raiseload=True))\
+        .offset(skip).limit(limit).all()
+    return serialization.respond(serialization.dump_list(schemas.ArticleSummary, articles))
+
+
+@router.get("/articles/{article_id}", response_model=schemas.Article)
+def get_article_admin(
+    article_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """دریافت کامل یک مقاله برای ویرایش (ادمین)"""
+    db_article = db.query(models.Article).filter(models.Article.id == article_id).first()
+    if not db_article:
+        raise HTTPException(status_code=404, detail="مقاله یافت نشد")
+    return db_article
 
 
 @router.post("/articles", response_model=schemas.Article, status_code=201)
@@ -88,7 +105,7 @@ def get_all_gallery_admin(
 ):
     """دریافت همه آیتم‌های گالری (ادمین)"""
     items = db.query(models.GalleryItem).offset(skip).limit(limit).all()
-    return items
+    return serialization.respond(serialization.dump_list(schemas.GalleryItem, items))
 
 
 @router.post("/gallery", response_model=schemas.GalleryItem, status_code=201)
@@ -152,7 +169,7 @@ def get_all_testimonials_admin(
 ):
     """دریافت همه نظرات (ادمین)"""
     testimonials = db.query(models.Testimonial).offset(skip).limit(limit).all()
-    return testimonials
+    return serialization.respond(serialization.dump_list(schemas.Testimonial, testimonials))
 
 
 @router.post("/testimonials", response_model=schemas.Testimonial, status_code=201)
@@ -280,7 +297,7 @@ def get_all_sliders_admin(
 ):
     """دریافت همه اسلایدرها (ادمین)"""
     sliders = db.query(models.Slider).offset(skip).limit(limit).all()
-    return sliders
+    return serialization.respond(serialization.dump_list(schemas.Slider, sliders))
 
 
 @router.post("/sliders", response_model=schemas.Slider, status_code=201)
@@ -344,7 +361,7 @@ def get_all_certificates_admin(
 ):
     """دریافت همه گواهینامه‌ها و استانداردها (ادمین)"""
     certificates = db.query(models.Certificate).offset(skip).limit(limit).all()
-    return certificates
+    return serialization.respond(serialization.dump_list(schemas.Certificate, certificates))
 
 
 @router.post("/certificates", response_model=schemas.Certificate, status_code=201)
@@ -403,77 +420,98 @@ def get_dashboard_stats(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_admin_user)
 ):
-    """دریافت آمار داشبورد (ادمین)"""
-    articles_count = db.query(models.Article).count()
-    gallery_count = db.query(models.GalleryItem).count()
-    testimonials_count = db.query(models.Testimonial).count()
-    contacts_count = db.query(models.Contact).count()
-    sliders_count = db.query(models.Slider).count()
-    certificates_count = db.query(models.Certificate).count()
-    services_count = db.query(models.Service).count()
-    unread_contacts = db.query(models.Contact).filter(models.Contact.read == False).count()
-    pending_testimonials = db.query(models.Testimonial).filter(models.Testimonial.approved == False).count()
-    total_visits = db.query(models.Visit).count()
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    last7 = datetime.utcnow() - timedelta(days=7)
-    last30 = datetime.utcnow() - timedelta(days=30)
-    today_visits = db.query(models.Visit).filter(models.Visit.created_at >= today_start).count()
-    last7_visits = db.query(models.Visit).filter(models.Visit.created_at >= last7).count()
-    last30_visits = db.query(models.Visit).filter(models.Visit.created_at >= last30).count()
-    unique_ips = db.query(func.count(func.distinct(models.Visit.ip))).scalar() or 0
-    
+    """دریافت آمار داشبورد (ادمین)؛ snapshot کش شده از دو کوئری تجمیعی"""
+    return dashboard.snapshot(db)
+
+
+@router.get("/db/pool")
+def get_db_pool_stats(
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """آمار pool اتصال‌های دیتابیس (ادمین)"""
+    stats = get_pool_stats()
+    stats["replicas"] = [get_pool_stats(read_engine) for read_engine in read_engines]
+    return stats
+
+
+@router.get("/cache/stats")
+def get_cache_stats(
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """آمار کش‌های درون‌پردازشی (ادمین)"""
     return {
-        "articles": articles_count,
-        "gallery": gallery_count,
-        "testimonials": testimonials_count,
-        "contacts": contacts_count,
-        "sliders": sliders_count,
-        "certificates": certificates_count,
-        "services": services_count,
-        "unread_contacts": unread_contacts,
-        "pending_testimonials": pending_testimonials,
-        "visits": {
-            "total": total_visits,
-            "today": today_visits,
-            "last7": last7_visits,
-            "last30": last30_visits,
-            "unique_ips": unique_ips
-        }
+        "counts": cache.count_cache.stats(),
+        "responses": response_cache.stats(),
+        "views": view_counter.stats(),
+        "visits": visit_queue.stats(),
+        "visit_ingest": visit_ingest.stats(),
+        "visit_dictionary": visit_dictionary.stats(),
+        "live_visits": live_visits.stats(),
+        "dashboard": dashboard.snapshot_cache.stats(),
     }
 
 
+@router.post("/search/rebuild")
+def rebuild_search_index(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """ساخت دوباره ایندکس جستجوی متن کامل (ادمین)"""
+    if search.backend is None:
+        raise HTTPException(status_code=400, detail="ایندکس جستجوی متن کامل فعال نیست")
+    
+    counts = {table: search.rebuild_index(db, table) for table in search.SOURCES}
+    db.commit()
+    return {"success": True, "backend": search.backend, "indexed": counts}
+
+
 @router.get("/visits/summary", response_model=schemas.VisitSummary)
 def get_visit_summary(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_admin_user)
 ):
-    """خلاصه آمار بازدیدها برای پنل ادمین"""
-    now = datetime.utcnow()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    last7 = now - timedelta(days=7)
-    last30 = now - timedelta(days=30)
+    """خلاصه آمار بازدیدها برای پنل ادمین (از جداول rollup)"""
+    visit_rollup.catch_up(db.get_bind())
+    today = datetime.utcnow().date()
+    visits = visit_rollup.summary(db, today)
 
-    total_visits = db.query(models.Visit).count()
-    unique_ips = db.query(func.count(func.distinct(models.Visit.ip))).scalar() or 0
-    today_visits = db.query(models.Visit).filter(models.Visit.created_at >= today_start).count()
-    last7_visits = db.query(models.Visit).filter(models.Visit.created_at >= last7).count()
-    last30_visits = db.query(models.Visit).filter(models.Visit.created_at >= last30).count()
+    return {
+        "total_visits": visits["total"],
+        "unique_ips": visits["unique_ips"],
+        "today_visits": visits["today"],
+        "last7_visits": visits["last7"],
+        "last30_visits": visits["last30"],
+        "per_day": visit_rollup.per_day(db, today - timedelta(days=29))
+    }
 
-    per_day_rows = db.query(
-        func.date(models.Visit.created_at).label("day"),
-        func.count().label("count")
-    ).filter(models.Visit.created_at >= last30).group_by("day").order_by("day").all()
 
-    per_day = [{"day": row.day, "count": row.count} for row in per_day_rows]
+@router.post("/visits/rollup/rebuild")
+def rebuild_visit_rollups(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """backfill کامل جداول تجمیع بازدید از داده خام (ادمین)"""
+    processed = visit_rollup.rebuild(db.get_bind())
+    return {"success": True, "processed": processed}
 
-    return {
-        "total_visits": total_visits,
-        "unique_ips": unique_ips,
-        "today_visits": today_visits,
-        "last7_visits": last7_visits,
-        "last30_visits": last30_visits,
-        "per_day": per_day
-    }
+
+@router.get("/visits/storage")
+def get_visit_storage(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """وضعیت پارتیشن‌ها، آرشیوها و آرایه‌های analytics بازدید (ادمین)"""
+    return {**visit_partitions.storage(db.get_bind()), "analytics": visit_analytics.storage()}
+
+
+@router.post("/visits/archive")
+def archive_visits(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """اجرای فوری rotate و آرشیو بازدیدها (ادمین)"""
+    result = visit_partitions.maintain(db.get_bind())
+    return {"success": True, **result}
 
 
 @router.get("/visits/report")
@@ -482,53 +520,45 @@ def get_visit_report(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_admin_user)
 ):
-    """گزارش خلاقانه‌ی بازدیدها بر اساس مسیر و بخش‌های اصلی"""
+    """گزارش خلاقانه‌ی بازدیدها بر اساس مسیر و بخش‌های اصلی (از جداول rollup)"""
     # محدودسازی بازه برای جلوگیری از بار زیاد
     window_days = max(1, min(days, 180))
-    now = datetime.utcnow()
-    cutoff = now - timedelta(days=window_days)
-
-    base_query = db.query(models.Visit).filter(models.Visit.created_at >= cutoff)
-
-    total = base_query.count()
-
-    per_day_rows = base_query.with_entities(
-        func.date(models.Visit.created_at).label("day"),
-        func.count().label("count")
-    ).group_by("day").order_by("day").all()
-    per_day = [{"day": row.day, "count": row.count} for row in per_day_rows]
-
-    top_paths_rows = base_query.with_entities(
-        models.Visit.path.label("path"),
-        func.count().label("count")
-    ).group_by(models.Visit.path).order_by(func.count().desc()).limit(8).all()
-    top_paths = [{"path": row.path or "نامشخص", "count": row.count} for row in top_paths_rows]
-
-    section_case = case(
-        (models.Visit.path.like('/articles%'), 'articles'),
-        (models.Visit.path.like('/gallery%'), 'gallery'),
-        (models.Visit.path.like('/services%'), 'services'),
-        (models.Visit.path.like('/contact%'), 'contacts'),
-        (models.Visit.path == '/', 'home'),
-        (models.Visit.path.like('/welcome%'), 'home'),
-        else_='other'
-    )
+    visit_rollup.catch_up(db.get_bind())
+    since = datetime.utcnow().date() - timedelta(days=window_days - 1)
 
-    section_rows = base_query.with_entities(
-        section_case.label('section'),
-        func.count().label('count')
-    ).group_by('section').order_by(func.count().desc()).all()
-    by_section = [{"section": row.section, "count": row.count} for row in section_rows]
+    total = visit_rollup.total_since(db, since)
+    per_day = visit_rollup.per_day(db, since)
 
-    referer_rows = base_query.with_entities(
-        models.Visit.referer.label("referer"),
-        func.count().label("count")
-    ).filter(models.Visit.referer != None).filter(models.Visit.referer != '').group_by(models.Visit.referer).order_by(func.count().desc()).limit(6).all()
-    top_referers = [{"referer": row.referer, "count": row.count} for row in referer_rows]
+    paths = visit_rollup.top_labeled(
+        db, models.VisitDailyPath, "path_id", models.VisitPath, ("path", "entity_type", "entity_id"), since, 8
+    )
+    path_uniques = visit_rollup.unique_per_path(db, [path_id for path_id, *_ in paths], since)
+    top_paths = [
+        {
+            "path": path or "نامشخص",
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "count": count,
+            "unique": path_uniques[path_id],
+        }
+        for path_id, path, entity_type, entity_id, count in paths
+    ]
+    by_section = [
+        {"section": section, "count": count}
+        for section, count in visit_rollup.top(db, models.VisitDailySection, "section", since)
+    ]
+    top_referers = [
+        {"referer": referer, "host": host, "count": count}
+        for _, referer, host, count in visit_rollup.top_labeled(
+            db, models.VisitDailyReferer, "referer_id", models.VisitReferer, ("referer", "host"), since, 6
+        )
+    ]
 
     return {
         "range_days": window_days,
         "total": total,
+        "unique": visit_rollup.unique_since(db, since),
+        "bots": visit_rollup.total_since(db, since, "bots"),
         "per_day": per_day,
         "top_paths": top_paths,
         "by_section": by_section,
@@ -536,6 +566,192 @@ def get_visit_report(
     }
 
 
+@router.get("/visits/analytics")
+def get_visit_analytics(
+    days: int = 30,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    path_id: Optional[int] = None,
+    referer_id: Optional[int] = None,
+    section: Optional[str] = None,
+    limit: int = 8,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """برش دلخواه بازدیدها (هر بازه روزی، فیلتر مسیر / referer / بخش) از موتور ستونی"""
+    if section is not None and section not in visit_analytics.SECTION_CODES:
+        raise HTTPException(status_code=400, detail="بخش نامعتبر است")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=max(1, days) - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="تاریخ شروع نباید بعد از تاریخ پایان باشد")
+
+    if not visit_analytics.refresh(db.get_bind()):
+        raise HTTPException(
+            status_code=503,
+            detail="آرایه‌های تحلیل بازدید در حال ساخت است؛ کمی بعد دوباره تلاش کنید",
+            headers={"Retry-After": "30"},
+        )
+    result = visit_analytics.report(
+        start, end, max(1, min(limit, 50)), path_id=path_id, referer_id=referer_id, section=section
+    )
+
+    path_ids = [path_id for path_id, _ in result["top_paths"]]
+    referer_ids = [referer_id for referer_id, _ in result["top_referers"]]
+    paths = dict(db.execute(
+        select(models.VisitPath.id, models.VisitPath.path).where(models.VisitPath.id.in_(path_ids))
+    ).all()) if path_ids else {}
+    referers = {row.id: row for row in db.execute(
+        select(models.VisitReferer.id, models.VisitReferer.referer, models.VisitReferer.host)
+        .where(models.VisitReferer.id.in_(referer_ids))
+    ).all()} if referer_ids else {}
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total": result["total"],
+        "unique": result["unique"],
+        "bots": result["bots"],
+        "per_day": result["per_day"],
+        "top_paths": [
+            {"path_id": path_id, "path": paths.get(path_id, "نامشخص"), "count": count}
+            for path_id, count in result["top_paths"]
+        ],
+        "top_referers": [
+            {
+                "referer_id": referer_id,
+                "referer": referers[referer_id].referer if referer_id in referers else None,
+                "host": referers[referer_id].host if referer_id in referers else None,
+                "count": count,
+            }
+            for referer_id, count in result["top_referers"]
+        ],
+        "by_section": [{"section": section, "count": count} for section, count in result["by_section"]],
+        "rows": result["rows"],
+    }
+
+
+@router.post("/visits/analytics/rebuild")
+def rebuild_visit_analytics(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """ساخت دوباره آرایه‌های analytics از جدول visits، جداول ماهانه و آرشیوها (ادمین)"""
+    rows = visit_analytics.rebuild(db.get_bind())
+    return {"success": True, "rows": rows}
+
+
+@router.get("/visits/stream")
+def stream_live_visits(
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """
+    جریان زنده بازدیدها با Server-Sent Events (ادمین)
+    از بافر حافظه‌ای live_visits تغذیه می‌شود و به دیتابیس کوئری نمی‌زند؛
+    با Last-Event-ID فقط بازدیدهای بعد از آن فرستاده می‌شوند.
+    """
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        live_visits.stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ==================== خروجی ====================
+
+@router.get("/exports/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    gzip: bool = False,
+    read: Optional[bool] = None,
+    active: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """
+    خروجی جریانی CSV / NDJSON (ادمین): visits، contacts یا newsletter
+    فیلترها: بازه start / end، read برای پیام‌ها و active برای مشترکین؛
+    با gzip=true فایل .gz فشرده همزمان با خواندن فرستاده می‌شود.
+    """
+    if dataset not in exports.DATASETS:
+        raise HTTPException(status_code=404, detail="خروجی مورد نظر یافت نشد")
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail="قالب خروجی باید csv یا ndjson باشد")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="تاریخ شروع نباید بعد از تاریخ پایان باشد")
+
+    body = exports.stream(
+        dataset, db.get_bind(), format, start, end, compress=gzip, read=read, active=active
+    )
+    name = exports.filename(dataset, format, start, end, compress=gzip)
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
+# ==================== ورود و خروج دسته‌ای ====================
+
+@router.get("/bulk")
+def list_bulk_entities(
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """موجودیت‌های قابل ورود / خروج دسته‌ای با کلید upsert و ستون‌ها (ادمین)"""
+    return bulk.describe()
+
+
+@router.get("/bulk/{entity}/export")
+def export_entity(
+    entity: str,
+    format: str = "ndjson",
+    gzip: bool = False,
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """خروجی جریانی همه ردیف‌های یک موجودیت به NDJSON / CSV (ادمین)"""
+    if entity not in bulk.ENTITIES:
+        raise HTTPException(status_code=404, detail="موجودیت مورد نظر یافت نشد")
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail="قالب خروجی باید csv یا ndjson باشد")
+
+    name = bulk.filename(entity, format, compress=gzip)
+    return StreamingResponse(
+        bulk.export(entity, db.get_bind(), format, compress=gzip),
+        media_type="application/gzip" if gzip else bulk.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}"'},
+    )
+
+
+@router.post("/bulk/{entity}/import")
+def import_entity(
+    entity: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user)
+):
+    """
+    ورود دسته‌ای NDJSON / CSV (ساده یا gzip) یک موجودیت (ادمین)
+    upsert با کلید طبیعی موجودیت یا id؛ ردیف‌های نامعتبر در errors گزارش
+    می‌شوند و بقیه ثبت می‌شوند. فایل خراب (UTF-8 / gzip نامعتبر) ادامه ورود را
+    متوقف می‌کند و در aborted می‌آید. با dry_run=true فقط اعتبارسنجی انجام می‌شود.
+    """
+    if entity not in bulk.ENTITIES:
+        raise HTTPException(status_code=404, detail="موجودیت مورد نظر یافت نشد")
+    format = format or bulk.detect_format(file.filename)
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail="قالب فایل باید csv یا ndjson باشد")
+
+    return bulk.import_file(entity, file.file, format, db.get_bind(), dry_run=dry_run)
+
+
 # ==================== خدمات ====================
 
 @router.get("/services", response_model=List[schemas.Service])
@@ -547,7 +763,7 @@ def get_all_services_admin(
 ):
     """دریافت همه خدمات (ادمین)"""
     services = db.query(models.Service).order_by(models.Service.order).offset(skip).limit(limit).all()
-    return services
+    return serialization.respond(serialization.dump_list(schemas.Service, services))
 
 
 @router.post("/services", response_model=schemas.Service, status_code=201)
@@ -614,7 +830,7 @@ def get_all_users_admin(
 ):
     """دریافت همه کاربران (ادمین)"""
     users = db.query(models.User).order_by(models.User.created_at.desc()).offset(skip).limit(limit).all()
-    return users
+    return serialization.respond(serialization.dump_list(schemas.User, users))
 
 
 @router.post("/users", response_model=schemas.User, status_code=201)
@@ -691,7 +907,7 @@ def get_all_settings(
 ):
     """دریافت تمام تنظیمات"""
     settings = db.query(models.Settings).all()
-    return settings
+    return serialization.respond(serialization.dump_list(schemas.Settings, settings))
 
 
 @router.get("/settings/{key}", response_model=schemas.Settings)
@@ -816,7 +1032,7 @@ async def upload_file(
         # ذخیره فایل
         with open(file_path, "wb") as buffer:
             while True:
-                chunk = await file.file.read(8192)
+                chunk = await file.read(1024 * 1024)
                 if not chunk:
                     break
                 file_size += len(chunk)
@@ -828,7 +1044,7 @@ async def upload_file(
                         detail="اندازه فایل بیش از 100MB است"
                     )
                 
-                buffer.write(chunk)
+                await run_in_threadpool(buffer.write, chunk)
         
         # URL عمومی - فقط نام فایل و /uploads
         public_url = f"/uploads/{unique_filename}"
@@ -1,79 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
 from typing import List, Optional
 import math
 
-from app.database import get_db
-from app import models, schemas, auth
+from app.database import get_db, get_async_read_db
+from app import models, schemas, auth, batch, cache, conditional, pagination, serialization, view_counter
+from app.search import ranked_matches
 
 router = APIRouter(prefix="/api/articles", tags=["Articles"])
 
 
 @router.get("", response_model=dict)
-def get_articles(
+async def get_articles(
+    request: Request,
     category: Optional[str] = None,
     search: Optional[str] = None,
-    sort: Optional[str] = "latest",
+    sort: Optional[str] = None,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    ids: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """دریافت لیست مقالات با فیلتر و pagination"""
-    query = db.query(models.Article)
+    """
+    دریافت لیست مقالات با فیلتر و pagination (page یا cursor)
+    - ids: دریافت دسته‌ای مقالات با شناسه (1,2,3) به همان ترتیب، بدون pagination
+    - expand=slider: اسلایدر هر مقاله در فیلد slider
+    """
+    id_list = batch.parse_ids(ids)
+    expands = batch.parse_expand(expand)
+    
+    # full_content فقط در صفحه جزئیات خوانده می‌شود
+    query = select(models.Article).options(defer(models.Article.full_content, raiseload=True))
+    if id_list is not None:
+        query = query.where(models.Article.id.in_(id_list))
     
     # فیلتر بر اساس دسته‌بندی
     if category and category != "همه":
-        query = query.filter(models.Article.category == category)
+        query = query.where(models.Article.category == category)
     
-    # جستجو در عنوان و excerpt
-    if search:
+    # جستجوی متن کامل با رتبه‌بندی؛ در نبود ایندکس FTS جستجو در عنوان و excerpt
+    matches = ranked_matches("articles", search) if search else None
+    if matches is not None:
+        query = query.join(matches, matches.c.id == models.Article.id)
+    elif search:
         search_filter = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             (models.Article.title.ilike(search_filter)) |
             (models.Article.excerpt.ilike(search_filter))
         )
     
-    # مرتب‌سازی
-    if sort == "popular":
-        query = query.order_by(models.Article.views.desc())
-    elif sort == "trending":
-        query = query.order_by(models.Article.featured.desc(), models.Article.views.desc())
-    else:  # latest
-        query = query.order_by(models.Article.created_at.desc())
+    # ETag / Last-Modified پیش از خواندن ردیف‌ها
+    validators = await conditional.list_validators_async(db, "articles", query, request, sort)
+    if "slider" in expands:
+        slider_validators = await conditional.list_validators_async(db, "sliders", select(models.Slider), request)
+        validators = conditional.combine(validators, slider_validators)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    if id_list is not None:
+        result = await db.execute(query)
+        articles_data = serialization.dump_list(schemas.ArticleSummary, batch.in_order(result.scalars().all(), id_list))
+        if "slider" in expands:
+            await batch.embed_sliders_async(db, articles_data)
+        return serialization.respond({"data": articles_data}, headers=conditional.headers(validators))
     
     # محاسبه pagination
-    total = query.count()
-    total_pages = math.ceil(total / limit)
+    total = None
+    total_pages = None
+    if include_total:
+        key = cache.count_key("articles", category, search)
+        total = cache.count_cache.get(key)
+        if total is None:
+            total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+            cache.count_cache.set(key, total)
+        total_pages = math.ceil(total / limit)
     offset = (page - 1) * limit
     
-    articles = query.offset(offset).limit(limit).all()
+    # مرتب‌سازی بر اساس میزان ارتباط (پیش‌فرض در جستجو) فقط با offset
+    if matches is not None and sort in (None, "relevance"):
+        query = query.order_by(matches.c.rank, models.Article.id.desc())
+        result = await db.execute(query.offset(offset).limit(limit))
+        articles_data = serialization.dump_list(schemas.ArticleSummary, result.scalars().all())
+        if "slider" in expands:
+            await batch.embed_sliders_async(db, articles_data)
+        return serialization.respond({
+            "data": articles_data,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "pages": total_pages,
+            "next_cursor": None
+        }, headers=conditional.headers(validators))
+    
+    # مرتب‌سازی (id برای ترتیب یکتا و پایدار)
+    if sort not in ("popular", "trending"):
+        sort = "latest"
+    sort_keys = pagination.sort_columns(models.Article, sort)
+    query = query.order_by(*pagination.order_by_clause(sort_keys))
+    
+    # cursor بر page مقدم است
+    if cursor:
+        values = pagination.decode_cursor(cursor, sort, sort_keys)
+        query = query.where(pagination.keyset_filter(sort_keys, values, db.bind.dialect.name))
+    else:
+        query = query.offset(offset)
+    
+    result = await db.execute(query.limit(limit + 1))
+    articles = result.scalars().all()
     
     # تبدیل به dict برای serialization
-    articles_data = [schemas.Article.from_orm(article) for article in articles]
+    articles_data = serialization.dump_list(schemas.ArticleSummary, articles[:limit])
+    if "slider" in expands:
+        await batch.embed_sliders_async(db, articles_data)
     
-    return {
+    return serialization.respond({
         "data": articles_data,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": total_pages
-    }
+        "pages": total_pages,
+        "next_cursor": pagination.next_cursor(sort, articles, limit, sort_keys)
+    }, headers=conditional.headers(validators))
 
 
 @router.get("/{article_id}", response_model=dict)
-def get_article(article_id: int, db: Session = Depends(get_db)):
+async def get_article(article_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """دریافت یک مقاله با ID"""
-    article = db.query(models.Article).filter(models.Article.id == article_id).first()
+    stamps = (await db.execute(
+        select(*conditional.stamp_columns(models.Article)).where(models.Article.id == article_id)
+    )).first()
     
-    if not article:
+    if not stamps:
         raise HTTPException(status_code=404, detail="مقاله یافت نشد")
     
-    # افزایش تعداد بازدید
-    article.views += 1
-    db.commit()
-    db.refresh(article)
+    # بازدید در بافر write-behind ثبت می‌شود (حتی اگر پاسخ 304 باشد)
+    view_counter.record("articles", article_id)
+    
+    validators = conditional.row_validators("articles", article_id, *stamps)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    result = await db.execute(select(models.Article).where(models.Article.id == article_id))
+    article_data = serialization.dump_one(schemas.Article, result.scalar_one())
+    article_data["views"] = (article_data["views"] or 0) + view_counter.pending("articles", article_id)
     
-    return {"data": schemas.Article.from_orm(article)}
+    return serialization.respond({"data": article_data}, headers=conditional.headers(validators))
 
 
 @router.post("", response_model=dict, status_code=201)
@@ -88,10 +164,10 @@ def create_article(
     db.commit()
     db.refresh(db_article)
     
-    return {
-        "data": schemas.Article.from_orm(db_article),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Article, db_article),
         "message": "مقاله با موفقیت ایجاد شد"
-    }
+    }, status_code=201)
 
 
 @router.put("/{article_id}", response_model=dict)
@@ -115,10 +191,10 @@ def update_article(
     db.commit()
     db.refresh(db_article)
     
-    return {
-        "data": schemas.Article.from_orm(db_article),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Article, db_article),
         "message": "مقاله با موفقیت بروزرسانی شد"
-    }
+    })
 
 
 @router.delete("/{article_id}", response_model=dict)
@@ -136,18 +212,18 @@ def delete_article(
     db.delete(db_article)
     db.commit()
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "مقاله با موفقیت حذف شد"
-    }
+    })
 
 
 @router.get("/categories/list", response_model=dict)
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_async_read_db)):
     """دریافت لیست دسته‌بندی‌های مقالات"""
-    categories = db.query(models.Article.category).distinct().all()
-    category_list = ["همه"] + [cat[0] for cat in categories]
+    result = await db.execute(select(models.Article.category).distinct())
+    category_list = ["همه"] + list(result.scalars().all())
     
-    return {
+    return serialization.respond({
         "data": category_list
-    }
+    })
@@ -1,72 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
 from typing import Optional
 import math
 
-from app.database import get_db
-from app import models, schemas, auth
+from app.database import get_db, get_async_read_db
+from app import models, schemas, auth, batch, cache, conditional, pagination, serialization, view_counter
+from app.search import ranked_matches
 
 router = APIRouter(prefix="/api/gallery", tags=["Gallery"])
 
 
 @router.get("", response_model=dict)
-def get_gallery_items(
+async def get_gallery_items(
+    request: Request,
     category: Optional[str] = None,
     search: Optional[str] = None,
     page: int = Query(1, ge=1),
     limit: int = Query(12, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    ids: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """دریافت لیست آیتم‌های گالری"""
-    query = db.query(models.GalleryItem)
+    """
+    دریافت لیست آیتم‌های گالری
+    - ids: دریافت دسته‌ای با شناسه (1,2,3) به همان ترتیب، بدون pagination
+    - expand=slider: اسلایدر هر آیتم در فیلد slider
+    """
+    id_list = batch.parse_ids(ids)
+    expands = batch.parse_expand(expand)
+    
+    # full_description فقط در صفحه جزئیات خوانده می‌شود
+    query = select(models.GalleryItem).options(defer(models.GalleryItem.full_description, raiseload=True))
+    if id_list is not None:
+        query = query.where(models.GalleryItem.id.in_(id_list))
     
     # فیلتر دسته‌بندی
     if category and category != "همه":
-        query = query.filter(models.GalleryItem.category == category)
+        query = query.where(models.GalleryItem.category == category)
     
-    # جستجو
-    if search:
+    # جستجوی متن کامل با رتبه‌بندی؛ در نبود ایندکس FTS جستجوی ILIKE
+    matches = ranked_matches("gallery_items", search) if search else None
+    if matches is not None:
+        query = query.join(matches, matches.c.id == models.GalleryItem.id)
+    elif search:
         search_filter = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             (models.GalleryItem.title.ilike(search_filter)) |
             (models.GalleryItem.description.ilike(search_filter))
         )
     
-    # مرتب‌سازی بر اساس تاریخ
-    query = query.order_by(models.GalleryItem.created_at.desc())
+    # ETag / Last-Modified پیش از خواندن ردیف‌ها
+    validators = await conditional.list_validators_async(db, "gallery_items", query, request)
+    if "slider" in expands:
+        slider_validators = await conditional.list_validators_async(db, "sliders", select(models.Slider), request)
+        validators = conditional.combine(validators, slider_validators)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    if id_list is not None:
+        result = await db.execute(query)
+        items_data = serialization.dump_list(schemas.GalleryItemSummary, batch.in_order(result.scalars().all(), id_list))
+        if "slider" in expands:
+            await batch.embed_sliders_async(db, items_data)
+        return serialization.respond({"data": items_data}, headers=conditional.headers(validators))
     
     # Pagination
-    total = query.count()
-    total_pages = math.ceil(total / limit)
+    total = None
+    total_pages = None
+    if include_total:
+        key = cache.count_key("gallery_items", category, search)
+        total = cache.count_cache.get(key)
+        if total is None:
+            total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+            cache.count_cache.set(key, total)
+        total_pages = math.ceil(total / limit)
     offset = (page - 1) * limit
     
-    items = query.offset(offset).limit(limit).all()
-    
-    items_data = [schemas.GalleryItem.from_orm(item) for item in items]
-    
-    return {
+    # نتایج جستجو بر اساس میزان ارتباط مرتب می‌شوند (فقط با offset)
+    if matches is not None:
+        query = query.order_by(matches.c.rank, models.GalleryItem.id.desc())
+        result = await db.execute(query.offset(offset).limit(limit))
+        items_data = serialization.dump_list(schemas.GalleryItemSummary, result.scalars().all())
+        if "slider" in expands:
+            await batch.embed_sliders_async(db, items_data)
+        return serialization.respond({
+            "data": items_data,
+            "total": total,
+            "page": page,
+            "limit": limit,
+            "pages": total_pages,
+            "next_cursor": None
+        }, headers=conditional.headers(validators))
+    
+    # مرتب‌سازی بر اساس تاریخ (id برای ترتیب یکتا و پایدار)
+    sort_keys = pagination.sort_columns(models.GalleryItem, "latest")
+    query = query.order_by(*pagination.order_by_clause(sort_keys))
+    
+    # cursor بر page مقدم است
+    if cursor:
+        values = pagination.decode_cursor(cursor, "latest", sort_keys)
+        query = query.where(pagination.keyset_filter(sort_keys, values, db.bind.dialect.name))
+    else:
+        query = query.offset(offset)
+    
+    result = await db.execute(query.limit(limit + 1))
+    items = result.scalars().all()
+    
+    items_data = serialization.dump_list(schemas.GalleryItemSummary, items[:limit])
+    if "slider" in expands:
+        await batch.embed_sliders_async(db, items_data)
+    
+    return serialization.respond({
         "data": items_data,
         "total": total,
         "page": page,
         "limit": limit,
-        "pages": total_pages
-    }
+        "pages": total_pages,
+        "next_cursor": pagination.next_cursor("latest", items, limit, sort_keys)
+    }, headers=conditional.headers(validators))
 
 
 @router.get("/{item_id}", response_model=dict)
-def get_gallery_item(item_id: int, db: Session = Depends(get_db)):
+async def get_gallery_item(item_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """دریافت یک آیتم گالری"""
-    item = db.query(models.GalleryItem).filter(models.GalleryItem.id == item_id).first()
+    stamps = (await db.execute(
+        select(*conditional.stamp_columns(models.GalleryItem)).where(models.GalleryItem.id == item_id)
+    )).first()
     
-    if not item:
+    if not stamps:
         raise HTTPException(status_code=404, detail="آیتم یافت نشد")
     
-    # افزایش بازدید
-    item.views += 1
-    db.commit()
-    db.refresh(item)
+    # بازدید در بافر write-behind ثبت می‌شود (حتی اگر پاسخ 304 باشد)
+    view_counter.record("gallery_items", item_id)
+    
+    validators = conditional.row_validators("gallery_items", item_id, *stamps)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    result = await db.execute(select(models.GalleryItem).where(models.GalleryItem.id == item_id))
+    item_data = serialization.dump_one(schemas.GalleryItem, result.scalar_one())
+    item_data["views"] = (item_data["views"] or 0) + view_counter.pending("gallery_items", item_id)
     
-    return {"data": schemas.GalleryItem.from_orm(item)}
+    return serialization.respond({"data": item_data}, headers=conditional.headers(validators))
 
 
 @router.post("", response_model=dict, status_code=201)
@@ -81,10 +160,10 @@ def create_gallery_item(
     db.commit()
     db.refresh(db_item)
     
-    return {
-        "data": schemas.GalleryItem.from_orm(db_item),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.GalleryItem, db_item),
         "message": "آیتم با موفقیت ایجاد شد"
-    }
+    }, status_code=201)
 
 
 @router.put("/{item_id}", response_model=dict)
@@ -107,10 +186,10 @@ def update_gallery_item(
     db.commit()
     db.refresh(db_item)
     
-    return {
-        "data": schemas.GalleryItem.from_orm(db_item),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.GalleryItem, db_item),
         "message": "آیتم با موفقیت بروزرسانی شد"
-    }
+    })
 
 
 @router.delete("/{item_id}", response_model=dict)
@@ -128,18 +207,18 @@ def delete_gallery_item(
     db.delete(db_item)
     db.commit()
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "آیتم با موفقیت حذف شد"
-    }
+    })
 
 
 @router.get("/categories/list", response_model=dict)
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_async_read_db)):
     """دریافت لیست دسته‌بندی‌ها"""
-    categories = db.query(models.GalleryItem.category).distinct().all()
-    category_list = ["همه"] + [cat[0] for cat in categories]
+    result = await db.execute(select(models.GalleryItem.category).distinct())
+    category_list = ["همه"] + list(result.scalars().all())
     
-    return {
+    return serialization.respond({
         "data": category_list
-    }
+    })
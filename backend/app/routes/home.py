@@ -0,0 +1,106 @@
+"""
+روت تجمیعی صفحه اصلی
+
+همه بخش‌های صفحه اصلی (اسلایدرها، خدمات، آمار، نظرات، گواهینامه‌ها،
+ویدیوها، مقالات و گالری) با یک درخواست و در یک Session خواندنی ساخته
+می‌شوند؛ به جای هفت رفت‌وبرگشت و هفت Session برای هر بازدیدکننده.
+پاسخ به صورت یک واحد در کش پاسخ (response_cache) نگه داشته می‌شود.
+"""
+import hashlib
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+
+from app.database import get_async_read_db
+from app import models, schemas, cache, conditional, pagination, serialization
+
+router = APIRouter(prefix="/api/home", tags=["Home"])
+
+
+async def _all(db: AsyncSession, query) -> list:
+    return (await db.execute(query)).scalars().all()
+
+
+async def _total(db: AsyncSession, table: str, model) -> int:
+    key = cache.count_key(table, None, None)
+    total = cache.count_cache.get(key)
+    if total is None:
+        total = (await db.execute(select(func.count()).select_from(model))).scalar_one()
+        cache.count_cache.set(key, total)
+    return total
+
+
+@router.get("", response_model=dict)
+async def get_home(
+    request: Request,
+    articles_limit: int = Query(100, ge=1, le=100),
+    gallery_limit: int = Query(100, ge=1, le=100),
+    videos_limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """دریافت همه بخش‌های صفحه اصلی در یک درخواست"""
+    sliders = await _all(db, select(models.Slider).order_by(models.Slider.created_at.desc()))
+    services = await _all(
+        db,
+        select(models.Service).where(models.Service.active == True).order_by(models.Service.order),
+    )
+    statistics = await _all(db, select(models.Statistic).order_by(models.Statistic.order))
+    testimonials = await _all(
+        db,
+        select(models.Testimonial)
+        .where(models.Testimonial.approved == True)
+        .order_by(models.Testimonial.created_at.desc()),
+    )
+    certificates = await _all(db, select(models.Certificate).order_by(models.Certificate.created_at.desc()))
+    videos = await _all(
+        db,
+        select(models.Video)
+        .where(models.Video.active == True)
+        .order_by(models.Video.order, desc(models.Video.created_at))
+        .limit(videos_limit),
+    )
+
+    # مقالات و گالری: جدیدترین‌ها بدون متن کامل (مثل /api/articles و /api/gallery)
+    articles = await _all(
+        db,
+        select(models.Article)
+        .options(defer(models.Article.full_content, raiseload=True))
+        .order_by(*pagination.order_by_clause(pagination.sort_columns(models.Article, "latest")))
+        .limit(articles_limit),
+    )
+    gallery = await _all(
+        db,
+        select(models.GalleryItem)
+        .options(defer(models.GalleryItem.full_description, raiseload=True))
+        .order_by(*pagination.order_by_clause(pagination.sort_columns(models.GalleryItem, "latest")))
+        .limit(gallery_limit),
+    )
+
+    content = {
+        "data": {
+            "sliders": serialization.dump_list(schemas.Slider, sliders),
+            "services": serialization.dump_list(schemas.Service, services),
+            "statistics": serialization.dump_list(schemas.Statistic, statistics),
+            "testimonials": serialization.dump_list(schemas.Testimonial, testimonials),
+            "certificates": serialization.dump_list(schemas.Certificate, certificates),
+            "videos": serialization.dump_list(schemas.Video, videos),
+            "articles": {
+                "data": serialization.dump_list(schemas.ArticleSummary, articles),
+                "total": await _total(db, "articles", models.Article),
+            },
+            "gallery": {
+                "data": serialization.dump_list(schemas.GalleryItemSummary, gallery),
+                "total": await _total(db, "gallery_items", models.GalleryItem),
+            },
+        }
+    }
+
+    # ETag از خود بدنه؛ بخش‌ها از جداول مختلف می‌آیند
+    response = serialization.respond(content)
+    validators = conditional.Validators(f'W/"{hashlib.sha1(response.body).hexdigest()[:20]}"', None)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    response.headers.update(conditional.headers(validators))
+    return response
@@ -1,27 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
+import asyncio
+import orjson
 
-from app.database import get_db
-from app import models, schemas, auth
+from app.config import settings
+from app.database import get_db, get_async_db, get_read_db
+from app import models, schemas, auth, batch, conditional, live_visits, serialization, visit_dictionary, visit_ingest, visit_queue
 
 router = APIRouter(prefix="/api", tags=["Other"])
 
+_visit_batch = TypeAdapter(List[schemas.VisitCreate])
+
+
+def _visit_context(request: Request) -> dict:
+    """IP، user-agent و referer درخواست برای ثبت بازدید"""
+    ip_header = request.headers.get('x-forwarded-for') or ''
+    ip = ip_header.split(',')[0].strip() if ip_header else (request.client.host if request.client else None)
+    return {
+        "ip": ip,
+        "user_agent": request.headers.get('user-agent'),
+        "referer": request.headers.get('referer'),
+    }
+
+
+def _validators_with_sliders(db: Session, table: str, query, request: Request, expands: set):
+    """ETag لیست؛ با expand=slider تغییر اسلایدرها هم آن را عوض می‌کند"""
+    validators = conditional.list_validators(db, table, query, request)
+    if "slider" in expands:
+        slider_validators = conditional.list_validators(db, "sliders", select(models.Slider), request)
+        validators = conditional.combine(validators, slider_validators)
+    return validators
+
 
 # ============= TESTIMONIALS =============
 
 @router.get("/testimonials", response_model=dict)
-def get_testimonials(db: Session = Depends(get_db)):
+def get_testimonials(request: Request, db: Session = Depends(get_read_db)):
     """دریافت نظرات تایید شده"""
-    testimonials = db.query(models.Testimonial)\
+    query = db.query(models.Testimonial)\
         .filter(models.Testimonial.approved == True)\
-        .order_by(models.Testimonial.created_at.desc())\
-        .all()
+        .order_by(models.Testimonial.created_at.desc())
+    
+    validators = conditional.list_validators(db, "testimonials", query, request)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
     
-    testimonials_data = [schemas.Testimonial.from_orm(t) for t in testimonials]
-    return {"data": testimonials_data}
+    testimonials_data = serialization.dump_list(schemas.Testimonial, query.all())
+    return serialization.respond({"data": testimonials_data}, headers=conditional.headers(validators))
 
 
 @router.post("/testimonials", response_model=dict, status_code=201)
@@ -38,10 +70,10 @@ def create_testimonial(
     db.commit()
     db.refresh(db_testimonial)
     
-    return {
-        "data": schemas.Testimonial.from_orm(db_testimonial),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Testimonial, db_testimonial),
         "message": "نظر شما ثبت شد و پس از بررسی منتشر خواهد شد"
-    }
+    }, status_code=201)
 
 
 @router.put("/testimonials/{testimonial_id}/approve", response_model=dict)
@@ -61,27 +93,44 @@ def approve_testimonial(
     testimonial.approved = True
     db.commit()
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "نظر با موفقیت تایید شد"
-    }
+    })
 
 
 # ============= CERTIFICATES =============
 
 @router.get("/certificates", response_model=dict)
-def get_certificates(db: Session = Depends(get_db)):
-    """دریافت گواهینامه‌ها"""
-    certificates = db.query(models.Certificate)\
-        .order_by(models.Certificate.created_at.desc())\
-        .all()
+def get_certificates(
+    request: Request,
+    ids: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """دریافت گواهینامه‌ها (ids=1,2,3 برای دریافت دسته‌ای، expand=slider برای اسلایدرها)"""
+    id_list = batch.parse_ids(ids)
+    expands = batch.parse_expand(expand)
+    query = db.query(models.Certificate)\
+        .order_by(models.Certificate.created_at.desc())
+    if id_list is not None:
+        query = query.filter(models.Certificate.id.in_(id_list))
     
-    certificates_data = [schemas.Certificate.from_orm(c) for c in certificates]
-    return {"data": certificates_data}
+    validators = _validators_with_sliders(db, "certificates", query, request, expands)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    certificates = query.all()
+    if id_list is not None:
+        certificates = batch.in_order(certificates, id_list)
+    certificates_data = serialization.dump_list(schemas.Certificate, certificates)
+    if "slider" in expands:
+        batch.embed_sliders(db, certificates_data)
+    return serialization.respond({"data": certificates_data}, headers=conditional.headers(validators))
 
 
 @router.get("/certificates/{certificate_id}", response_model=dict)
-def get_certificate(certificate_id: int, db: Session = Depends(get_db)):
+def get_certificate(certificate_id: int, request: Request, db: Session = Depends(get_read_db)):
     """دریافت یک گواهینامه با ID"""
     certificate = db.query(models.Certificate).filter(
         models.Certificate.id == certificate_id
@@ -90,8 +139,12 @@ def get_certificate(certificate_id: int, db: Session = Depends(get_db)):
     if not certificate:
         raise HTTPException(status_code=404, detail="گواهینامه یافت نشد")
     
-    certificate_data = schemas.Certificate.from_orm(certificate)
-    return {"data": certificate_data}
+    validators = conditional.object_validators(certificate)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    certificate_data = serialization.dump_one(schemas.Certificate, certificate)
+    return serialization.respond({"data": certificate_data}, headers=conditional.headers(validators))
 
 
 @router.post("/certificates", response_model=dict, status_code=201)
@@ -106,76 +159,149 @@ def create_certificate(
     db.commit()
     db.refresh(db_certificate)
     
-    return {
-        "data": schemas.Certificate.from_orm(db_certificate),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Certificate, db_certificate),
         "message": "گواهینامه با موفقیت اضافه شد"
-    }
+    }, status_code=201)
 
 
 # ============= STATISTICS =============
 
-@router.post("/visit", status_code=201)
-def track_visit(
-    visit: schemas.VisitCreate,
-    request: Request,
-    db: Session = Depends(get_db)
-):
-    """ثبت بازدید صفحه"""
+@router.post("/visit", status_code=202)
+async def track_visit(visit: schemas.VisitCreate, request: Request):
+    """ثبت بازدید صفحه (در صف؛ نوشتن دسته‌ای در پس‌زمینه)"""
+    row = visit_queue.build_row(visit, **_visit_context(request))
+    if not visit_ingest.deduplicate([row]):
+        return serialization.respond({"success": True}, status_code=202)
+    # بازدیدهای حذف شده در نمونه‌برداری هم در جریان زنده دیده می‌شوند
+    sampled = visit_ingest.sample([row])
+    accepted = visit_queue.enqueue(row) if sampled else True
+    if accepted:
+        live_visits.publish(row)
+    if not accepted and settings.VISIT_QUEUE_POLICY == "reject":
+        visit_ingest.forget(row)
+        return serialization.respond(
+            {"success": False, "message": "صف ثبت بازدید پر است"},
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+    return serialization.respond({"success": True}, status_code=202)
+
+
+@router.post("/visit/batch", status_code=201)
+async def track_visit_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    ثبت دسته‌ای بازدیدها (مناسب navigator.sendBeacon)
+    بدنه: آرایه JSON از VisitCreate؛ Content-Type بررسی نمی‌شود چون
+    sendBeacon بین دامنه‌ای فقط text/plain می‌فرستد.
+    """
     try:
-        ip_header = request.headers.get('x-forwarded-for') or ''
-        ip = ip_header.split(',')[0].strip() if ip_header else (request.client.host if request.client else None)
-        user_agent = request.headers.get('user-agent')
-        referer = visit.referer or request.headers.get('referer')
-
-        db_visit = models.Visit(
-            path=visit.path[:500],
-            ip=ip[:100] if ip else None,
-            user_agent=user_agent,
-            referer=referer[:500] if referer else None
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="بدنه درخواست JSON معتبر نیست")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="بدنه درخواست باید آرایه‌ای از بازدیدها باشد")
+    if len(payload) > settings.VISIT_BATCH_MAX_EVENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"حداکثر {settings.VISIT_BATCH_MAX_EVENTS} بازدید در هر درخواست مجاز است"
         )
-        db.add(db_visit)
-        db.commit()
-    except Exception as exc:  # لاگ خطا و ادامه بدون توقف
-        print("visit log error", exc)
-    return {"success": True}
+    try:
+        visits = _visit_batch.validate_python(payload)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
+    
+    if visits:
+        context = _visit_context(request)
+        now = datetime.utcnow()
+        rows = visit_ingest.deduplicate([visit_queue.build_row(visit, now=now, **context) for visit in visits])
+        sampled = visit_ingest.sample(rows)
+        if sampled:
+            try:
+                encoded = await visit_dictionary.encode_async(db.bind, sampled)
+                await db.execute(insert(models.Visit), encoded)
+                await db.commit()
+            except (Exception, asyncio.CancelledError):
+                # دسته ثبت نشد؛ تلاش دوباره کلاینت نباید تکراری شمرده شود
+                for row in rows:
+                    visit_ingest.forget(row)
+                raise
+        for row in rows:
+            live_visits.publish(row)
+    return serialization.respond({"success": True, "count": len(visits)}, status_code=201)
 
 @router.get("/sliders/{slider_id}", response_model=dict)
-def get_slider(slider_id: int, db: Session = Depends(get_db)):
+def get_slider(slider_id: int, request: Request, db: Session = Depends(get_read_db)):
     """دریافت یک اسلایدر با تمام تصاویر آن"""
     slider = db.query(models.Slider).filter(models.Slider.id == slider_id).first()
     
     if not slider:
-        return {
+        return serialization.respond({
             "data": None,
             "message": "اسلایدر یافت نشد"
-        }
+        })
+    
+    validators = conditional.object_validators(slider)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
     
-    slider_data = schemas.Slider.from_orm(slider)
-    return {"data": slider_data}
+    slider_data = serialization.dump_one(schemas.Slider, slider)
+    return serialization.respond({"data": slider_data}, headers=conditional.headers(validators))
 
 
 @router.get("/sliders", response_model=dict)
-def list_sliders(db: Session = Depends(get_db)):
-    """دریافت لیست تمام اسلایدرها (برای نمایش در بخش‌های عمومی مثل هدر)"""
-    sliders = db.query(models.Slider).order_by(models.Slider.created_at.desc()).all()
-    sliders_data = [schemas.Slider.from_orm(s) for s in sliders]
-    return {"data": sliders_data}
+def list_sliders(request: Request, ids: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """
+    دریافت لیست تمام اسلایدرها (برای نمایش در بخش‌های عمومی مثل هدر)
+    - ids: دریافت دسته‌ای اسلایدرها با شناسه (1,2,3) به همان ترتیب
+    """
+    id_list = batch.parse_ids(ids)
+    query = db.query(models.Slider).order_by(models.Slider.created_at.desc())
+    if id_list is not None:
+        query = query.filter(models.Slider.id.in_(id_list))
+    
+    validators = conditional.list_validators(db, "sliders", query, request)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    sliders = query.all()
+    if id_list is not None:
+        sliders = batch.in_order(sliders, id_list)
+    sliders_data = serialization.dump_list(schemas.Slider, sliders)
+    return serialization.respond({"data": sliders_data}, headers=conditional.headers(validators))
 
 
 @router.get("/services", response_model=dict)
-def get_services(db: Session = Depends(get_db)):
-    """دریافت خدمات فعال"""
-    services = db.query(models.Service)\
+def get_services(
+    request: Request,
+    ids: Optional[str] = None,
+    expand: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """دریافت خدمات فعال (ids=1,2,3 برای دریافت دسته‌ای، expand=slider برای اسلایدرها)"""
+    id_list = batch.parse_ids(ids)
+    expands = batch.parse_expand(expand)
+    query = db.query(models.Service)\
         .filter(models.Service.active == True)\
-        .order_by(models.Service.order)\
-        .all()
+        .order_by(models.Service.order)
+    if id_list is not None:
+        query = query.filter(models.Service.id.in_(id_list))
+    
+    validators = _validators_with_sliders(db, "services", query, request, expands)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
     
-    services_data = [schemas.Service.from_orm(s) for s in services]
-    return {"data": services_data}
+    services = query.all()
+    if id_list is not None:
+        services = batch.in_order(services, id_list)
+    services_data = serialization.dump_list(schemas.Service, services)
+    if "slider" in expands:
+        batch.embed_sliders(db, services_data)
+    return serialization.respond({"data": services_data}, headers=conditional.headers(validators))
 
 
 @router.get("/services/{service_id}", response_model=dict)
-def get_service(service_id: int, db: Session = Depends(get_db)):
+def get_service(service_id: int, request: Request, db: Session = Depends(get_read_db)):
     """دریافت یک خدمت با ID"""
     service = db.query(models.Service).filter(
         models.Service.id == service_id,
@@ -185,19 +311,26 @@ def get_service(service_id: int, db: Session = Depends(get_db)):
     if not service:
         raise HTTPException(status_code=404, detail="خدمت یافت نشد")
     
-    service_data = schemas.Service.from_orm(service)
-    return {"data": service_data}
+    validators = conditional.object_validators(service)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    service_data = serialization.dump_one(schemas.Service, service)
+    return serialization.respond({"data": service_data}, headers=conditional.headers(validators))
 
 
 @router.get("/statistics", response_model=dict)
-def get_statistics(db: Session = Depends(get_db)):
+def get_statistics(request: Request, db: Session = Depends(get_read_db)):
     """دریافت آمار سایت"""
-    statistics = db.query(models.Statistic)\
-        .order_by(models.Statistic.order)\
-        .all()
+    query = db.query(models.Statistic)\
+        .order_by(models.Statistic.order)
+    
+    validators = conditional.list_validators(db, "statistics", query, request)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
     
-    statistics_data = [schemas.Statistic.from_orm(s) for s in statistics]
-    return {"data": statistics_data}
+    statistics_data = serialization.dump_list(schemas.Statistic, query.all())
+    return serialization.respond({"data": statistics_data}, headers=conditional.headers(validators))
 
 
 @router.post("/statistics", response_model=dict, status_code=201)
@@ -212,10 +345,10 @@ def create_statistic(
     db.commit()
     db.refresh(db_statistic)
     
-    return {
-        "data": schemas.Statistic.from_orm(db_statistic),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Statistic, db_statistic),
         "message": "آمار با موفقیت اضافه شد"
-    }
+    }, status_code=201)
 
 
 @router.put("/statistics/{stat_id}", response_model=dict)
@@ -235,10 +368,10 @@ def update_statistic(
     db.commit()
     db.refresh(statistic)
     
-    return {
-        "data": schemas.Statistic.from_orm(statistic),
+    return serialization.respond({
+        "data": serialization.dump_one(schemas.Statistic, statistic),
         "message": "آمار بروزرسانی شد"
-    }
+    })
 
 
 # ============= CONTACT =============
@@ -256,10 +389,10 @@ def send_contact(
     
     # اینجا می‌توانید ایمیل ارسال کنید
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "پیام شما با موفقیت ارسال شد. به زودی با شما تماس خواهیم گرفت."
-    }
+    })
 
 
 @router.get("/contact/messages", response_model=dict)
@@ -272,8 +405,8 @@ def get_messages(
         .order_by(models.Contact.created_at.desc())\
         .all()
     
-    messages_data = [schemas.Contact.from_orm(m) for m in messages]
-    return {"data": messages_data}
+    messages_data = serialization.dump_list(schemas.Contact, messages)
+    return serialization.respond({"data": messages_data})
 
 
 @router.put("/contact/{message_id}/read", response_model=dict)
@@ -291,10 +424,10 @@ def mark_message_read(
     message.read = True
     db.commit()
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "پیام به عنوان خوانده شده علامت‌گذاری شد"
-    }
+    })
 
 
 # ============= NEWSLETTER =============
@@ -312,28 +445,28 @@ def subscribe_newsletter(
     
     if existing:
         if existing.active:
-            return {
+            return serialization.respond({
                 "success": True,
                 "message": "این ایمیل قبلا ثبت شده است"
-            }
+            })
         else:
             # فعال کردن مجدد
             existing.active = True
             db.commit()
-            return {
+            return serialization.respond({
                 "success": True,
                 "message": "اشتراک شما مجددا فعال شد"
-            }
+            })
     
     # ثبت ایمیل جدید
     db_newsletter = models.Newsletter(**email_data.dict())
     db.add(db_newsletter)
     db.commit()
     
-    return {
+    return serialization.respond({
         "success": True,
         "message": "ایمیل شما با موفقیت در خبرنامه ثبت شد"
-    }
+    })
 
 
 @router.get("/newsletter/subscribers", response_model=dict)
@@ -347,8 +480,8 @@ def get_subscribers(
         .order_by(models.Newsletter.created_at.desc())\
         .all()
     
-    subscribers_data = [schemas.Newsletter.from_orm(s) for s in subscribers]
-    return {
+    subscribers_data = serialization.dump_list(schemas.Newsletter, subscribers)
+    return serialization.respond({
         "data": subscribers_data,
         "total": len(subscribers_data)
-    }
+    })
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List
@@ -86,7 +87,7 @@ async def upload_image(
 ):
     """آپلود تصویر (فقط ادمین)"""
     try:
-        file_url = save_upload_file(file, request)
+        file_url = await run_in_threadpool(save_upload_file, file, request)
         
         return {
             "success": True,
@@ -120,7 +121,7 @@ async def upload_multiple_images(
     
     for file in files:
         try:
-            file_url = save_upload_file(file, request)
+            file_url = await run_in_threadpool(save_upload_file, file, request)
             uploaded_urls.append(file_url)
         except HTTPException as e:
             errors.append({"filename": file.filename, "error": str(e.detail)})
@@ -152,7 +153,7 @@ async def delete_image(
         )
     
     try:
-        file_path.unlink()
+        await run_in_threadpool(file_path.unlink)
         return {
             "success": True,
             "message": "تصویر با موفقیت حذف شد"
@@ -2,10 +2,12 @@
 روت‌های مدیریت ویدیوها
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database import get_db
+from sqlalchemy import desc, select
+from app.database import get_db, get_async_read_db
+from app import conditional, serialization, view_counter
 from app.models import Video
 from app.schemas import Video as VideoSchema, VideoCreate, VideoUpdate
 
@@ -16,7 +18,8 @@ router = APIRouter(prefix="/api/videos", tags=["videos"])
 
 @router.get("", response_model=list[VideoSchema])
 async def get_videos(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
     active_only: bool = Query(True),
     limit: int = Query(10, ge=1, le=100)
 ):
@@ -25,35 +28,48 @@ async def get_videos(
     - active_only: فقط ویدیوهای فعال
     - limit: تعداد ویدیوها
     """
-    query = db.query(Video)
+    query = select(Video)
     
     if active_only:
-        query = query.filter(Video.active == True)
+        query = query.where(Video.active == True)
     
-    videos = query.order_by(Video.order, desc(Video.created_at)).limit(limit).all()
-    return videos
+    validators = await conditional.list_validators_async(db, "videos", query, request)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
+    
+    result = await db.execute(query.order_by(Video.order, desc(Video.created_at)).limit(limit))
+    return serialization.respond(
+        serialization.dump_list(VideoSchema, result.scalars().all()),
+        headers=conditional.headers(validators),
+    )
 
 
 @router.get("/{video_id}", response_model=VideoSchema)
-async def get_video(video_id: int, db: Session = Depends(get_db)):
+async def get_video(video_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """
     دریافت یک ویدیو
     """
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if not video:
+    stamps = (await db.execute(select(*conditional.stamp_columns(Video)).where(Video.id == video_id))).first()
+    if not stamps:
         raise HTTPException(status_code=404, detail="ویدیو یافت نشد")
     
-    # افزایش تعداد بازدید
-    video.views += 1
-    db.commit()
+    # بازدید در بافر write-behind ثبت می‌شود (حتی اگر پاسخ 304 باشد)
+    view_counter.record("videos", video_id)
+    
+    validators = conditional.row_validators("videos", video_id, *stamps)
+    if conditional.is_not_modified(request, validators):
+        return conditional.not_modified(validators)
     
-    return video
+    result = await db.execute(select(Video).where(Video.id == video_id))
+    video_data = serialization.dump_one(VideoSchema, result.scalar_one())
+    video_data["views"] = (video_data["views"] or 0) + view_counter.pending("videos", video_id)
+    return serialization.respond(video_data, headers=conditional.headers(validators))
 
 
 # ============= ادمین (احتیاج به احراز هویت) =============
 
 @router.post("", response_model=VideoSchema)
-async def create_video(
+def create_video(
     video: VideoCreate,
     db: Session = Depends(get_db)
 ):
@@ -68,7 +84,7 @@ async def create_video(
 
 
 @router.put("/{video_id}", response_model=VideoSchema)
-async def update_video(
+def update_video(
     video_id: int,
     video: VideoUpdate,
     db: Session = Depends(get_db)
@@ -90,7 +106,7 @@ async def update_video(
 
 
 @router.delete("/{video_id}", status_code=200)
-async def delete_video(
+def delete_video(
     video_id: int,
     db: Session = Depends(get_db)
 ):
@@ -107,7 +123,7 @@ async def delete_video(
 
 
 @router.post("/{video_id}/toggle", response_model=VideoSchema)
-async def toggle_video(
+def toggle_video(
     video_id: int,
     db: Session = Depends(get_db)
 ):
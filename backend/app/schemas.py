@@ -58,6 +58,32 @@ class Article(ArticleBase):
     class Config:
         from_attributes = True
 
+
+class ArticleSummary(BaseModel):
+    """نسخه سبک مقاله برای لیست‌ها (بدون full_content)"""
+    model_config = ConfigDict(from_attributes=True, protected_namespaces=())
+    
+    id: int
+    title: str
+    excerpt: str
+    category: str
+    icon: str = "📝"
+    gradient: Optional[str] = None
+    image: Optional[str] = None
+    slider_id: Optional[int] = None
+    author: str
+    author_avatar: Optional[str] = None
+    author_role: Optional[str] = None
+    read_time: Optional[str] = None
+    featured: bool = False
+    tags: List[str] = []
+    iframe_url: Optional[str] = None
+    model_url: Optional[str] = None
+    model_type: str = "auto"
+    views: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
 # ============= Settings Schemas =============
 
 class SettingsBase(BaseModel):
@@ -136,6 +162,30 @@ class GalleryItem(GalleryItemBase):
         from_attributes = True
 
 
+class GalleryItemSummary(BaseModel):
+    """نسخه سبک آیتم گالری برای لیست‌ها (بدون full_description)"""
+    model_config = ConfigDict(from_attributes=True, protected_namespaces=())
+    
+    id: int
+    title: str
+    description: str
+    icon: str = "🎨"
+    gradient: Optional[str] = None
+    image: Optional[str] = None
+    slider_id: Optional[int] = None
+    category: str
+    category_color: Optional[str] = None
+    date: Optional[str] = None
+    duration: Optional[str] = None
+    technologies: List[str] = []
+    model_url: Optional[str] = None
+    model_type: str = "auto"
+    iframe_url: Optional[str] = None
+    views: int
+    comments: int
+    created_at: datetime
+
+
 # ============= Testimonial Schemas =============
 
 class TestimonialBase(BaseModel):
@@ -229,6 +279,7 @@ class Statistic(StatisticBase):
 class VisitCreate(BaseModel):
     path: str
     referer: Optional[str] = None
+    client_ts: Optional[datetime] = None  # زمان واقعی رویداد در مرورگر
 
 
 class VisitSummary(BaseModel):
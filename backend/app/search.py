@@ -0,0 +1,233 @@
+"""
+جستجوی متن کامل (Full-Text Search) برای مقالات و گالری
+
+- SQLite: جداول مجازی FTS5 (`articles_fts`, `gallery_items_fts`) که rowid
+  آن‌ها همان id ردیف اصلی است و رتبه‌بندی با bm25 انجام می‌شود.
+- PostgreSQL: جداول `articles_search` / `gallery_items_search` با ستون
+  tsvector و ایندکس GIN؛ رتبه‌بندی با ts_rank.
+
+متن پیش از ایندکس و عبارت جستجو پیش از اجرا با normalize_persian یکسان
+می‌شوند (ي/ی، ك/ک، نیم‌فاصله، اعراب و ارقام عربی/فارسی). ایندکس در
+after_flush همان Session به‌روز می‌شود، پس با هر نوشتن در همان تراکنش
+همگام می‌ماند.
+"""
+import html
+import re
+from typing import Optional
+
+from sqlalchemy import Float, Integer, event, inspect, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import engine
+
+
+# ============= Persian normalization =============
+
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc",  # ي -> ی
+    "\u0649": "\u06cc",  # ى -> ی
+    "\u0643": "\u06a9",  # ك -> ک
+    "\u0629": "\u0647",  # ة -> ه
+    "\u06c0": "\u0647",  # ۀ -> ه
+    "\u0623": "\u0627",  # أ -> ا
+    "\u0625": "\u0627",  # إ -> ا
+    "\u0622": "\u0627",  # آ -> ا
+    "\u0624": "\u0648",  # ؤ -> و
+    "\u200c": " ",        # نیم‌فاصله (ZWNJ)
+    "\u200d": "",
+    "\u200e": "",
+    "\u200f": "",
+    "\u0640": "",         # کشیده (tatweel)
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+})
+# اعراب (فتحه، کسره، تنوین، تشدید، ...)
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670]")
+_HTML_TAGS = re.compile(r"<[^>]+>")
+
+
+def normalize_persian(value: Optional[str]) -> str:
+    """یکسان‌سازی متن فارسی/عربی برای ایندکس و جستجو"""
+    if not value:
+        return ""
+    value = _DIACRITICS.sub("", value.translate(_CHAR_MAP))
+    return " ".join(value.lower().split())
+
+
+def _html_to_text(value: Optional[str]) -> str:
+    return html.unescape(_HTML_TAGS.sub(" ", value or ""))
+
+
+# ============= Indexed sources =============
+
+def _article_document(article) -> tuple:
+    body = " ".join([
+        article.excerpt or "",
+        _html_to_text(article.full_content),
+        " ".join(article.tags or []),
+    ])
+    return normalize_persian(article.title), normalize_persian(body)
+
+
+def _gallery_document(item) -> tuple:
+    body = " ".join([
+        item.description or "",
+        _html_to_text(item.full_description),
+        " ".join(item.technologies or []),
+    ])
+    return normalize_persian(item.title), normalize_persian(body)
+
+
+# جدول اصلی -> (مدل، تابع ساخت سند، فیلدهایی که در سند استفاده می‌شوند)
+SOURCES = {
+    "articles": (models.Article, _article_document, ("title", "excerpt", "full_content", "tags")),
+    "gallery_items": (models.GalleryItem, _gallery_document, ("title", "description", "full_description", "technologies")),
+}
+
+# نوع ایندکس فعال: "fts5"، "postgres" یا None (جستجوی ILIKE قدیمی)
+backend: Optional[str] = None
+
+
+def _index_table(table: str) -> str:
+    return f"{table}_fts" if backend == "fts5" else f"{table}_search"
+
+
+# ============= Schema & rebuild =============
+
+def init_search_index(bind=None):
+    """ساخت جداول ایندکس و پر کردن اولیه آن‌ها در صورت خالی بودن"""
+    global backend
+    bind = bind or engine
+    dialect = bind.dialect.name
+
+    with bind.begin() as conn:
+        if dialect == "sqlite":
+            try:
+                for table in SOURCES:
+                    conn.execute(text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+                        "USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+                    ))
+            except OperationalError as exc:
+                print(f"⚠️  FTS5 not available, falling back to LIKE search: {exc}")
+                backend = None
+                return
+            backend = "fts5"
+        elif dialect == "postgresql":
+            for table in SOURCES:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {table}_search ("
+                    f"id INTEGER PRIMARY KEY REFERENCES {table}(id) ON DELETE CASCADE, "
+                    "document TSVECTOR NOT NULL)"
+                ))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_search_document "
+                    f"ON {table}_search USING GIN (document)"
+                ))
+            backend = "postgres"
+        else:
+            backend = None
+            return
+
+    with Session(bind=bind) as session:
+        for table in SOURCES:
+            indexed = session.execute(text(f"SELECT COUNT(*) FROM {_index_table(table)}")).scalar()
+            if not indexed:
+                rebuild_index(session, table)
+        session.commit()
+
+
+def rebuild_index(session: Session, table: str) -> int:
+    """ساخت دوباره ایندکس یک جدول از روی داده‌های اصلی"""
+    model, build_document, _ = SOURCES[table]
+    session.execute(text(f"DELETE FROM {_index_table(table)}"))
+    count = 0
+    for obj in session.query(model).yield_per(500):
+        _upsert(session.connection(), table, obj.id, *build_document(obj))
+        count += 1
+    return count
+
+
+def _upsert(conn, table: str, row_id: int, title: str, body: str):
+    if backend == "fts5":
+        conn.execute(text(f"DELETE FROM {table}_fts WHERE rowid = :id"), {"id": row_id})
+        conn.execute(
+            text(f"INSERT INTO {table}_fts (rowid, title, body) VALUES (:id, :title, :body)"),
+            {"id": row_id, "title": title, "body": body},
+        )
+    elif backend == "postgres":
+        conn.execute(
+            text(
+                f"INSERT INTO {table}_search (id, document) VALUES (:id, "
+                "setweight(to_tsvector('simple', :title), 'A') || "
+                "setweight(to_tsvector('simple', :body), 'B')) "
+                "ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            {"id": row_id, "title": title, "body": body},
+        )
+
+
+def _delete(conn, table: str, row_id: int):
+    if backend == "fts5":
+        conn.execute(text(f"DELETE FROM {table}_fts WHERE rowid = :id"), {"id": row_id})
+    elif backend == "postgres":
+        conn.execute(text(f"DELETE FROM {table}_search WHERE id = :id"), {"id": row_id})
+
+
+def _document_changed(obj, fields) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    if backend is None:
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table not in SOURCES:
+            continue
+        _, build_document, fields = SOURCES[table]
+        conn = session.connection()
+        if obj in session.deleted:
+            _delete(conn, table, obj.id)
+        elif obj in session.new or _document_changed(obj, fields):
+            _upsert(conn, table, obj.id, *build_document(obj))
+
+
+# ============= Query =============
+
+_FTS5_SPECIAL = re.compile(r'["*^():{}\[\]+\-]')
+_TSQUERY_SPECIAL = re.compile(r"[&|!():*'\\<>]")
+
+
+def ranked_matches(table: str, query: str):
+    """
+    زیرکوئری (id, rank) برای ردیف‌های منطبق؛ rank کمتر یعنی مرتبط‌تر.
+    اگر ایندکس فعال نباشد یا عبارت پس از normalize خالی باشد None برمی‌گردد.
+    """
+    if backend is None:
+        return None
+
+    if backend == "fts5":
+        tokens = [tok for tok in _FTS5_SPECIAL.sub(" ", normalize_persian(query)).split() if tok]
+        if not tokens:
+            return None
+        match = " ".join(f'"{tok}"*' for tok in tokens)
+        stmt = text(
+            f"SELECT rowid AS id, bm25({table}_fts, 10.0, 1.0) AS rank "
+            f"FROM {table}_fts WHERE {table}_fts MATCH :fts_query"
+        ).bindparams(fts_query=match)
+    else:
+        tokens = [tok for tok in _TSQUERY_SPECIAL.sub(" ", normalize_persian(query)).split() if tok]
+        if not tokens:
+            return None
+        match = " & ".join(f"{tok}:*" for tok in tokens)
+        stmt = text(
+            f"SELECT id, -ts_rank(document, to_tsquery('simple', :fts_query)) AS rank "
+            f"FROM {table}_search WHERE document @@ to_tsquery('simple', :fts_query)"
+        ).bindparams(fts_query=match)
+
+    return stmt.columns(id=Integer, rank=Float).subquery(f"{table}_matches")
@@ -0,0 +1,64 @@
+"""
+لایه serialization سریع پاسخ‌ها
+
+مسیر قدیمی برای هر ردیف `schemas.X.from_orm` می‌ساخت، نتیجه را در یک
+dict با `response_model=dict` برمی‌گرداند و FastAPI دوباره کل ساختار را
+با `jsonable_encoder` پیمایش و سپس با `json.dumps` رمزگذاری می‌کرد.
+
+در این مسیر:
+- هر لیست با یک فراخوانی `TypeAdapter(List[Schema])` از روی attributeهای
+  ORM اعتبارسنجی و به dict تبدیل می‌شود (adapterها cache می‌شوند)
+- پاسخ مستقیما یک `ORJSONResponse` است؛ بنابراین FastAPI مرحله
+  response_model و jsonable_encoder را اجرا نمی‌کند و orjson مستقیما
+  bytes تولید می‌کند (datetime هم بدون تبدیل دستی رمزگذاری می‌شود)
+
+شکل پاسخ‌ها (`{"data", "total", "page", ...}`) تغییری نمی‌کند.
+"""
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Type
+
+import orjson
+from fastapi.responses import ORJSONResponse as _ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(obj: Any):
+    """انواعی که orjson به تنهایی نمی‌شناسد"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(_ORJSONResponse):
+    """پاسخ JSON با orjson؛ مدل‌های pydantic داخل محتوا هم پشتیبانی می‌شوند"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+@lru_cache(maxsize=None)
+def list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter لیست برای یک schema (یک بار ساخته می‌شود)"""
+    return TypeAdapter(List[schema])
+
+
+def dump_list(schema: Type[BaseModel], rows: Iterable[Any]) -> list:
+    """تبدیل لیست ردیف‌های ORM به لیست dict با یک فراخوانی اعتبارسنجی"""
+    adapter = list_adapter(schema)
+    return adapter.dump_python(adapter.validate_python(list(rows), from_attributes=True))
+
+
+def dump_one(schema: Type[BaseModel], obj: Any) -> dict:
+    """تبدیل یک ردیف ORM به dict"""
+    return schema.model_validate(obj, from_attributes=True).model_dump()
+
+
+def respond(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> ORJSONResponse:
+    """برگرداندن محتوای آماده بدون عبور از response_model و jsonable_encoder"""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
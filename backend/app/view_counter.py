@@ -0,0 +1,121 @@
+"""
+شمارنده بازدید write-behind
+
+روت‌های جزئیات (مقاله، آیتم گالری، ویدیو) به جای UPDATE و commit در هر
+درخواست فقط بازدید را در حافظه ثبت می‌کنند. افزایش‌ها برای هر (جدول، id)
+جمع می‌شوند و هر VIEW_FLUSH_INTERVAL_SECONDS یک بار به صورت دسته‌ای با
+`UPDATE ... SET views = views + :n` روی primary نوشته می‌شوند؛ در shutdown
+هم باقی‌مانده flush می‌شود. UPDATE مستقیم است، پس updated_at (و ETag) و
+کش‌ها دست نمی‌خورند.
+
+بافر per-process است؛ با چند worker هر کدام بافر خودش را flush می‌کند.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import bindparam, update
+
+from app import models
+from app.config import settings
+
+# جدول -> مدل دارای ستون views
+COUNTED_MODELS = {
+    model.__tablename__: model
+    for model in (models.Article, models.GalleryItem, models.Video)
+}
+
+_pending: Dict[Tuple[str, int], int] = defaultdict(int)
+_lock = threading.Lock()
+_flushed = 0
+
+
+def record(table: str, row_id: int, count: int = 1):
+    """ثبت بازدید در بافر (بدون دسترسی به دیتابیس)"""
+    with _lock:
+        _pending[(table, row_id)] += count
+
+
+def pending(table: str, row_id: int) -> int:
+    """بازدیدهای ثبت شده‌ای که هنوز flush نشده‌اند"""
+    with _lock:
+        return _pending.get((table, row_id), 0)
+
+
+def _drain() -> Dict[Tuple[str, int], int]:
+    global _pending
+    with _lock:
+        drained, _pending = _pending, defaultdict(int)
+    return drained
+
+
+def _restore(drained: Dict[Tuple[str, int], int]):
+    # flush ناموفق: افزایش‌ها به بافر برمی‌گردند تا در دور بعد نوشته شوند
+    with _lock:
+        for key, count in drained.items():
+            _pending[key] += count
+
+
+def _statement(model):
+    # updated_at روی مقدار فعلی نگه داشته می‌شود (onupdate اعمال نشود)
+    return (
+        update(model)
+        .where(model.id == bindparam("row_id"))
+        .values(views=model.views + bindparam("count"), updated_at=model.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _batches(drained: Dict[Tuple[str, int], int]):
+    grouped = defaultdict(list)
+    for (table, row_id), count in drained.items():
+        grouped[table].append({"row_id": row_id, "count": count})
+    for table, rows in grouped.items():
+        yield _statement(COUNTED_MODELS[table]), rows
+
+
+async def _write(db_engine, drained: Dict[Tuple[str, int], int]):
+    async with db_engine.begin() as connection:
+        for statement, rows in _batches(drained):
+            await connection.execute(statement, rows)
+
+
+async def flush(db_engine) -> int:
+    """نوشتن بافر در یک تراکنش؛ تعداد ردیف‌های بروز شده را برمی‌گرداند"""
+    global _flushed
+    drained = _drain()
+    if not drained:
+        return 0
+    # لغو flusher در shutdown (flusher.cancel) نوشتن نیمه‌کاره را رها نمی‌کند:
+    # منتظر پایان آن می‌ماند و فقط اگر commit نشده باشد افزایش‌ها برمی‌گردند
+    write = asyncio.ensure_future(_write(db_engine, drained))
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        await asyncio.wait([write])
+        raise
+    finally:
+        if not write.done() or write.cancelled() or write.exception() is not None:
+            _restore(drained)
+        else:
+            _flushed += len(drained)
+    return len(drained)
+
+
+async def run_flusher(db_engine, interval: float = None):
+    """حلقه پس‌زمینه flush که در lifespan اجرا و در shutdown لغو می‌شود"""
+    interval = interval or settings.VIEW_FLUSH_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush(db_engine)
+        except Exception as exc:
+            print("view counter flush error", exc)
+
+
+def stats() -> dict:
+    with _lock:
+        size = len(_pending)
+        total = sum(_pending.values())
+    return {"pending_rows": size, "pending_views": total, "flushed_rows": _flushed}
@@ -0,0 +1,366 @@
+"""
+موتور تحلیل ستونی بازدیدها روی آرایه‌های NumPy با memory map
+
+گزارش‌های ثابت پنل از جداول rollup خوانده می‌شوند، اما برش‌های دلخواه
+(مسیر × روز × referer، هر بازه روزی) روی SQLite کند هستند. این ماژول
+ستون‌های لازم هر بازدید را در فایل‌های باینری append-only نگه می‌دارد:
+
+    ts (int64، ثانیه UTC)  path_id (int32)  section (uint8)
+    referer_id (int32)     ip_hash (uint64) is_bot (uint8)
+    weight (uint32)
+
+هر ستون یک فایل `<name>.bin` در VISIT_ANALYTICS_DIR است و با np.memmap
+فقط خواندنی باز می‌شود؛ فیلترها، هیستوگرام روزانه و top-N با عملیات
+برداری (mask، bincount، unique) محاسبه می‌شوند. مقدار 0 در path_id /
+referer_id / ip_hash یعنی نامشخص. تعدادها مجموع weight ردیف‌ها هستند تا
+بازدیدهای نمونه‌برداری شده (app/visit_ingest.py) به تعداد واقعی برگردند.
+
+- catch_up: بازدیدهای جدید جدول visits (id > last_visit_id) را به انتهای
+  فایل‌ها اضافه می‌کند. تعداد ردیف‌ها و watermark در meta.json است و بعد از
+  نوشتن و fsync داده به‌روز می‌شود؛ بایت‌های ناقص انتهای فایل (crash وسط
+  نوشتن) قبل از append بعدی بریده می‌شوند و خواننده‌ها فقط تا count را map
+  می‌کنند.
+- rebuild: ساخت کامل از آرشیوها، جداول ماهانه و جدول visits در پوشه موقت
+  و جایگزینی اتمیک.
+
+visit_partitions.maintain قبل از rotate این موتور را به‌روز می‌کند تا
+ردیفی پیش از اضافه شدن به آرایه‌ها از جدول visits خارج نشود.
+
+نوشتن (catch_up و rebuild) علاوه بر قفل thread با flock روی فایل
+`<VISIT_ANALYTICS_DIR>.lock` بین پردازش‌ها (gunicorn -w N) هم انحصاری است؛
+قفل کنار پوشه است چون rebuild خود پوشه را جایگزین می‌کند. مسیر درخواست
+(refresh) منتظر قفل نمی‌ماند و rebuild را در پس‌زمینه شروع می‌کند.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows: فقط قفل درون‌پردازشی
+    fcntl = None
+
+from app import visit_dictionary, visit_partitions
+from app.config import settings
+
+VERSION = 2
+
+COLUMNS = {
+    "ts": np.int64,
+    "path_id": np.int32,
+    "section": np.uint8,
+    "referer_id": np.int32,
+    "ip_hash": np.uint64,
+    "is_bot": np.uint8,
+    "weight": np.uint32,
+}
+
+# کد ستون section؛ تغییر این ترتیب در meta تشخیص داده شده و rebuild انجام می‌شود
+SECTIONS = ("other", "home") + tuple(dict.fromkeys(section for _, section in visit_dictionary.SECTION_PREFIXES))
+SECTION_CODES = {section: code for code, section in enumerate(SECTIONS)}
+
+EPOCH = datetime(1970, 1, 1)
+DAY_SECONDS = 86400
+
+_lock = threading.Lock()
+_builder: Optional[threading.Thread] = None
+
+
+def data_dir() -> Path:
+    return Path(settings.VISIT_ANALYTICS_DIR)
+
+
+def _empty_meta() -> dict:
+    return {"version": VERSION, "sections": list(SECTIONS), "count": 0, "last_visit_id": 0}
+
+
+@contextmanager
+def _exclusive(wait: bool = True):
+    """قفل نوشتن بین threadها و پردازش‌ها؛ با wait=False اگر گرفته شده باشد False"""
+    if not _lock.acquire(blocking=wait):
+        yield False
+        return
+    try:
+        target = data_dir()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target.with_name(target.name + ".lock"), "a+b") as handle:
+            acquired = True
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    acquired = False
+            # با بسته شدن فایل آزاد می‌شود
+            yield acquired
+    finally:
+        _lock.release()
+
+
+def _read_meta(directory: Path) -> Optional[dict]:
+    try:
+        return orjson.loads((directory / "meta.json").read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(directory: Path, meta: dict):
+    tmp_path = directory / "meta.json.tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(orjson.dumps(meta))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, directory / "meta.json")
+
+
+def _compatible(meta: Optional[dict]) -> bool:
+    return bool(meta) and meta.get("version") == VERSION and meta.get("sections") == list(SECTIONS)
+
+
+# ============= Write =============
+
+def _timestamp(value) -> int:
+    if value is None:
+        value = datetime.utcnow()
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((value - EPOCH).total_seconds())
+
+
+def _ip_hash(ip: Optional[str]) -> int:
+    if not ip:
+        return 0
+    return int.from_bytes(hashlib.blake2b(ip.encode(), digest_size=8).digest(), "little") or 1
+
+
+def _to_arrays(rows: list) -> dict:
+    """ردیف‌های غنی شده (created_at/ip/path_id/referer_id/weight/section/is_bot) -> ستون‌ها"""
+    return {
+        "ts": np.fromiter((_timestamp(row["created_at"]) for row in rows), COLUMNS["ts"], len(rows)),
+        "path_id": np.fromiter((row["path_id"] or 0 for row in rows), COLUMNS["path_id"], len(rows)),
+        "section": np.fromiter(
+            (SECTION_CODES.get(row["section"] or "other", 0) for row in rows), COLUMNS["section"], len(rows)
+        ),
+        "referer_id": np.fromiter((row["referer_id"] or 0 for row in rows), COLUMNS["referer_id"], len(rows)),
+        "ip_hash": np.fromiter((_ip_hash(row["ip"]) for row in rows), COLUMNS["ip_hash"], len(rows)),
+        "is_bot": np.fromiter((bool(row["is_bot"]) for row in rows), COLUMNS["is_bot"], len(rows)),
+        "weight": np.fromiter((row["weight"] or 1 for row in rows), COLUMNS["weight"], len(rows)),
+    }
+
+
+def _append(directory: Path, meta: dict, rows: list, last_visit_id: int):
+    arrays = _to_arrays(rows)
+    for name, dtype in COLUMNS.items():
+        with open(directory / f"{name}.bin", "ab") as handle:
+            # بایت‌های اضافه از یک append ناتمام قبلی
+            handle.truncate(meta["count"] * np.dtype(dtype).itemsize)
+            handle.write(arrays[name].tobytes())
+            handle.flush()
+            os.fsync(handle.fileno())
+    meta["count"] += len(rows)
+    meta["last_visit_id"] = max(meta["last_visit_id"], last_visit_id)
+    _write_meta(directory, meta)
+
+
+def _catch_up(db_engine, directory: Path, meta: dict, batch_size: int) -> int:
+    appended = 0
+    while True:
+        with db_engine.connect() as conn:
+            rows = conn.execute(visit_dictionary.enriched_select(meta["last_visit_id"], batch_size)).all()
+        # مثل visit_rollup فقط تا اولین شکاف id
+        rows = visit_dictionary.settled(rows, meta["last_visit_id"])
+        if not rows:
+            break
+        _append(directory, meta, [row._mapping for row in rows], rows[-1].id)
+        appended += len(rows)
+        if len(rows) < batch_size:
+            break
+    return appended
+
+
+def _build(db_engine, directory: Path, batch_size: int) -> dict:
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+    meta = _empty_meta()
+    _write_meta(directory, meta)
+    for records in visit_partitions.iter_cold_batches(db_engine, batch_size):
+        rows = visit_dictionary.encode(db_engine, records, enrich=True)
+        _append(directory, meta, rows, max(record["id"] for record in records))
+    # ردیف‌های جدول visits از اولینشان (ممکن است id کوچک‌تر از ردیف‌های منتقل شده داشته باشند)
+    with db_engine.connect() as conn:
+        meta["last_visit_id"] = visit_partitions.hot_start(conn, meta["last_visit_id"])
+    _catch_up(db_engine, directory, meta, batch_size)
+    return meta
+
+
+def _replace(db_engine, batch_size: int) -> int:
+    target = data_dir()
+    staging = target.with_name(target.name + ".building")
+    meta = _build(db_engine, staging, batch_size)
+    retired = target.with_name(target.name + ".old")
+    if retired.exists():
+        shutil.rmtree(retired)
+    if target.exists():
+        # خواننده‌هایی که فایل‌های قبلی را map کرده‌اند تا پایان کار معتبر می‌مانند
+        os.replace(target, retired)
+    os.replace(staging, target)
+    shutil.rmtree(retired, ignore_errors=True)
+    return meta["count"]
+
+
+def rebuild(db_engine, batch_size: int = None) -> int:
+    """ساخت کامل آرایه‌ها از داده خام و جایگزینی اتمیک؛ تعداد ردیف‌ها"""
+    with _exclusive():
+        return _replace(db_engine, batch_size or settings.VISIT_ROLLUP_BATCH_SIZE)
+
+
+def catch_up(db_engine, batch_size: int = None) -> int:
+    """افزودن بازدیدهای جدید؛ اگر داده‌ای نیست یا قالب آن قدیمی است rebuild"""
+    batch_size = batch_size or settings.VISIT_ROLLUP_BATCH_SIZE
+    directory = data_dir()
+    with _exclusive():
+        # meta بعد از گرفتن قفل خوانده می‌شود؛ پردازش دیگری ممکن است همین حالا نوشته باشد
+        meta = _read_meta(directory)
+        if not _compatible(meta):
+            return _replace(db_engine, batch_size)
+        return _catch_up(db_engine, directory, meta, batch_size)
+
+
+def _background_build(db_engine):
+    try:
+        catch_up(db_engine)
+    except Exception as exc:
+        print("visit analytics build error", exc)
+
+
+def refresh(db_engine) -> bool:
+    """
+    به‌روزرسانی افزایشی در مسیر درخواست؛ False اگر آرایه‌ها هنوز ساخته نشده‌اند
+
+    ساخت کامل (اولین بار یا بعد از تغییر VERSION) در یک thread پس‌زمینه شروع
+    می‌شود. اگر پردازش دیگری در حال نوشتن باشد منتظر نمی‌ماند و داده قبلی
+    خوانده می‌شود.
+    """
+    global _builder
+    directory = data_dir()
+    if not _compatible(_read_meta(directory)):
+        if _builder is None or not _builder.is_alive():
+            _builder = threading.Thread(
+                target=_background_build, args=(db_engine,), name="visit-analytics-build", daemon=True
+            )
+            _builder.start()
+        return False
+    with _exclusive(wait=False) as acquired:
+        if acquired:
+            meta = _read_meta(directory)
+            if _compatible(meta):
+                _catch_up(db_engine, directory, meta, settings.VISIT_ROLLUP_BATCH_SIZE)
+    return True
+
+
+# ============= Read =============
+
+class Columns:
+    """نمای فقط خواندنی ستون‌ها تا count ثبت شده در meta"""
+
+    def __init__(self, directory: Path):
+        meta = _read_meta(directory) or _empty_meta()
+        self.count = meta["count"]
+        self.last_visit_id = meta["last_visit_id"]
+        for name, dtype in COLUMNS.items():
+            if self.count:
+                column = np.memmap(directory / f"{name}.bin", dtype=dtype, mode="r", shape=(self.count,))
+            else:
+                column = np.empty(0, dtype=dtype)
+            setattr(self, name, column)
+
+    def mask(self, start: date, end: date, path_id: int = None, referer_id: int = None,
+             section: str = None, bots: bool = False) -> np.ndarray:
+        """ردیف‌های بازه [start، end] (روزها شامل) با فیلترهای اختیاری"""
+        low = (datetime(start.year, start.month, start.day) - EPOCH).total_seconds()
+        high = low + ((end - start).days + 1) * DAY_SECONDS
+        selected = (self.ts >= low) & (self.ts < high)
+        selected &= (self.is_bot == 1) if bots else (self.is_bot == 0)
+        if path_id is not None:
+            selected &= self.path_id == path_id
+        if referer_id is not None:
+            selected &= self.referer_id == referer_id
+        if section is not None:
+            selected &= self.section == SECTION_CODES[section]
+        return selected
+
+
+def open_columns() -> Columns:
+    return Columns(data_dir())
+
+
+def per_day(columns: Columns, selected: np.ndarray, start: date, end: date) -> list:
+    days = (end - start).days + 1
+    first = (datetime(start.year, start.month, start.day) - EPOCH).days
+    counts = np.bincount(
+        columns.ts[selected] // DAY_SECONDS - first, weights=columns.weight[selected], minlength=days
+    ).astype(np.int64)
+    return [
+        {"day": (start + timedelta(days=offset)).isoformat(), "count": int(count)}
+        for offset, count in enumerate(counts[:days])
+    ]
+
+
+def top(values: np.ndarray, weights: np.ndarray, limit: int, skip_zero: bool = True) -> list:
+    """پرتکرارترین مقادیر (id یا کد) به صورت (مقدار، مجموع weight)"""
+    if not values.size:
+        return []
+    counts = np.bincount(values, weights=weights).astype(np.int64)
+    if skip_zero:
+        counts[0] = 0
+    order = np.argsort(counts, kind="stable")[::-1][:limit]
+    return [(int(value), int(counts[value])) for value in order if counts[value]]
+
+
+def unique(columns: Columns, selected: np.ndarray) -> int:
+    """تعداد دقیق IPهای یکتا (بر اساس hash)"""
+    hashes = columns.ip_hash[selected]
+    return int(np.unique(hashes[hashes != 0]).size)
+
+
+def report(start: date, end: date, limit: int = 8, **filters) -> dict:
+    """گزارش یک برش: هیستوگرام روزانه، top مسیرها / refererها، بخش‌ها و یکتاها"""
+    columns = open_columns()
+    selected = columns.mask(start, end, **filters)
+    bots = columns.mask(start, end, bots=True, **filters)
+    weights = columns.weight[selected]
+    return {
+        "rows": columns.count,
+        "last_visit_id": columns.last_visit_id,
+        "total": int(weights.sum()),
+        "unique": unique(columns, selected),
+        "bots": int(columns.weight[bots].sum()),
+        "per_day": per_day(columns, selected, start, end),
+        "top_paths": top(columns.path_id[selected], weights, limit),
+        "top_referers": top(columns.referer_id[selected], weights, limit),
+        "by_section": [
+            (SECTIONS[code], count)
+            for code, count in top(columns.section[selected], weights, len(SECTIONS), False)
+        ],
+    }
+
+
+def storage() -> dict:
+    directory = data_dir()
+    meta = _read_meta(directory) or _empty_meta()
+    files = sorted(directory.glob("*.bin")) if directory.exists() else []
+    return {
+        "rows": meta["count"],
+        "last_visit_id": meta["last_visit_id"],
+        "bytes": sum(path.stat().st_size for path in files),
+    }
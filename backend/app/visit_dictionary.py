@@ -0,0 +1,386 @@
+"""
+غنی‌سازی بازدیدها هنگام ثبت و dictionary encoding رشته‌ها
+
+path، referer و user agent هر بازدید به جای ذخیره در هر ردیف visits یک
+بار در جداول visit_paths / visit_referers / visit_user_agents نوشته
+می‌شوند و visits فقط id آن‌ها را نگه می‌دارد. غنی‌سازی هم فقط یک بار برای
+هر مقدار یکتا انجام می‌شود:
+- path: بخش سایت (section) و موجودیت متناظر (مثلا /article/12 -> article 12)
+- referer: دامنه (host)
+- user agent: ربات بودن، مرورگر، سیستم عامل و نوع دستگاه
+
+نگاشت مقدار -> id در کش درون‌پردازشی نگه داشته می‌شود، پس در حالت عادی
+ثبت بازدید کوئری اضافه‌ای ندارد. مقادیر جدید با INSERT ... ON CONFLICT DO
+NOTHING در تراکنش جدا (قبل از INSERT بازدیدها) اضافه می‌شوند و فقط بعد از
+commit وارد کش می‌شوند.
+
+ردیف‌های قدیمی با ستون‌های متنی را migrate_legacy یک بار هنگام شروع برنامه
+تبدیل می‌کند.
+"""
+import hashlib
+import re
+import time
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import Integer, MetaData, Table, bindparam, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import models
+from app.cache import TTLCache
+from app.config import settings
+
+# همان کلیدهای بخش در گزارش؛ مسیرها مطابق router فرانت‌اند
+SECTION_PREFIXES = (
+    ("/article", "articles"),
+    ("/project", "gallery"),
+    ("/gallery", "gallery"),
+    ("/service", "services"),
+    ("/certificate", "certificates"),
+    ("/contact", "contacts"),
+)
+
+ENTITY_PATH = re.compile(r"^/(article|project|service|certificate)/(\d+)/?$")
+ENTITY_TYPES = {"article": "article", "project": "gallery", "service": "service", "certificate": "certificate"}
+
+BOT_PATTERN = re.compile(
+    r"bot|crawl|spider|slurp|archiver|facebookexternalhit|bingpreview|headless|lighthouse|"
+    r"curl|wget|python-requests|httpclient|okhttp|go-http|java/|axios|scrapy|monitor|uptime",
+    re.IGNORECASE,
+)
+BROWSERS = (
+    ("Edg/", "Edge"),
+    ("OPR/", "Opera"),
+    ("SamsungBrowser", "Samsung"),
+    ("Firefox/", "Firefox"),
+    ("Chrome/", "Chrome"),
+    ("Safari/", "Safari"),
+)
+SYSTEMS = (
+    ("Windows", "Windows"),
+    ("Android", "Android"),
+    ("iPhone", "iOS"),
+    ("iPad", "iOS"),
+    ("Mac OS X", "macOS"),
+    ("CrOS", "ChromeOS"),
+    ("Linux", "Linux"),
+)
+
+# نوع -> (مدل، ستون کلید، ستون ویژگی که همراه id کش می‌شود)
+DICTIONARIES = {
+    "path": (models.VisitPath, "path", "section"),
+    "referer": (models.VisitReferer, "referer", "host"),
+    "user_agent": (models.VisitUserAgent, "digest", "is_bot"),
+}
+
+LEGACY_COLUMNS = ("path", "referer", "user_agent")
+LEGACY_ROLLUP_TABLES = ("visit_daily_paths", "visit_daily_referers", "visit_daily_ips")
+
+# مقادیر dictionary تغییر نمی‌کنند؛ TTL فقط برای یکسانی با بقیه کش‌هاست
+caches = {
+    kind: TTLCache(maxsize=settings.VISIT_DICTIONARY_CACHE_SIZE, ttl=86400)
+    for kind in DICTIONARIES
+}
+
+_IN_CHUNK = 500
+
+
+# ============= Enrichment =============
+
+def _bare_path(path: str) -> str:
+    return path.split("?", 1)[0].split("#", 1)[0]
+
+
+def section_for(path: Optional[str]) -> str:
+    if not path:
+        return "other"
+    path = _bare_path(path)
+    for prefix, section in SECTION_PREFIXES:
+        if path.startswith(prefix):
+            return section
+    if path == "/" or path.startswith("/welcome"):
+        return "home"
+    return "other"
+
+
+def entity_for(path: str) -> tuple:
+    """(نوع موجودیت، id) برای صفحات جزئیات؛ در غیر این صورت (None, None)"""
+    match = ENTITY_PATH.match(_bare_path(path))
+    if not match:
+        return None, None
+    return ENTITY_TYPES[match.group(1)], int(match.group(2))
+
+
+def referer_host(referer: str) -> str:
+    try:
+        host = urlsplit(referer).hostname or ""
+    except ValueError:
+        return ""
+    return host[4:] if host.startswith("www.") else host
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent: str) -> dict:
+    is_bot = bool(BOT_PATTERN.search(user_agent))
+    browser = next((name for marker, name in BROWSERS if marker in user_agent), None)
+    system = next((name for marker, name in SYSTEMS if marker in user_agent), None)
+    if is_bot:
+        device = "bot"
+    elif "iPad" in user_agent or "Tablet" in user_agent:
+        device = "tablet"
+    elif "Mobi" in user_agent or "iPhone" in user_agent or "Android" in user_agent:
+        device = "mobile"
+    else:
+        device = "desktop"
+    return {"is_bot": is_bot, "browser": browser, "os": system, "device": device}
+
+
+def _digest(user_agent: str) -> str:
+    return hashlib.blake2b(user_agent.encode(), digest_size=16).hexdigest()
+
+
+def _key(kind: str, value: str) -> str:
+    return _digest(value) if kind == "user_agent" else value
+
+
+def _record(kind: str, value: str) -> dict:
+    """ردیف جدید dictionary به همراه ویژگی‌های غنی‌سازی"""
+    if kind == "path":
+        entity_type, entity_id = entity_for(value)
+        return {"path": value, "section": section_for(value), "entity_type": entity_type, "entity_id": entity_id}
+    if kind == "referer":
+        return {"referer": value, "host": referer_host(value)}
+    return {"digest": _digest(value), "user_agent": value, **parse_user_agent(value)}
+
+
+# ============= Encode =============
+
+def dialect_insert(conn, model):
+    """INSERT با پشتیبانی ON CONFLICT برای SQLite و PostgreSQL"""
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model.__table__)
+
+
+def _resolve(conn, kind: str, values: set) -> tuple:
+    """کلید -> (id، ویژگی) برای مقادیر؛ مقادیر ناموجود درج می‌شوند"""
+    model, key_name, attribute = DICTIONARIES[kind]
+    cache = caches[kind]
+    resolved, missing = {}, {}
+    for value in values:
+        key = _key(kind, value)
+        entry = cache.get(key)
+        if entry is None:
+            missing[key] = value
+        else:
+            resolved[key] = entry
+    if not missing:
+        return resolved, {}
+
+    table = model.__table__
+    conn.execute(
+        dialect_insert(conn, model).on_conflict_do_nothing(index_elements=[key_name]),
+        [_record(kind, value) for value in missing.values()],
+    )
+    keys = list(missing)
+    learned = {}
+    for start in range(0, len(keys), _IN_CHUNK):
+        rows = conn.execute(
+            select(table.c[key_name], table.c.id, table.c[attribute])
+            .where(table.c[key_name].in_(keys[start:start + _IN_CHUNK]))
+        )
+        for key, entry_id, value in rows:
+            learned[key] = (entry_id, value)
+    resolved.update(learned)
+    return resolved, learned
+
+
+def _encode(conn, rows: list, enrich: bool) -> tuple:
+    resolved, learned = {}, {}
+    for kind in DICTIONARIES:
+        values = {row[kind] for row in rows if row.get(kind)}
+        resolved[kind], learned[kind] = _resolve(conn, kind, values)
+
+    def lookup(kind, value):
+        return resolved[kind].get(_key(kind, value)) if value else None
+
+    encoded = []
+    for row in rows:
+        path = lookup("path", row.get("path"))
+        referer = lookup("referer", row.get("referer"))
+        agent = lookup("user_agent", row.get("user_agent"))
+        item = {
+            "ip": row.get("ip"),
+            "path_id": path[0] if path else None,
+            "referer_id": referer[0] if referer else None,
+            "user_agent_id": agent[0] if agent else None,
+            "weight": row.get("weight"),
+            "client_ts": row.get("client_ts"),
+            "created_at": row.get("created_at"),
+        }
+        if enrich:
+            item["section"] = path[1] if path else section_for(None)
+            item["is_bot"] = bool(agent[1]) if agent else False
+        encoded.append(item)
+    return encoded, learned
+
+
+def _remember(learned: dict):
+    for kind, entries in learned.items():
+        for key, entry in entries.items():
+            caches[kind].set(key, entry)
+
+
+def encode(db_engine, rows: list, enrich: bool = False) -> list:
+    """
+    تبدیل ردیف‌های متنی بازدید (خروجی visit_queue.build_row یا آرشیو) به
+    ردیف‌های جدول visits؛ با enrich=True بخش و ربات بودن هم اضافه می‌شود
+    """
+    with db_engine.begin() as conn:
+        encoded, learned = _encode(conn, rows, enrich)
+    _remember(learned)
+    return encoded
+
+
+async def encode_async(db_engine, rows: list) -> list:
+    async with db_engine.begin() as conn:
+        encoded, learned = await conn.run_sync(_encode, rows, False)
+    _remember(learned)
+    return encoded
+
+
+def decoded_select(table):
+    """ردیف‌های visits (یا جدول ماهانه) با رشته‌های اصلی؛ همان قالب پیش از encoding"""
+    path, referer, agent = models.VisitPath, models.VisitReferer, models.VisitUserAgent
+    return (
+        select(table.c.id, path.path, table.c.ip, agent.user_agent, referer.referer,
+               table.c.weight, table.c.client_ts, table.c.created_at)
+        .select_from(
+            table.outerjoin(path, path.id == table.c.path_id)
+            .outerjoin(agent, agent.id == table.c.user_agent_id)
+            .outerjoin(referer, referer.id == table.c.referer_id)
+        )
+    )
+
+
+def enriched_select(last_id: int, limit: int):
+    """بازدیدهای جدول visits بعد از last_id با بخش و ربات بودن (ورودی rollup و analytics)"""
+    visit = models.Visit
+    return (
+        select(visit.id, visit.created_at, visit.ip, visit.path_id, visit.referer_id, visit.weight,
+               models.VisitPath.section, models.VisitUserAgent.is_bot)
+        .select_from(
+            visit.__table__
+            .outerjoin(models.VisitPath, models.VisitPath.id == visit.path_id)
+            .outerjoin(models.VisitUserAgent, models.VisitUserAgent.id == visit.user_agent_id)
+        )
+        .where(visit.id > last_id)
+        .order_by(visit.id)
+        .limit(limit)
+    )
+
+
+# اولین id غایب هر شکاف -> زمان اولین مشاهده (مشترک rollup و analytics)
+_gaps: dict = {}
+
+
+def settled(rows: list, last_id: int) -> list:
+    """
+    پیشوند پیوسته ردیف‌های enriched_select که مصرف آن‌ها امن است
+
+    صف بازدید، /api/visit/batch و workerهای دیگر روی اتصال‌های جدا INSERT
+    می‌کنند؛ در PostgreSQL id هنگام INSERT رزرو می‌شود، پس ممکن است id
+    کوچک‌تر بعد از id بزرگ‌تر commit شود. اگر مصرف کننده از روی آن رد شود و
+    watermark جلو برود، آن ردیف هیچ‌وقت شمرده نمی‌شود (و rotate آن را از
+    visits خارج می‌کند). مصرف پشت اولین شکاف می‌ایستد تا شکاف پر شود؛ شکافی
+    که بیش از VISIT_ID_GAP_GRACE_SECONDS باقی بماند (rollback یا id از دست
+    رفته sequence) دائمی فرض و رد می‌شود.
+    """
+    now = time.monotonic()
+    grace = settings.VISIT_ID_GAP_GRACE_SECONDS
+    expected = last_id + 1
+    for index, row in enumerate(rows):
+        if row.id != expected and now - _gaps.setdefault(expected, now) < grace:
+            rows = rows[:index]
+            break
+        expected = row.id + 1
+    # analytics (هر ساعت) شکافی را که rollup منقضی دیده دوباره منتظر نمی‌ماند
+    for gap, seen in list(_gaps.items()):
+        if now - seen > grace + 86400:
+            del _gaps[gap]
+    return rows
+
+
+def stats() -> dict:
+    return {kind: cache.stats() for kind, cache in caches.items()}
+
+
+# ============= Legacy migration =============
+
+def _migrate_table(db_engine, name: str, batch_size: int) -> int:
+    """تبدیل ستون‌های متنی یک جدول بازدید به id و حذف آن ستون‌ها"""
+    inspector = inspect(db_engine)
+    columns = {column["name"] for column in inspector.get_columns(name)}
+    with db_engine.begin() as conn:
+        for column in ("path_id", "referer_id", "user_agent_id"):
+            if column not in columns:
+                conn.execute(text(f'ALTER TABLE {name} ADD COLUMN "{column}" {Integer().compile(dialect=db_engine.dialect)}'))
+    table = Table(name, MetaData(), autoload_with=db_engine)
+    legacy = [column for column in LEGACY_COLUMNS if column in table.c]
+
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("visit_id"))
+        .values(path_id=bindparam("new_path_id"), referer_id=bindparam("new_referer_id"),
+                user_agent_id=bindparam("new_user_agent_id"))
+    )
+    converted, last_id = 0, 0
+    while True:
+        with db_engine.connect() as conn:
+            rows = [row._asdict() for row in conn.execute(
+                select(table.c.id, *(table.c[column] for column in legacy))
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            )]
+        if not rows:
+            break
+        encoded = encode(db_engine, rows)
+        with db_engine.begin() as conn:
+            conn.execute(statement, [
+                {"visit_id": row["id"], "new_path_id": item["path_id"],
+                 "new_referer_id": item["referer_id"], "new_user_agent_id": item["user_agent_id"]}
+                for row, item in zip(rows, encoded)
+            ])
+        converted += len(rows)
+        last_id = rows[-1]["id"]
+
+    with db_engine.begin() as conn:
+        for index in inspector.get_indexes(name):
+            if set(index["column_names"]) & set(legacy):
+                conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+        for column in legacy:
+            conn.execute(text(f'ALTER TABLE {name} DROP COLUMN "{column}"'))
+    return converted
+
+
+def migrate_legacy(db_engine, batch_size: int = 5000) -> dict:
+    """
+    تبدیل یک باره ردیف‌های visits و جداول ماهانه که هنوز ستون متنی دارند،
+    حذف جداول rollup قدیمی (کلید متنی) و بازسازی rollupها در صورت نیاز
+    """
+    from app import visit_partitions, visit_rollup
+
+    names = set(inspect(db_engine).get_table_names())
+    candidates = [models.Visit.__tablename__] + [name for _, name in visit_partitions.month_tables(db_engine)]
+    converted = {}
+    for name in candidates:
+        if name in names and "path" in {column["name"] for column in inspect(db_engine).get_columns(name)}:
+            converted[name] = _migrate_table(db_engine, name, batch_size)
+
+    obsolete = [name for name in LEGACY_ROLLUP_TABLES if name in names]
+    with db_engine.begin() as conn:
+        for name in obsolete:
+            conn.execute(text(f"DROP TABLE {name}"))
+    rebuilt = visit_rollup.rebuild(db_engine) if converted or obsolete else None
+    return {"converted": converted, "dropped": obsolete, "rebuilt": rebuilt}
@@ -0,0 +1,126 @@
+"""
+حذف بازدیدهای تکراری و نمونه‌برداری تطبیقی پیش از ثبت بازدید
+
+reload صفحه و تغییر route در SPA در چند ثانیه چند بازدید یکسان (ip، path)
+می‌سازند. deduplicate زمان آخرین بازدید ثبت شده هر (ip، path) را در یک
+کش LRU محدود (VISIT_DEDUPE_CACHE_SIZE کلید) نگه می‌دارد و بازدیدی را که
+کمتر از VISIT_DEDUPE_WINDOW_SECONDS بعد از آن باشد دور می‌ریزد. فاصله با
+زمان رویداد (created_at) سنجیده می‌شود، پس بازدیدهای دسته‌ای مرورگر با
+client_ts هم درست تشخیص داده می‌شوند؛ reload مداوم هر پنجره یک بازدید
+ثبت می‌کند.
+
+sample نرخ ثبت (بازدید در ثانیه، بعد از حذف تکراری‌ها) را در
+VISIT_SAMPLING_WINDOW_SECONDS ثانیه آخر اندازه می‌گیرد. تا وقتی نرخ از
+VISIT_SAMPLING_RATE_THRESHOLD کمتر است همه بازدیدها ثبت می‌شوند؛ بالاتر از
+آن ضریب N = ceil(نرخ / آستانه) (حداکثر VISIT_SAMPLING_MAX_FACTOR) است و هر
+بازدید با احتمال 1/N و weight = N ثبت می‌شود. rollupها و visit_analytics
+به جای شمردن ردیف‌ها weightها را جمع می‌کنند، پس گزارش‌ها برآورد بدون
+سوگیری تعداد واقعی هستند (انحراف معیار حدود sqrt(n × (N - 1)) برای n
+بازدید نمونه‌برداری شده). یکتاهای HLL فقط IPهای ثبت شده را می‌بینند و در
+بازه‌های نمونه‌برداری شده کمی کمتر از مقدار واقعی تخمین زده می‌شوند.
+
+هر دو per-process هستند؛ در حالت چند worker هر worker کش و نرخ خودش را
+دارد (آستانه نرخ هر worker است).
+"""
+import math
+import random
+import time
+from collections import deque
+
+from app.cache import TTLCache
+from app.config import settings
+
+_seen = TTLCache(settings.VISIT_DEDUPE_CACHE_SIZE, 2 * max(settings.VISIT_DEDUPE_WINDOW_SECONDS, 1))
+# هر عنصر: [ثانیه، تعداد بازدید]
+_rate: deque = deque()
+
+counters = {"duplicates": 0, "sampled_out": 0, "weighted": 0}
+
+
+# ============= Dedupe =============
+
+def _key(row: dict):
+    if settings.VISIT_DEDUPE_WINDOW_SECONDS <= 0 or not row.get("ip"):
+        return None
+    return row["ip"], row["path"]
+
+
+def is_duplicate(row: dict) -> bool:
+    """آیا همین ip و path کمتر از یک پنجره پیش از این بازدید ثبت شده است"""
+    key = _key(row)
+    if key is None:
+        return False
+    at = row["created_at"].timestamp()
+    stored_at = _seen.get(key)
+    if stored_at is not None and abs(at - stored_at) < settings.VISIT_DEDUPE_WINDOW_SECONDS:
+        return True
+    _seen.set(key, at)
+    return False
+
+
+def forget(row: dict):
+    """بازدیدی که ثبت نشد (مثلا 503 صف پر) تا تلاش دوباره کلاینت تکراری شمرده نشود"""
+    key = _key(row)
+    if key is not None:
+        _seen.set(key, None)
+
+
+def deduplicate(rows: list) -> list:
+    """ردیف‌های build_row بدون تکراری‌ها"""
+    kept = [row for row in rows if not is_duplicate(row)]
+    counters["duplicates"] += len(rows) - len(kept)
+    return kept
+
+
+# ============= Sampling =============
+
+def _record(count: int, now: float) -> float:
+    """افزودن بازدیدها به شمارنده ثانیه‌ای و نرخ پنجره (بازدید در ثانیه)"""
+    second = int(now)
+    window = max(settings.VISIT_SAMPLING_WINDOW_SECONDS, 1)
+    if _rate and _rate[-1][0] == second:
+        _rate[-1][1] += count
+    else:
+        _rate.append([second, count])
+    while _rate[0][0] <= second - window:
+        _rate.popleft()
+    return sum(bucket[1] for bucket in _rate) / window
+
+
+def factor(rate: float) -> int:
+    """ضریب نمونه‌برداری N برای این نرخ (1 یعنی بدون نمونه‌برداری)"""
+    threshold = settings.VISIT_SAMPLING_RATE_THRESHOLD
+    if threshold <= 0 or rate <= threshold:
+        return 1
+    return min(math.ceil(rate / threshold), max(settings.VISIT_SAMPLING_MAX_FACTOR, 1))
+
+
+def sample(rows: list, now: float = None) -> list:
+    """ردیف‌های نگه داشته شده؛ در حالت نمونه‌برداری weight هر ردیف N است"""
+    if not rows:
+        return rows
+    n = factor(_record(len(rows), now or time.time()))
+    if n == 1:
+        return rows
+    kept = [row for row in rows if random.random() * n < 1]
+    for row in kept:
+        row["weight"] = n
+    counters["sampled_out"] += len(rows) - len(kept)
+    counters["weighted"] += len(kept)
+    return kept
+
+
+def current_rate() -> float:
+    window = max(settings.VISIT_SAMPLING_WINDOW_SECONDS, 1)
+    second = int(time.time())
+    return sum(count for at, count in _rate if at > second - window) / window
+
+
+def stats() -> dict:
+    rate = current_rate()
+    return {
+        **counters,
+        "rate_per_second": round(rate, 2),
+        "sampling_factor": factor(rate),
+        "dedupe_keys": _seen.stats()["size"],
+    }
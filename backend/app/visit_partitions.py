@@ -0,0 +1,262 @@
+"""
+پارتیشن‌بندی زمانی بازدیدها، نگهداری محدود و آرشیو فشرده
+
+- جدول `visits` فقط بازدیدهای ماه جاری (و ردیف‌هایی که هنوز rollup
+  نشده‌اند) را نگه می‌دارد؛ ایندکس‌های path/ip/created_at کوچک می‌مانند.
+- rotate: ردیف‌های ماه‌های بسته شده که rollup شده‌اند (id <= watermark)
+  در یک تراکنش به جدول ماهانه `visits_YYYYMM` منتقل می‌شوند. ردیف با
+  بزرگ‌ترین id هیچ‌وقت منتقل نمی‌شود: id در SQLite بدون AUTOINCREMENT است
+  و MAX(rowid)+1 می‌گیرد، پس با حذف آن ردیف درج بعدی idهای زیر watermark را
+  دوباره می‌گرفت و rollup / تحلیل (id > last_visit_id) آن را نمی‌دیدند.
+- archive: جداول ماهانه قدیمی‌تر از VISIT_RETENTION_MONTHS به فایل
+  `visits-YYYY-MM-<first_id>-<last_id>.ndjson.gz` در VISIT_ARCHIVE_DIR
+  نوشته و سپس DROP می‌شوند (نوشتن اتمیک: فایل موقت و rename). آرشیو
+  رشته‌های path / referer / user agent را به جای id جداول dictionary
+  دارد تا مستقل از دیتابیس خوانا بماند.
+
+گزارش‌ها از جداول rollup خوانده می‌شوند که هیچ‌وقت حذف نمی‌شوند؛ بازسازی
+rollup (visit_rollup.rebuild) با iter_cold_batches آرشیوها و جداول ماهانه را
+هم می‌خواند، پس داده بلندمدت از دست نمی‌رود.
+"""
+import asyncio
+import gzip
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import orjson
+from sqlalchemy import Column, MetaData, Table, and_, delete, func, inspect, insert, select, text
+
+from app import models, visit_dictionary
+from app.config import settings
+
+MONTH_TABLE = re.compile(r"^visits_(\d{4})(\d{2})$")
+ARCHIVE_FILE = re.compile(r"^visits-(\d{4})-(\d{2})-\d+-\d+\.ndjson\.gz$")
+
+visits = models.Visit.__table__
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_table(name: str) -> Table:
+    """جدول ماهانه با همان ستون‌های visits (بدون ایندکس‌های ثانویه)"""
+    return Table(
+        name,
+        MetaData(),
+        *(Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+          for column in visits.columns),
+    )
+
+
+def month_tables(db_engine) -> List[Tuple[datetime, str]]:
+    names = inspect(db_engine).get_table_names()
+    tables = []
+    for name in names:
+        match = MONTH_TABLE.match(name)
+        if match:
+            tables.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(tables)
+
+
+def upgrade_month_tables(db_engine) -> List[str]:
+    """افزودن ستون‌های nullable جدید visits (مثل weight) به جداول ماهانه قدیمی"""
+    inspector = inspect(db_engine)
+    added = []
+    with db_engine.begin() as conn:
+        for _, name in month_tables(db_engine):
+            existing = {column["name"] for column in inspector.get_columns(name)}
+            for column in visits.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db_engine.dialect)
+                conn.execute(text(f'ALTER TABLE {name} ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f"{name}.{column.name}")
+    return added
+
+
+def archive_dir() -> Path:
+    return Path(settings.VISIT_ARCHIVE_DIR)
+
+
+def archive_files() -> List[Path]:
+    directory = archive_dir()
+    if not directory.exists():
+        return []
+    return sorted(path for path in directory.iterdir() if ARCHIVE_FILE.match(path.name))
+
+
+# ============= Rotate =============
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def rotate(db_engine, max_id: int) -> dict:
+    """انتقال ردیف‌های ماه‌های بسته شده (با id <= max_id) به جداول ماهانه"""
+    with db_engine.connect() as conn:
+        # بزرگ‌ترین id در visits می‌ماند تا id تکراری زیر watermark داده نشود
+        newest = conn.execute(select(func.max(visits.c.id))).scalar()
+        if newest is None:
+            return {}
+        max_id = min(max_id, newest - 1)
+        oldest = conn.execute(select(func.min(visits.c.created_at)).where(visits.c.id <= max_id)).scalar()
+    if oldest is None:
+        return {}
+
+    moved = {}
+    current = month_start(datetime.utcnow())
+    month = month_start(_as_datetime(oldest))
+    while month < current:
+        end = add_months(month, 1)
+        table = month_table(f"visits_{month:%Y%m}")
+        condition = and_(visits.c.created_at >= month, visits.c.created_at < end, visits.c.id <= max_id)
+        with db_engine.begin() as conn:
+            table.create(conn, checkfirst=True)
+            conn.execute(insert(table).from_select(
+                [column.name for column in visits.columns],
+                select(*visits.columns).where(condition),
+            ))
+            count = conn.execute(delete(visits).where(condition)).rowcount
+        if count:
+            moved[table.name] = count
+        month = end
+    return moved
+
+
+# ============= Archive =============
+
+def _write_archive(conn, table: Table, month: datetime) -> Path:
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f".visits-{month:%Y-%m}.tmp"
+    first_id = last_id = 0
+    result = conn.execution_options(yield_per=5000).execute(
+        visit_dictionary.decoded_select(table).order_by(table.c.id)
+    )
+    with gzip.open(tmp_path, "wb") as archive:
+        for row in result:
+            record = row._asdict()
+            first_id = first_id or record["id"]
+            last_id = record["id"]
+            archive.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS))
+        archive.flush()
+        os.fsync(archive.fileobj.fileno())
+    path = directory / f"visits-{month:%Y-%m}-{first_id}-{last_id}.ndjson.gz"
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive(db_engine, retention_months: int = None) -> List[str]:
+    """آرشیو و حذف جداول ماهانه خارج از بازه نگهداری"""
+    retention_months = settings.VISIT_RETENTION_MONTHS if retention_months is None else retention_months
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    written = []
+    for month, name in month_tables(db_engine):
+        if month >= cutoff:
+            continue
+        table = month_table(name)
+        with db_engine.connect() as conn:
+            path = _write_archive(conn, table, month)
+        with db_engine.begin() as conn:
+            table.drop(conn)
+        written.append(path.name)
+
+    if written and settings.VISIT_ARCHIVE_VACUUM and db_engine.dialect.name == "sqlite":
+        # بدون VACUUM فضای جداول حذف شده به فایل SQLite برنمی‌گردد
+        with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    return written
+
+
+def maintain(db_engine) -> dict:
+    """rotate ردیف‌های rollup شده و آرشیو ماه‌های قدیمی"""
+    from app import visit_analytics, visit_rollup
+
+    # فقط ردیف‌هایی منتقل می‌شوند که هم rollup و هم به آرایه‌های analytics اضافه شده‌اند
+    visit_analytics.catch_up(db_engine)
+    with db_engine.begin() as conn:
+        rolled_up = visit_rollup.watermark(conn)
+    analyzed = visit_analytics.open_columns().last_visit_id
+    return {"rotated": rotate(db_engine, min(rolled_up, analyzed)), "archived": archive(db_engine)}
+
+
+async def run_worker(db_engine):
+    """حلقه پس‌زمینه نگهداری که در lifespan اجرا و در shutdown لغو می‌شود"""
+    while True:
+        await asyncio.sleep(settings.VISIT_PARTITION_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(maintain, db_engine)
+        except Exception as exc:
+            print("visit partition maintenance error", exc)
+
+
+# ============= Read =============
+
+def iter_archive(path: Path) -> Iterator[dict]:
+    with gzip.open(path, "rb") as archive:
+        for line in archive:
+            record = orjson.loads(line)
+            if record.get("created_at"):
+                record["created_at"] = datetime.fromisoformat(record["created_at"])
+            if record.get("client_ts"):
+                record["client_ts"] = datetime.fromisoformat(record["client_ts"])
+            yield record
+
+
+def hot_start(conn, cold_last_id: int) -> int:
+    """watermark شروع بعد از بازسازی از داده سرد: یکی قبل از اولین id جدول visits"""
+    first = conn.execute(select(func.min(visits.c.id))).scalar()
+    return first - 1 if first is not None else cold_last_id
+
+
+def iter_cold_batches(db_engine, batch_size: int) -> Iterator[List[dict]]:
+    """بازدیدهای خارج از جدول visits (آرشیوها و سپس جداول ماهانه) دسته به دسته، با رشته‌های متنی"""
+    batch = []
+    for path in archive_files():
+        for record in iter_archive(path):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    for _, name in month_tables(db_engine):
+        table = month_table(name)
+        with db_engine.connect() as conn:
+            result = conn.execution_options(yield_per=batch_size).execute(
+                visit_dictionary.decoded_select(table).order_by(table.c.id)
+            )
+            for row in result:
+                batch.append(row._asdict())
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def storage(db_engine) -> dict:
+    """وضعیت ذخیره‌سازی: جدول فعال، جداول ماهانه و فایل‌های آرشیو"""
+    with db_engine.connect() as conn:
+        hot = conn.execute(select(func.count()).select_from(visits)).scalar_one()
+        tables = [
+            {"table": name, "month": f"{month:%Y-%m}",
+             "rows": conn.execute(select(func.count()).select_from(month_table(name))).scalar_one()}
+            for month, name in month_tables(db_engine)
+        ]
+    files = [{"file": path.name, "bytes": path.stat().st_size} for path in archive_files()]
+    return {
+        "hot_rows": hot,
+        "partitions": tables,
+        "archives": files,
+        "retention_months": settings.VISIT_RETENTION_MONTHS,
+    }
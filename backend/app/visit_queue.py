@@ -0,0 +1,170 @@
+"""
+صف ثبت بازدیدها (/api/visit)
+
+روت بازدید به جای INSERT و commit در هر درخواست فقط رویداد را در یک صف
+حافظه‌ای با ظرفیت محدود می‌گذارد و فورا 202 برمی‌گرداند. یک task
+پس‌زمینه هر VISIT_FLUSH_INTERVAL_MS میلی‌ثانیه، یا زودتر وقتی
+VISIT_FLUSH_BATCH_SIZE رویداد جمع شود، رشته‌های آن‌ها را با
+visit_dictionary به id تبدیل می‌کند و با یک INSERT (executemany) در یک
+تراکنش می‌نویسد.
+
+وقتی صف پر است (VISIT_QUEUE_MAX_SIZE) بسته به VISIT_QUEUE_POLICY:
+- drop: رویداد جدید دور ریخته و شمرده می‌شود (پاسخ همچنان 202)
+- reject: روت 503 با Retry-After برمی‌گرداند تا کلاینت عقب بکشد
+
+created_at هنگام ورود به صف ثبت می‌شود، نه هنگام flush؛ اگر کلاینت
+client_ts معتبر فرستاده باشد همان زمان واقعی رویداد استفاده می‌شود.
+
+دسته ناموفق به ابتدای صف برمی‌گردد. خطاهای گذرا (قطع اتصال، قفل، timeout)
+شمرده نمی‌شوند؛ بقیه (constraint، خطای encode) برای هر ردیف شمرده می‌شوند و
+بعد از VISIT_FLUSH_MAX_ATTEMPTS بار ردیف‌ها تک به تک نوشته می‌شوند تا ردیف
+خراب جدا و دور ریخته شود (failed_rows) و بقیه صف را متوقف نکند. لغو
+flusher در shutdown نوشتن در حال انجام را رها نمی‌کند و اگر commit نشده
+باشد ردیف‌ها برای flush پایانی به صف برمی‌گردند.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app import models, visit_dictionary
+from app.config import settings
+
+_queue: deque = deque()
+_wakeup: asyncio.Event = None
+
+counters = {"queued": 0, "flushed": 0, "dropped": 0, "failed_flushes": 0, "failed_rows": 0}
+
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError, asyncio.CancelledError)
+
+
+def _event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def event_time(client_ts: Optional[datetime], now: datetime) -> datetime:
+    """زمان کلاینت اگر در بازه قابل قبول باشد، وگرنه زمان دریافت"""
+    if client_ts is None:
+        return now
+    client_ts = _naive_utc(client_ts)
+    max_age = timedelta(seconds=settings.VISIT_CLIENT_TS_MAX_AGE_SECONDS)
+    if now - max_age <= client_ts <= now + timedelta(minutes=1):
+        return client_ts
+    return now
+
+
+def build_row(visit, ip: str = None, user_agent: str = None, referer: str = None, now: datetime = None) -> dict:
+    """ردیف متنی بازدید از یک VisitCreate (قبل از visit_dictionary.encode)"""
+    now = now or datetime.utcnow()
+    referer = visit.referer or referer
+    return {
+        "path": visit.path[:500],
+        "ip": ip[:100] if ip else None,
+        "user_agent": user_agent,
+        "referer": referer[:500] if referer else None,
+        "client_ts": _naive_utc(visit.client_ts) if visit.client_ts else None,
+        "created_at": event_time(visit.client_ts, now),
+    }
+
+
+def enqueue(row: dict) -> bool:
+    """افزودن ردیف بازدید به صف؛ اگر صف پر باشد False"""
+    if len(_queue) >= settings.VISIT_QUEUE_MAX_SIZE:
+        counters["dropped"] += 1
+        return False
+    _queue.append(row)
+    counters["queued"] += 1
+    if len(_queue) >= settings.VISIT_FLUSH_BATCH_SIZE:
+        _event().set()
+    return True
+
+
+def _take(limit: int) -> list:
+    # ردیف‌های دسته‌ای که بارها شکست خورده تک به تک نوشته می‌شوند
+    if _queue and _queue[0].get("attempts", 0) >= settings.VISIT_FLUSH_MAX_ATTEMPTS:
+        return [_queue.popleft()]
+    rows = []
+    while _queue and len(rows) < limit:
+        rows.append(_queue.popleft())
+    return rows
+
+
+def _requeue(rows: list):
+    # دسته ناموفق به ابتدای صف برمی‌گردد؛ مازاد بر ظرفیت دور ریخته می‌شود
+    room = max(settings.VISIT_QUEUE_MAX_SIZE - len(_queue), 0)
+    kept = rows[:room]
+    _queue.extendleft(reversed(kept))
+    counters["dropped"] += len(rows) - len(kept)
+
+
+def _failed(rows: list, error: BaseException):
+    counters["failed_flushes"] += 1
+    if not isinstance(error, TRANSIENT_ERRORS):
+        for row in rows:
+            row["attempts"] = row.get("attempts", 0) + 1
+        if len(rows) == 1 and rows[0]["attempts"] > settings.VISIT_FLUSH_MAX_ATTEMPTS:
+            counters["failed_rows"] += 1
+            print("visit dropped after repeated flush errors", rows[0].get("path"), str(error).splitlines()[0])
+            return
+    _requeue(rows)
+
+
+async def _write(db_engine, rows: list):
+    encoded = await visit_dictionary.encode_async(db_engine, rows)
+    async with db_engine.begin() as connection:
+        await connection.execute(insert(models.Visit), encoded)
+
+
+async def flush(db_engine) -> int:
+    """نوشتن همه رویدادهای صف به صورت دسته‌ای؛ تعداد ردیف‌های نوشته شده"""
+    written = 0
+    while _queue:
+        rows = _take(settings.VISIT_FLUSH_BATCH_SIZE)
+        write = asyncio.ensure_future(_write(db_engine, rows))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # shutdown: منتظر پایان نوشتن در حال انجام
+            await asyncio.wait([write])
+            raise
+        finally:
+            if not write.done() or write.cancelled():
+                _failed(rows, asyncio.CancelledError())
+            elif write.exception() is not None:
+                _failed(rows, write.exception())
+            else:
+                counters["flushed"] += len(rows)
+        written += len(rows)
+    return written
+
+
+async def run_flusher(db_engine):
+    """حلقه پس‌زمینه flush که در lifespan اجرا و در shutdown لغو می‌شود"""
+    wakeup = _event()
+    interval = settings.VISIT_FLUSH_INTERVAL_MS / 1000
+    while True:
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+        try:
+            await flush(db_engine)
+        except Exception as exc:
+            print("visit queue flush error", exc)
+
+
+def stats() -> dict:
+    return {**counters, "pending": len(_queue), "capacity": settings.VISIT_QUEUE_MAX_SIZE}
@@ -0,0 +1,348 @@
+"""
+تجمیع افزایشی بازدیدها (rollup روزانه)
+
+گزارش‌های پنل ادمین به جای COUNT و GROUP BY روی کل جدول visits از
+جداول تجمیعی روزانه خوانده می‌شوند (هر روز / مسیر / بخش / referer)؛
+هزینه گزارش ۱۸۰ روزه از مرتبه تعداد روزهاست نه تعداد بازدیدها. مسیر و
+referer با id جداول visit_dictionary کلید می‌خورند و بخش و ربات بودن از
+همان جداول (غنی شده هنگام ثبت) خوانده می‌شود؛ بازدید رباتها فقط در
+visit_daily.bots شمرده می‌شود.
+
+بازدیدکننده یکتا (IP) با sketchهای HyperLogLog (app/hll.py) شمرده می‌شود:
+یک sketch برای هر روز، یک sketch برای هر مسیر در هر روز و یک sketch کل در
+ردیف watermark. یکتاهای هر بازه از ادغام sketchهای روزانه آن بازه به دست
+می‌آید؛ خطای نسبی حدود ۱.۶٪ (روزانه و کل) و ۳.۳٪ (مسیرها) است.
+
+- catch_up: بازدیدهای با id بزرگ‌تر از watermark را دسته به دسته می‌خواند،
+  در پایتون تجمیع می‌کند و با upsert (count = count + n) اضافه می‌کند.
+  watermark در همان تراکنش و به صورت شرطی جلو می‌رود، پس اجرای همزمان
+  (مثلا چند worker) چیزی را دو بار نمی‌شمارد.
+- rebuild: خالی کردن جداول و backfill کامل از داده خام (آرشیوها، جداول
+  ماهانه visit_partitions و جدول visits).
+
+چون watermark بر اساس id است، بازدیدهایی که دیر می‌رسند (client_ts در
+گذشته) هم در روز واقعی خودشان شمرده می‌شوند. catch_up پشت اولین شکاف id
+می‌ایستد (visit_dictionary.settled) تا INSERTهای همزمانی که هنوز commit
+نشده‌اند جا نمانند. ردیف‌های نمونه‌برداری شده
+(app/visit_ingest.py) با weight خود شمرده می‌شوند، پس همه گزارش‌های rollup
+تعداد واقعی را برآورد می‌کنند.
+"""
+import asyncio
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+from app import hll, models, visit_dictionary, visit_partitions
+from app.config import settings
+
+STATE_NAME = "visits"
+
+ROLLUP_MODELS = (
+    models.VisitDaily,
+    models.VisitDailyPath,
+    models.VisitDailySection,
+    models.VisitDailyReferer,
+)
+
+_lock = threading.Lock()
+
+
+class WatermarkMoved(Exception):
+    """watermark توسط اجرای همزمان دیگری جلو رفته است"""
+
+
+def _day(value) -> date:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+# ============= Write =============
+
+def _add_counts(conn, model, keys: tuple, counts: Counter, column: str = "count"):
+    """upsert دسته‌ای: column = column + excluded.column"""
+    if not counts:
+        return
+    statement = visit_dictionary.dialect_insert(conn, model)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: func.coalesce(model.__table__.c[column], 0) + statement.excluded[column]},
+    )
+    conn.execute(statement, [{**dict(zip(keys, key)), column: count} for key, count in counts.items()])
+
+
+def _merge_sketches(conn, model, keys: tuple, sketches: dict):
+    """ادغام sketchهای جدید با sketch ذخیره شده ردیف‌ها (ردیف‌ها با _add_counts ساخته شده‌اند)"""
+    if not sketches:
+        return
+    table = model.__table__
+    columns = [table.c[key] for key in keys]
+    days = sorted({key[0] for key in sketches})
+    stored = {}
+    for row in conn.execute(select(*columns, table.c.sketch).where(table.c.day.in_(days), table.c.sketch.is_not(None))):
+        key = tuple(row[:-1])
+        if key in sketches:
+            stored[key] = row.sketch
+
+    for key, sketch in sketches.items():
+        if key in stored:
+            sketch.merge(hll.HyperLogLog.from_bytes(stored[key]))
+    statement = (
+        update(table)
+        .where(*(column == bindparam(f"key_{column.name}") for column in columns))
+        .values(sketch=bindparam("new_sketch"))
+    )
+    conn.execute(statement, [
+        {**{f"key_{name}": value for name, value in zip(keys, key)}, "new_sketch": sketch.to_bytes()}
+        for key, sketch in sketches.items()
+    ])
+
+
+def _merge_total(conn, sketch: hll.HyperLogLog):
+    """sketch کل روی ردیف watermark"""
+    state = models.VisitRollupState.__table__
+    watermark(conn)
+    stored = conn.execute(select(state.c.sketch).where(state.c.name == STATE_NAME)).scalar()
+    if stored:
+        sketch.merge(hll.HyperLogLog.from_bytes(stored))
+    conn.execute(update(state).where(state.c.name == STATE_NAME).values(sketch=sketch.to_bytes()))
+
+
+def watermark(conn) -> int:
+    """آخرین id بازدید تجمیع شده"""
+    conn.execute(
+        visit_dictionary.dialect_insert(conn, models.VisitRollupState)
+        .on_conflict_do_nothing(index_elements=["name"]),
+        {"name": STATE_NAME, "last_visit_id": 0},
+    )
+    return conn.execute(
+        select(models.VisitRollupState.last_visit_id).where(models.VisitRollupState.name == STATE_NAME)
+    ).scalar_one()
+
+
+def _aggregate(conn, rows: list):
+    """افزودن یک دسته بازدید (mapping با created_at/ip/path_id/referer_id/weight/section/is_bot) به rollupها"""
+    daily, bots, paths, sections, referers = Counter(), Counter(), Counter(), Counter(), Counter()
+    daily_sketches, path_sketches = {}, {}
+    total_sketch = hll.HyperLogLog(settings.HLL_PRECISION)
+    for row in rows:
+        created_at = row["created_at"]
+        day = _day(created_at) if created_at is not None else datetime.utcnow().date()
+        # ردیف نمونه‌برداری شده به اندازه weight بازدید شمرده می‌شود
+        weight = row.get("weight") or 1
+        if row["is_bot"]:
+            bots[(day,)] += weight
+            continue
+        path_id = row["path_id"]
+        daily[(day,)] += weight
+        sections[(day, row["section"] or "other")] += weight
+        if path_id is not None:
+            paths[(day, path_id)] += weight
+        if row["referer_id"] is not None:
+            referers[(day, row["referer_id"])] += weight
+        if row["ip"]:
+            if (day,) not in daily_sketches:
+                daily_sketches[(day,)] = hll.HyperLogLog(settings.HLL_PRECISION)
+            daily_sketches[(day,)].add(row["ip"])
+            total_sketch.add(row["ip"])
+            if path_id is not None:
+                if (day, path_id) not in path_sketches:
+                    path_sketches[(day, path_id)] = hll.HyperLogLog(settings.HLL_PATH_PRECISION)
+                path_sketches[(day, path_id)].add(row["ip"])
+
+    _add_counts(conn, models.VisitDaily, ("day",), daily)
+    _add_counts(conn, models.VisitDaily, ("day",), bots, "bots")
+    _add_counts(conn, models.VisitDailyPath, ("day", "path_id"), paths)
+    _add_counts(conn, models.VisitDailySection, ("day", "section"), sections)
+    _add_counts(conn, models.VisitDailyReferer, ("day", "referer_id"), referers)
+    _merge_sketches(conn, models.VisitDaily, ("day",), daily_sketches)
+    _merge_sketches(conn, models.VisitDailyPath, ("day", "path_id"), path_sketches)
+    if daily_sketches:
+        _merge_total(conn, total_sketch)
+
+
+def _process_batch(conn, batch_size: int) -> int:
+    """یک دسته از بازدیدهای جدید در یک تراکنش؛ تعداد بازدیدهای پردازش شده"""
+    last_id = watermark(conn)
+    rows = conn.execute(visit_dictionary.enriched_select(last_id, batch_size)).all()
+    # فقط تا اولین شکاف id (INSERT همزمانی که هنوز commit نشده)
+    rows = visit_dictionary.settled(rows, last_id)
+    if not rows:
+        return 0
+
+    _aggregate(conn, [row._mapping for row in rows])
+    advanced = conn.execute(
+        update(models.VisitRollupState)
+        .where(models.VisitRollupState.name == STATE_NAME, models.VisitRollupState.last_visit_id == last_id)
+        .values(last_visit_id=rows[-1].id)
+    ).rowcount
+    if not advanced:
+        # اجرای همزمان دیگری همین دسته را ثبت کرده؛ تراکنش rollback می‌شود
+        raise WatermarkMoved()
+    return len(rows)
+
+
+def catch_up(db_engine, batch_size: int = None) -> int:
+    """تجمیع همه بازدیدهای جدید از آخرین اجرا"""
+    batch_size = batch_size or settings.VISIT_ROLLUP_BATCH_SIZE
+    processed = 0
+    with _lock:
+        while True:
+            try:
+                with db_engine.begin() as conn:
+                    count = _process_batch(conn, batch_size)
+            except WatermarkMoved:
+                break
+            processed += count
+            # دسته ناقص: همه خوانده شده یا پشت یک شکاف id ایستاده
+            if count < batch_size:
+                break
+    return processed
+
+
+def rebuild(db_engine) -> int:
+    """خالی کردن جداول rollup و backfill کامل از آرشیوها، جداول ماهانه و جدول visits"""
+    processed = 0
+    with _lock:
+        with db_engine.begin() as conn:
+            for model in ROLLUP_MODELS:
+                conn.execute(delete(model))
+            conn.execute(delete(models.VisitRollupState).where(models.VisitRollupState.name == STATE_NAME))
+        cold_last_id = 0
+        for rows in visit_partitions.iter_cold_batches(db_engine, settings.VISIT_ROLLUP_BATCH_SIZE):
+            encoded = visit_dictionary.encode(db_engine, rows, enrich=True)
+            with db_engine.begin() as conn:
+                _aggregate(conn, encoded)
+            processed += len(rows)
+            cold_last_id = max(cold_last_id, max(row["id"] for row in rows))
+        # همه ردیف‌های جدول visits از اولینشان شمرده می‌شوند؛ idهای پایین‌تر
+        # منتقل شده‌اند و شکاف نیستند
+        with db_engine.begin() as conn:
+            watermark(conn)
+            conn.execute(
+                update(models.VisitRollupState)
+                .where(models.VisitRollupState.name == STATE_NAME)
+                .values(last_visit_id=visit_partitions.hot_start(conn, cold_last_id))
+            )
+    return processed + catch_up(db_engine)
+
+
+async def run_worker(db_engine):
+    """حلقه پس‌زمینه تجمیع که در lifespan اجرا و در shutdown لغو می‌شود"""
+    while True:
+        try:
+            await asyncio.to_thread(catch_up, db_engine)
+        except Exception as exc:
+            print("visit rollup error", exc)
+        await asyncio.sleep(settings.VISIT_ROLLUP_INTERVAL_SECONDS)
+
+
+# ============= Read =============
+
+def summary(db, today: date) -> dict:
+    """کل، امروز، ۷ و ۳۰ روز اخیر و IPهای یکتا (تخمین HLL) در یک کوئری"""
+    count = models.VisitDaily.count
+    day = models.VisitDaily.day
+
+    def since(days: int):
+        # «n روز اخیر» شامل امروز است (مثل /visits/analytics)
+        return func.coalesce(func.sum(count).filter(day >= today - timedelta(days=days - 1)), 0)
+
+    total_sketch = (
+        select(models.VisitRollupState.sketch)
+        .where(models.VisitRollupState.name == STATE_NAME)
+        .scalar_subquery()
+    )
+    row = db.execute(select(
+        func.coalesce(func.sum(count), 0),
+        func.coalesce(func.sum(count).filter(day == today), 0),
+        since(7),
+        since(30),
+        total_sketch,
+    )).one()
+    return {
+        "total": row[0],
+        "today": row[1],
+        "last7": row[2],
+        "last30": row[3],
+        "unique_ips": hll.HyperLogLog.from_bytes(row[4]).count() if row[4] else 0,
+    }
+
+
+def per_day(db, since: date) -> list:
+    rows = db.execute(
+        select(models.VisitDaily.day, models.VisitDaily.count)
+        .where(models.VisitDaily.day >= since)
+        .order_by(models.VisitDaily.day)
+    ).all()
+    return [{"day": row.day.isoformat(), "count": row.count} for row in rows]
+
+
+def top(db, model, column: str, since: date, limit: int = None) -> list:
+    """پرتکرارترین مقادیر column در بازه (از جدول rollup همان ستون)"""
+    key = getattr(model, column)
+    total = func.sum(model.count)
+    query = (
+        select(key, total.label("count"))
+        .where(model.day >= since)
+        .group_by(key)
+        .order_by(total.desc())
+    )
+    if limit:
+        query = query.limit(limit)
+    return [(row[0], row.count) for row in db.execute(query).all()]
+
+
+def top_labeled(db, model, column: str, dictionary, labels: tuple, since: date, limit: int) -> list:
+    """مثل top برای rollupهای با کلید id؛ گروه‌بندی روی id و سپس join برای متن (id، *labels، count)"""
+    key = getattr(model, column)
+    total = func.sum(model.count)
+    ranked = (
+        select(key.label("key"), total.label("count"))
+        .where(model.day >= since)
+        .group_by(key)
+        .order_by(total.desc())
+        .limit(limit)
+        .subquery()
+    )
+    query = (
+        select(ranked.c.key, *(getattr(dictionary, label) for label in labels), ranked.c.count)
+        .join_from(ranked, dictionary, dictionary.id == ranked.c.key)
+        .order_by(ranked.c.count.desc())
+    )
+    return [tuple(row) for row in db.execute(query).all()]
+
+
+def total_since(db, since: date, column: str = "count") -> int:
+    return db.execute(
+        select(func.coalesce(func.sum(getattr(models.VisitDaily, column)), 0)).where(models.VisitDaily.day >= since)
+    ).scalar_one()
+
+
+def unique_since(db, since: date) -> int:
+    """تخمین IPهای یکتای بازه از ادغام sketchهای روزانه"""
+    sketches = db.execute(
+        select(models.VisitDaily.sketch).where(models.VisitDaily.day >= since)
+    ).scalars()
+    return hll.merge_all(sketches, settings.HLL_PRECISION).count()
+
+
+def unique_per_path(db, path_ids: list, since: date) -> dict:
+    """تخمین IPهای یکتای هر مسیر در بازه (یک کوئری برای همه مسیرها)"""
+    if not path_ids:
+        return {}
+    grouped = {path_id: [] for path_id in path_ids}
+    rows = db.execute(
+        select(models.VisitDailyPath.path_id, models.VisitDailyPath.sketch)
+        .where(models.VisitDailyPath.day >= since, models.VisitDailyPath.path_id.in_(path_ids))
+    ).all()
+    for row in rows:
+        grouped[row.path_id].append(row.sketch)
+    return {
+        path_id: hll.merge_all(sketches, settings.HLL_PATH_PRECISION).count()
+        for path_id, sketches in grouped.items()
+    }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+شمارش کوئری‌ها و زمان آمار داشبورد ادمین
+
+پیاده‌سازی قدیمی (یک COUNT جدا برای هر عدد، ۱۴ کوئری) را با
+dashboard.build (دو کوئری تجمیعی) روی یک دیتابیس موقت مقایسه می‌کند و
+بررسی می‌کند که:
+- خروجی هر دو یکسان است (unique_ips تخمین HLL در محدوده خطای مستند)
+- build دقیقا دو کوئری اجرا می‌کند
+- snapshot کش شده هیچ کوئری‌ای اجرا نمی‌کند و با commit روی جداول محتوا باطل می‌شود
+
+اجرا:
+    python bench_dashboard_queries.py --visits 50000 --rounds 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def setup_database():
+    tmp_dir = tempfile.mkdtemp(prefix="bim-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    return tmp_dir
+
+
+def seed(visits: int):
+    from app.database import Base, engine
+    from app import models, visit_dictionary, visit_rollup
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(7)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(models.Article.__table__.insert(), [
+            {"title": f"a{i}", "excerpt": "e", "category": "c", "author": "bench"} for i in range(120)
+        ])
+        conn.execute(models.Contact.__table__.insert(), [
+            {"name": "n", "email": "a@b.com", "subject": "s", "message": "m", "read": i % 3 == 0} for i in range(40)
+        ])
+        conn.execute(models.Testimonial.__table__.insert(), [
+            {"name": "n", "role": "r", "text": "t", "approved": i % 4 == 0} for i in range(30)
+        ])
+    rows = visit_dictionary.encode(engine, [
+        {
+            "path": rnd.choice(["/", "/article/1", "/gallery", "/contact"]),
+            "ip": f"10.0.{rnd.randint(0, 3)}.{rnd.randint(1, 250)}",
+            "created_at": now - timedelta(days=rnd.randint(0, 90), minutes=rnd.randint(0, 600)),
+        }
+        for _ in range(visits)
+    ])
+    with engine.begin() as conn:
+        conn.execute(models.Visit.__table__.insert(), rows)
+    visit_rollup.catch_up(engine)
+
+
+def legacy_stats(db) -> dict:
+    """پیاده‌سازی قبلی get_dashboard_stats (بازدیدها از rollup و IP یکتا با COUNT(DISTINCT))"""
+    from sqlalchemy import distinct, func, select
+    from app import models
+
+    today = datetime.utcnow().date()
+    stats = {
+        "articles": db.query(models.Article).count(),
+        "gallery": db.query(models.GalleryItem).count(),
+        "testimonials": db.query(models.Testimonial).count(),
+        "contacts": db.query(models.Contact).count(),
+        "sliders": db.query(models.Slider).count(),
+        "certificates": db.query(models.Certificate).count(),
+        "services": db.query(models.Service).count(),
+        "unread_contacts": db.query(models.Contact).filter(models.Contact.read == False).count(),
+        "pending_testimonials": db.query(models.Testimonial).filter(models.Testimonial.approved == False).count(),
+    }
+
+    def visits_since(day):
+        query = select(func.coalesce(func.sum(models.VisitDaily.count), 0))
+        if day is not None:
+            query = query.where(models.VisitDaily.day >= day)
+        return db.execute(query).scalar_one()
+
+    stats["visits"] = {
+        "total": visits_since(None),
+        "today": visits_since(today),
+        "last7": visits_since(today - timedelta(days=6)),
+        "last30": visits_since(today - timedelta(days=29)),
+        "unique_ips": db.execute(select(func.count(distinct(models.Visit.ip)))).scalar() or 0,
+    }
+    return stats
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def measure(self, fn, *args):
+        before = self.count
+        result = fn(*args)
+        return result, self.count - before
+
+
+def timed(fn, db, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(db)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_database()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    seed(args.visits)
+
+    from app import dashboard, hll, models
+    from app.config import settings
+    from app.database import SessionLocal, engine
+
+    counter = QueryCounter(engine)
+    db = SessionLocal()
+    try:
+        legacy, legacy_queries = counter.measure(legacy_stats, db)
+        built, built_queries = counter.measure(dashboard.build, db)
+        # unique_ips تخمین HyperLogLog است؛ بقیه اعداد باید دقیقا برابر باشند
+        exact_unique = legacy["visits"].pop("unique_ips")
+        estimated_unique = built["visits"].pop("unique_ips")
+        assert built == legacy, (built, legacy)
+        assert abs(estimated_unique - exact_unique) <= 4 * hll.relative_error(settings.HLL_PRECISION) * exact_unique, \
+            (estimated_unique, exact_unique)
+        assert built_queries == 2, built_queries
+
+        dashboard.snapshot_cache.clear()
+        _, cold_queries = counter.measure(dashboard.snapshot, db)
+        cached, warm_queries = counter.measure(dashboard.snapshot, db)
+        assert cold_queries == 2 and warm_queries == 0, (cold_queries, warm_queries)
+
+        # نوشتن روی جدول محتوا snapshot را باطل می‌کند
+        db.add(models.Contact(name="n", email="a@b.com", subject="s", message="m"))
+        db.commit()
+        fresh, refresh_queries = counter.measure(dashboard.snapshot, db)
+        assert refresh_queries == 2 and fresh["unread_contacts"] == cached["unread_contacts"] + 1
+
+        print("=" * 72)
+        print(f"visits={args.visits} rounds={args.rounds} unique_ips exact={exact_unique} hll={estimated_unique}")
+        print("=" * 72)
+        print(f"before (legacy)      queries={legacy_queries:3d}  p50={timed(legacy_stats, db, args.rounds):7.2f}ms")
+        print(f"after  (build)       queries={built_queries:3d}  p50={timed(dashboard.build, db, args.rounds):7.2f}ms")
+        print(f"after  (snapshot)    queries={warm_queries:3d}  p50={timed(dashboard.snapshot, db, args.rounds):7.2f}ms")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+بنچمارک تاخیر event loop زیر بار همزمان
+
+روت قدیمی (کوئری همگام SQLAlchemy داخل `async def`) را با روت جدید
+(`get_async_db`) مقایسه می‌کند. در حین ارسال درخواست‌های همزمان، یک
+ticker هر 5ms بیدار می‌شود و تاخیر بیدار شدنش اندازه‌گیری می‌شود؛ هر چه
+event loop بیشتر بلاک شود این تاخیر بیشتر است.
+
+اجرا:
+    python bench_event_loop.py --articles 20000 --concurrency 20 --requests 400
+
+concurrency باید از DB_POOL_SIZE + DB_MAX_OVERFLOW کمتر باشد؛ در غیر این
+صورت روت قدیمی روی گرفتن connection از pool بلاک می‌شود و event loop
+هیچ‌وقت فرصت آزاد کردن connectionهای قبلی را پیدا نمی‌کند (deadlock).
+
+نیاز به httpx دارد (pip install httpx).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def setup_database() -> str:
+    """ساخت دیتابیس موقت SQLite با تعداد مشخصی مقاله"""
+    tmp_dir = tempfile.mkdtemp(prefix="bim-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    return tmp_dir
+
+
+def seed(articles: int):
+    from app.database import Base, engine
+    from app import models
+
+    Base.metadata.create_all(bind=engine)
+    rows = [
+        {
+            "title": f"مقاله شماره {i}",
+            "excerpt": f"خلاصه مقاله {i} درباره BIM و مدل‌سازی اطلاعات ساختمان",
+            "full_content": "<p>" + ("متن کامل مقاله " * 50) + "</p>",
+            "category": ("برنامه‌نویسی", "طراحی", "هوش مصنوعی")[i % 3],
+            "author": "bench",
+            "views": i % 1000,
+            "tags": ["bench"],
+        }
+        for i in range(articles)
+    ]
+    with engine.begin() as conn:
+        conn.execute(models.Article.__table__.insert(), rows)
+
+
+def build_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.orm import Session
+
+    from app import models, schemas
+    from app.database import get_db
+    from app.routes import articles
+
+    app = FastAPI()
+
+    @app.get("/legacy/articles")
+    async def legacy_articles(search: str = None, db: Session = Depends(get_db)):
+        """الگوی قبلی: کوئری همگام داخل روت async"""
+        query = db.query(models.Article)
+        if search:
+            query = query.filter(models.Article.title.ilike(f"%{search}%"))
+        total = query.count()
+        rows = query.order_by(models.Article.created_at.desc()).limit(10).all()
+        return {"data": [schemas.Article.from_orm(r) for r in rows], "total": total}
+
+    app.include_router(articles.router)
+    return app
+
+
+async def measure(app, path: str, concurrency: int, total_requests: int) -> dict:
+    import httpx
+
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        interval = 0.005
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append((time.perf_counter() - started - interval) * 1000)
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        tick_task = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total_requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await tick_task
+
+    lags.sort()
+    latencies.sort()
+    return {
+        "rps": total_requests / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_p95": latencies[int(len(latencies) * 0.95) - 1],
+        "loop_lag_p50": statistics.median(lags) if lags else 0.0,
+        "loop_lag_p99": lags[int(len(lags) * 0.99) - 1] if lags else 0.0,
+        "loop_lag_max": lags[-1] if lags else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--search", default="99")
+    args = parser.parse_args()
+
+    setup_database()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    seed(args.articles)
+    app = build_app()
+
+    print("=" * 72)
+    print(f"articles={args.articles} concurrency={args.concurrency} requests={args.requests}")
+    print("=" * 72)
+    async def run_all():
+        from app.database import async_engine
+
+        for label, path in (
+            ("before (sync session in async def)", f"/legacy/articles?search={args.search}"),
+            ("after  (get_async_db)", f"/api/articles?search={args.search}"),
+        ):
+            result = await measure(app, path, args.concurrency, args.requests)
+            print(
+                f"{label:38} rps={result['rps']:8.1f}  "
+                f"p50={result['latency_p50']:7.1f}ms p95={result['latency_p95']:7.1f}ms  "
+                f"loop lag p50={result['loop_lag_p50']:6.2f}ms p99={result['loop_lag_p99']:7.2f}ms "
+                f"max={result['loop_lag_max']:7.2f}ms"
+            )
+        await async_engine.dispose()
+
+    asyncio.run(run_all())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+حافظه و سرعت خروجی‌های جریانی (app/exports.py)
+
+روی یک دیتابیس موقت بازدیدهای ساختگی (بخشی rotate و آرشیو شده) می‌سازد و
+خروجی visits را در هر قالب (csv / ndjson، با و بدون gzip) برای چند اندازه
+جدول مصرف می‌کند؛ اوج حافظه پایتون (tracemalloc) باید مستقل از تعداد
+ردیف‌ها بماند. برای مقایسه، اوج حافظه خواندن همه ردیف‌ها با .all() هم
+گزارش می‌شود. تعداد ردیف‌های خروجی با تعداد بازدیدها مقایسه می‌شود.
+
+اجرا:
+    python bench_exports.py --sizes 20000 100000 300000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def setup_environment():
+    tmp_dir = tempfile.mkdtemp(prefix="bim-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    os.environ["VISIT_ARCHIVE_DIR"] = f"{tmp_dir}/archive"
+    os.environ["VISIT_ANALYTICS_DIR"] = f"{tmp_dir}/analytics"
+    os.environ["VISIT_RETENTION_MONTHS"] = "2"
+    return tmp_dir
+
+
+def seed(count: int, rnd: random.Random):
+    from app.database import engine
+    from app import models, visit_dictionary
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "path": f"/article/{rnd.randint(1, 300)}",
+            "ip": f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 250)}",
+            "referer": rnd.choice([None, "https://www.google.com/search?q=bim"]),
+            "user_agent": "Mozilla/5.0 (Windows NT 10.0) Chrome/120.0",
+            "created_at": now - timedelta(days=rnd.randint(0, 150), seconds=rnd.randint(0, 86399)),
+        }
+        for _ in range(count)
+    ]
+    rows.sort(key=lambda row: row["created_at"])
+    for start in range(0, len(rows), 20000):
+        encoded = visit_dictionary.encode(engine, rows[start:start + 20000])
+        with engine.begin() as conn:
+            conn.execute(models.Visit.__table__.insert(), encoded)
+
+
+def measure(fn) -> tuple:
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000, 300000])
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_environment()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlalchemy import select
+    from app.database import Base, engine
+    from app import exports, visit_dictionary, visit_partitions, visit_rollup
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(args.seed)
+    seeded = 0
+    print("=" * 72)
+    for size in sorted(args.sizes):
+        seed(size - seeded, rnd)
+        seeded = size
+        visit_rollup.catch_up(engine)
+        visit_partitions.maintain(engine)
+        print(f"visits={size}  {visit_partitions.storage(engine)['hot_rows']} hot, "
+              f"{len(visit_partitions.archive_files())} archive files")
+
+        for fmt in exports.FORMATS:
+            for compress in (False, True):
+                def consume():
+                    total, lines = 0, 0
+                    for chunk in exports.stream("visits", engine, fmt, compress=compress):
+                        total += len(chunk)
+                        if not compress:
+                            lines += chunk.count(b"\n")
+                    return total, lines
+
+                (size_bytes, lines), elapsed, peak = measure(consume)
+                if not compress:
+                    expected = size + (1 if fmt == "csv" else 0)
+                    assert lines == expected, (fmt, lines, expected)
+                label = fmt + (".gz" if compress else "")
+                print(f"  {label:<10} {size_bytes / 1e6:8.1f}MB  {elapsed:6.2f}s  "
+                      f"{size / elapsed:9.0f} rows/s  peak={peak / 1e6:6.2f}MB")
+
+        def load_all():
+            with engine.connect() as conn:
+                return conn.execute(visit_dictionary.decoded_select(visit_partitions.visits)).all()
+
+        rows, _, peak = measure(load_all)
+        print(f"  .all() on hot table ({len(rows)} rows) peak={peak / 1e6:6.2f}MB")
+        del rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+بنچمارک حجم پاسخ و تاخیر لیست مقالات
+
+لیست قدیمی (خواندن کل ردیف و schemas.Article با full_content) را با لیست
+جدید (defer کردن full_content و schemas.ArticleSummary) روی یک دیتابیس
+موقت با 10k مقاله مقایسه می‌کند.
+
+اجرا:
+    python bench_list_payload.py --articles 10000 --limit 100 --rounds 50
+
+نیاز به httpx دارد (pip install httpx).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def setup_database():
+    tmp_dir = tempfile.mkdtemp(prefix="bim-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    return tmp_dir
+
+
+def seed(articles: int, content_kb: int):
+    from app.database import Base, engine
+    from app import models
+
+    Base.metadata.create_all(bind=engine)
+    body = "<p>" + ("محتوای کامل مقاله با جزئیات BIM. " * (content_kb * 1024 // 60)) + "</p>"
+    rows = [
+        {
+            "title": f"مقاله شماره {i}",
+            "excerpt": f"خلاصه مقاله {i}",
+            "full_content": body,
+            "category": ("برنامه‌نویسی", "طراحی", "هوش مصنوعی")[i % 3],
+            "author": "bench",
+            "views": i % 1000,
+            "tags": ["bench"],
+        }
+        for i in range(articles)
+    ]
+    with engine.begin() as conn:
+        conn.execute(models.Article.__table__.insert(), rows)
+
+
+def build_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from app import models, schemas
+    from app.database import get_async_db
+    from app.routes import articles
+
+    app = FastAPI()
+
+    @app.get("/legacy/articles")
+    async def legacy_articles(limit: int = 10, db: AsyncSession = Depends(get_async_db)):
+        """مسیر قدیمی: کل ردیف به همراه full_content"""
+        result = await db.execute(
+            select(models.Article).order_by(models.Article.created_at.desc(), models.Article.id.desc()).limit(limit)
+        )
+        return {"data": [schemas.Article.from_orm(row) for row in result.scalars().all()]}
+
+    app.include_router(articles.router)
+    return app
+
+
+async def measure(app, path: str, rounds: int) -> dict:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    timings = []
+    size = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)  # warm-up
+        for _ in range(rounds):
+            started = time.perf_counter()
+            response = await client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            size = len(response.content)
+    timings.sort()
+    return {
+        "bytes": size,
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--content-kb", type=int, default=8, help="اندازه تقریبی full_content هر مقاله")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_database()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    seed(args.articles, args.content_kb)
+    app = build_app()
+
+    async def run_all():
+        from app.database import async_engine
+
+        print("=" * 72)
+        print(f"articles={args.articles} full_content≈{args.content_kb}KB limit={args.limit} rounds={args.rounds}")
+        print("=" * 72)
+        for label, path in (
+            ("before (full rows)", f"/legacy/articles?limit={args.limit}"),
+            ("after  (ArticleSummary)", f"/api/articles?limit={args.limit}&include_total=false"),
+        ):
+            result = await measure(app, path, args.rounds)
+            print(
+                f"{label:26} payload={result['bytes'] / 1024:9.1f}KB  "
+                f"p50={result['p50']:7.1f}ms p95={result['p95']:7.1f}ms"
+            )
+        await async_engine.dispose()
+
+    asyncio.run(run_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+میکروبنچمارک serialization پاسخ لیست‌ها
+
+مسیر قدیمی: `[Schema.from_orm(row) ...]` + `response_model=dict` +
+`jsonable_encoder` + `JSONResponse` (همان کاری که FastAPI برای هر پاسخ
+dict انجام می‌داد)
+
+مسیر جدید: `serialization.dump_list` (یک فراخوانی TypeAdapter) +
+`ORJSONResponse`
+
+اجرا:
+    python bench_serialization.py --rows 100 --rounds 500
+
+بدون دیتابیس اجرا می‌شود؛ ردیف‌ها نمونه‌های ساختگی ORM هستند.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import warnings
+from datetime import datetime, timedelta
+
+
+def make_rows(count: int) -> list:
+    from app import models
+
+    now = datetime.utcnow()
+    return [
+        models.Article(
+            id=i,
+            title=f"مقاله شماره {i}",
+            excerpt=f"خلاصه مقاله {i} درباره مدل‌سازی اطلاعات ساختمان",
+            category="طراحی",
+            icon="📐",
+            gradient="from-blue-500 to-purple-600",
+            image=f"/uploads/article-{i}.jpg",
+            author="تیم BIM",
+            read_time="5 دقیقه",
+            featured=i % 7 == 0,
+            tags=["BIM", "Revit", "IFC"],
+            model_type="auto",
+            views=i * 3,
+            created_at=now - timedelta(minutes=i),
+            updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_path(schema, rows, field, serialize_response, loop) -> bytes:
+    from fastapi.responses import JSONResponse
+
+    content = {
+        "data": [schema.from_orm(row) for row in rows],
+        "total": len(rows),
+        "page": 1,
+        "limit": len(rows),
+        "pages": 1,
+        "next_cursor": None,
+    }
+    content = loop.run_until_complete(serialize_response(field=field, response_content=content))
+    return JSONResponse(content).body
+
+
+def fast_path(schema, rows) -> bytes:
+    from app import serialization
+
+    return serialization.respond({
+        "data": serialization.dump_list(schema, rows),
+        "total": len(rows),
+        "page": 1,
+        "limit": len(rows),
+        "pages": 1,
+        "next_cursor": None,
+    }).body
+
+
+def timeit(fn, rounds: int) -> list:
+    fn()  # warm-up
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    warnings.filterwarnings("ignore")
+
+    import orjson
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    from app import schemas
+
+    rows = make_rows(args.rows)
+    field = create_response_field(name="response", type_=dict)
+    loop = asyncio.new_event_loop()
+
+    # هر دو مسیر باید خروجی یکسانی تولید کنند
+    legacy_body = legacy_path(schemas.ArticleSummary, rows, field, serialize_response, loop)
+    fast_body = fast_path(schemas.ArticleSummary, rows)
+    assert orjson.loads(legacy_body) == orjson.loads(fast_body), "payload mismatch"
+
+    print("=" * 72)
+    print(f"rows={args.rows} rounds={args.rounds} payload={len(fast_body) / 1024:.1f}KB")
+    print("=" * 72)
+    results = {}
+    for label, fn in (
+        ("legacy (from_orm + jsonable_encoder)", lambda: legacy_path(schemas.ArticleSummary, rows, field, serialize_response, loop)),
+        ("fast   (TypeAdapter + orjson)", lambda: fast_path(schemas.ArticleSummary, rows)),
+    ):
+        timings = timeit(fn, args.rounds)
+        results[label] = statistics.median(timings)
+        print(f"{label:38} p50={statistics.median(timings):7.3f}ms mean={statistics.mean(timings):7.3f}ms")
+
+    legacy, fast = results.values()
+    print(f"\nspeedup: {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
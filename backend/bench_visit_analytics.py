@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+مقایسه موتور ستونی visit_analytics با GROUP BY روی جدول visits
+
+روی یک دیتابیس موقت با بازدیدهای ساختگی چند برش (کل بازه، یک مسیر، یک
+referer، یک بخش، پنجره کوتاه) را هم با SQL و هم با آرایه‌های memory-mapped
+حساب می‌کند و بررسی می‌کند که هیستوگرام روزانه، تعداد هر مسیر / referer /
+بخش، یکتاها و رباتها دقیقا برابرند؛ سپس زمان هر دو را گزارش می‌کند.
+بخشی از ردیف‌ها weight دارند (مثل نمونه‌برداری visit_ingest) و هر دو طرف
+مجموع weight را می‌شمارند.
+در پایان rebuild را بعد از rotate و آرشیو هم با همان نتیجه مقایسه می‌کند.
+
+اجرا:
+    python bench_visit_analytics.py --visits 200000 --rounds 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PATHS = ["/", "/articles", "/gallery", "/contact"] + [f"/article/{i}" for i in range(60)] + \
+    [f"/project/{i}" for i in range(40)] + [f"/service/{i}" for i in range(10)]
+REFERERS = [None, None, "https://www.google.com/search?q=bim", "https://t.me/bim", "https://x.com/a"]
+AGENTS = ["Mozilla/5.0 (Windows NT 10.0) Chrome/120.0", "Mozilla/5.0 (iPhone) Mobile Safari/604.1", "Googlebot/2.1"]
+
+
+def setup_environment():
+    tmp_dir = tempfile.mkdtemp(prefix="bim-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_dir}/bench.db"
+    os.environ["VISIT_ARCHIVE_DIR"] = f"{tmp_dir}/archive"
+    os.environ["VISIT_ANALYTICS_DIR"] = f"{tmp_dir}/analytics"
+    # تا بخشی از داده آرشیو شود و rebuild آرشیوها را هم بخواند
+    os.environ["VISIT_RETENTION_MONTHS"] = "2"
+    return tmp_dir
+
+
+def seed(visits: int):
+    from app.database import Base, engine
+    from app import models, visit_dictionary
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(11)
+    now = datetime.utcnow()
+    rows = [
+        {
+            "path": rnd.choice(PATHS),
+            "ip": f"10.{rnd.randint(0, 3)}.{rnd.randint(0, 255)}.{rnd.randint(1, 250)}",
+            "referer": rnd.choice(REFERERS),
+            "user_agent": rnd.choice(AGENTS),
+            "weight": rnd.choice([None] * 9 + [5]),
+            "created_at": now - timedelta(days=rnd.randint(0, 170), seconds=rnd.randint(0, 86399)),
+        }
+        for _ in range(visits)
+    ]
+    rows.sort(key=lambda row: row["created_at"])
+    for start in range(0, len(rows), 20000):
+        encoded = visit_dictionary.encode(engine, rows[start:start + 20000])
+        with engine.begin() as conn:
+            conn.execute(models.Visit.__table__.insert(), encoded)
+
+
+def sql_slice(db, start, end, path_id=None, referer_id=None, section=None) -> dict:
+    """همان برش با SQL روی visits (پیاده‌سازی مرجع)"""
+    from sqlalchemy import and_, distinct, false, func, or_, select
+    from app import models
+
+    visit, path, agent = models.Visit, models.VisitPath, models.VisitUserAgent
+    low = datetime(start.year, start.month, start.day)
+    high = datetime(end.year, end.month, end.day) + timedelta(days=1)
+    source = visit.__table__.outerjoin(path, path.id == visit.path_id).outerjoin(agent, agent.id == visit.user_agent_id)
+    conditions = [visit.created_at >= low, visit.created_at < high]
+    if path_id is not None:
+        conditions.append(visit.path_id == path_id)
+    if referer_id is not None:
+        conditions.append(visit.referer_id == referer_id)
+    if section is not None:
+        conditions.append(func.coalesce(path.section, "other") == section)
+    humans = and_(*conditions, or_(agent.is_bot == false(), agent.is_bot.is_(None)))
+    weighted = func.coalesce(func.sum(func.coalesce(visit.weight, 1)), 0)
+
+    def grouped(column):
+        return dict(db.execute(
+            select(column, weighted).select_from(source).where(humans, column.is_not(None)).group_by(column)
+        ).all())
+
+    return {
+        "total": db.execute(select(weighted).select_from(source).where(humans)).scalar_one(),
+        "unique": db.execute(select(func.count(distinct(visit.ip))).select_from(source).where(humans)).scalar_one(),
+        "bots": db.execute(
+            select(weighted).select_from(source).where(*conditions, agent.is_bot == True)
+        ).scalar_one(),
+        "per_day": {day: count for day, count in grouped(func.date(visit.created_at)).items()},
+        "paths": grouped(visit.path_id),
+        "referers": grouped(visit.referer_id),
+        "sections": grouped(func.coalesce(path.section, "other")),
+    }
+
+
+def engine_slice(start, end, **filters) -> dict:
+    from app import visit_analytics
+
+    result = visit_analytics.report(start, end, limit=10 ** 6, **filters)
+    return {
+        "total": result["total"],
+        "unique": result["unique"],
+        "bots": result["bots"],
+        "per_day": {item["day"]: item["count"] for item in result["per_day"] if item["count"]},
+        "paths": dict(result["top_paths"]),
+        "referers": dict(result["top_referers"]),
+        "sections": dict(result["by_section"]),
+    }
+
+
+def timed(fn, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_environment()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    seed(args.visits)
+
+    from app import models, visit_analytics, visit_partitions, visit_rollup
+    from app.database import SessionLocal, engine
+
+    started = time.perf_counter()
+    rows = visit_analytics.catch_up(engine)
+    print(f"catch_up: {rows} rows in {(time.perf_counter() - started):.2f}s, {visit_analytics.storage()['bytes']} bytes")
+
+    today = datetime.utcnow().date()
+    db = SessionLocal()
+    try:
+        article = db.query(models.VisitPath).filter(models.VisitPath.path == "/article/7").one().id
+        google = db.query(models.VisitReferer).filter(models.VisitReferer.host == "google.com").one().id
+        slices = {
+            "180 days": (today - timedelta(days=179), today, {}),
+            "30 days": (today - timedelta(days=29), today, {}),
+            "path /article/7": (today - timedelta(days=179), today, {"path_id": article}),
+            "referer google": (today - timedelta(days=89), today - timedelta(days=10), {"referer_id": google}),
+            "section gallery": (today - timedelta(days=59), today, {"section": "gallery"}),
+        }
+        print("=" * 72)
+        print(f"visits={args.visits} rounds={args.rounds}")
+        print("=" * 72)
+        for label, (start, end, filters) in slices.items():
+            expected = sql_slice(db, start, end, **filters)
+            actual = engine_slice(start, end, **filters)
+            assert actual == expected, (label, actual, expected)
+            sql_ms = timed(lambda: sql_slice(db, start, end, **filters), args.rounds)
+            numpy_ms = timed(lambda: engine_slice(start, end, **filters), args.rounds)
+            print(f"{label:<18} rows={expected['total']:7d}  sql p50={sql_ms:8.2f}ms  numpy p50={numpy_ms:7.2f}ms")
+
+        # rotate و آرشیو، سپس rebuild از داده سرد باید همان نتیجه را بدهد
+        before = engine_slice(today - timedelta(days=179), today)
+        visit_rollup.catch_up(engine)
+        maintained = visit_partitions.maintain(engine)
+        rebuilt = visit_analytics.rebuild(engine)
+        assert rebuilt == args.visits, rebuilt
+        assert engine_slice(today - timedelta(days=179), today) == before
+        print(f"rebuild after rotate/archive: {rebuilt} rows, archived={len(maintained['archived'])} files, identical")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+حذف تکراری‌ها و دقت نمونه‌برداری تطبیقی visit_ingest
+
+۱) dedupe: بازدیدکنندگان ساختگی هر صفحه را با چند reload پشت سر هم
+   (کمتر از VISIT_DEDUPE_WINDOW_SECONDS) باز می‌کنند؛ تعداد ردیف‌های ثبت
+   شده باید دقیقا برابر تعداد بازدیدهای واقعی صفحه باشد.
+۲) sampling: بار ثابتی بالاتر از VISIT_SAMPLING_RATE_THRESHOLD با توزیع
+   Zipf روی مسیرها فرستاده می‌شود (زمان ساختگی، بدون sleep). مجموع weight
+   ردیف‌های نگه داشته شده برای کل و هر مسیر با تعداد واقعی مقایسه می‌شود؛
+   اجرا با خطا تمام می‌شود اگر اختلاف از چهار برابر انحراف معیار برآورد
+   (sqrt(Σ w × (w - 1)) روی ردیف‌های نگه داشته شده) بیشتر شود.
+
+اجرا:
+    python bench_visit_sampling.py --rate 3000 --seconds 120 --threshold 200
+
+بدون دیتابیس اجرا می‌شود.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+PATHS = ["/"] + [f"/article/{i}" for i in range(40)] + [f"/project/{i}" for i in range(20)]
+
+
+def check(label: str, estimate: float, exact: int, sigma: float) -> bool:
+    ok = abs(estimate - exact) <= 4 * max(sigma, 1)
+    print(f"{label:<18} exact={exact:8d}  estimate={estimate:10.0f}  sigma={sigma:8.1f}  {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def dedupe(visit_ingest, rnd: random.Random, visitors: int) -> bool:
+    start = datetime(2024, 1, 1)
+    rows, page_views = [], 0
+    for visitor in range(visitors):
+        at = start + timedelta(seconds=rnd.randint(0, 3600))
+        for _ in range(rnd.randint(1, 8)):
+            page_views += 1
+            path = rnd.choice(PATHS)
+            # reload / تغییر route در SPA: همان صفحه چند بار در چند ثانیه
+            for _ in range(rnd.choice([1, 1, 2, 3, 5])):
+                rows.append({"ip": f"10.{visitor // 250}.{visitor % 250}.1", "path": path, "created_at": at})
+                at += timedelta(seconds=rnd.uniform(0.2, 2))
+            at += timedelta(seconds=rnd.randint(30, 300))
+    started = time.perf_counter()
+    kept = visit_ingest.deduplicate(rows)
+    per_event_us = (time.perf_counter() - started) / len(rows) * 1e6
+    ok = len(kept) == page_views
+    print(f"dedupe: raw={len(rows)} page views={page_views} stored={len(kept)} "
+          f"({per_event_us:.2f}us/event)  {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def sampling(visit_ingest, rnd: random.Random, rate: int, seconds: int) -> bool:
+    weights = [1 / (rank + 1) for rank in range(len(PATHS))]
+    exact, estimate, variance = Counter(), Counter(), Counter()
+    now = 1_700_000_000.0
+    started = time.perf_counter()
+    for second in range(seconds):
+        # هر ثانیه در چند درخواست (مثل /visit و /visit/batch)
+        for _ in range(20):
+            rows = [{"path": path} for path in rnd.choices(PATHS, weights, k=rate // 20)]
+            exact.update(row["path"] for row in rows)
+            for row in visit_ingest.sample(rows, now=now + second + rnd.random()):
+                weight = row.get("weight") or 1
+                estimate[row["path"]] += weight
+                variance[row["path"]] += weight * (weight - 1)
+    elapsed = time.perf_counter() - started
+
+    stats = visit_ingest.stats()
+    print(f"sampling: {sum(exact.values())} events, stored={sum(exact.values()) - stats['sampled_out']}, "
+          f"factor={visit_ingest.factor(rate)}, {elapsed / sum(exact.values()) * 1e6:.2f}us/event")
+    ok = check("total", sum(estimate.values()), sum(exact.values()), math.sqrt(sum(variance.values())))
+    for path, _ in exact.most_common(5) + exact.most_common()[-3:]:
+        ok &= check(path, estimate[path], exact[path], math.sqrt(variance[path]))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=3000, help="events per second")
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--threshold", type=int, default=200)
+    parser.add_argument("--visitors", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["VISIT_SAMPLING_RATE_THRESHOLD"] = str(args.threshold)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import visit_ingest
+
+    rnd = random.Random(args.seed)
+    random.seed(args.seed)
+    print("=" * 72)
+    ok = dedupe(visit_ingest, rnd, args.visitors)
+    print("=" * 72)
+    ok &= sampling(visit_ingest, rnd, args.rate, args.seconds)
+    if not ok:
+        sys.exit("error bound exceeded")
+
+
+if __name__ == "__main__":
+    main()
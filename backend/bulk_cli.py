@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+ورود و خروج دسته‌ای موجودیت‌ها از خط فرمان (app/bulk.py)
+
+همان منطق روت‌های /api/admin/bulk روی DATABASE_URL تنظیمات:
+
+    python bulk_cli.py list
+    python bulk_cli.py export articles -o articles.ndjson
+    python bulk_cli.py export newsletter --format csv --gzip -o newsletter.csv.gz
+    python bulk_cli.py export all -o ./backup            # هر موجودیت یک فایل
+    python bulk_cli.py import sliders sliders.csv --dry-run
+    python bulk_cli.py import articles articles.ndjson.gz --batch-size 1000
+
+قالب ورود از پسوند فایل (.csv / .ndjson / .jsonl، با یا بدون .gz) یا
+--format تعیین می‌شود. اگر ردیفی رد شود کد خروج 1 است.
+
+ورود از خط فرمان فقط کش‌های همین پروسه را باطل می‌کند؛ سرور در حال اجرا
+داده کهنه را تا پایان TTL کش‌هایش (تا COUNT_CACHE_TTL_SECONDS ثانیه) نشان
+می‌دهد. برای دیده شدن فوری از /api/admin/bulk استفاده کنید یا سرور را
+ری‌استارت کنید.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import bulk, search  # noqa: E402
+from app.database import engine, init_db  # noqa: E402
+
+
+def export_entity(name: str, output, fmt: str, compress: bool):
+    target = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        for chunk in bulk.export(name, engine, fmt, compress=compress):
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
+
+
+def command_list(args):
+    for item in bulk.describe():
+        print(f"{item['entity']:<14} key={item['key']:<6} {', '.join(item['columns'])}")
+
+
+def command_export(args):
+    if args.entity == "all":
+        directory = Path(args.output or ".")
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in bulk.ENTITIES:
+            path = directory / (f"{name}.{args.format}" + (".gz" if args.gzip else ""))
+            export_entity(name, path, args.format, args.gzip)
+            print(f"{name} -> {path}", file=sys.stderr)
+        return 0
+    export_entity(args.entity, args.output, args.format, args.gzip)
+    return 0
+
+
+def command_import(args):
+    fmt = args.format or bulk.detect_format(args.file)
+    if fmt is None:
+        sys.exit("قالب فایل مشخص نیست؛ --format csv یا ndjson بدهید")
+    # ایندکس جستجوی مقالات / گالری بعد از ورود دوباره ساخته می‌شود
+    search.init_search_index(engine)
+    with open(args.file, "rb") as raw:
+        report = bulk.import_file(args.entity, raw, fmt, engine, dry_run=args.dry_run, batch_size=args.batch_size)
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
+    return 1 if report["failed"] or report["aborted"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="موجودیت‌ها، کلید upsert و ستون‌ها")
+
+    export_parser = commands.add_parser("export", help="خروجی یک موجودیت یا all")
+    export_parser.add_argument("entity", choices=[*bulk.ENTITIES, "all"])
+    export_parser.add_argument("-o", "--output", help="فایل (یا پوشه برای all)؛ پیش‌فرض stdout")
+    export_parser.add_argument("--format", choices=list(bulk.FORMATS), default="ndjson")
+    export_parser.add_argument("--gzip", action="store_true")
+
+    import_parser = commands.add_parser(
+        "import",
+        help="ورود فایل NDJSON / CSV (کش‌های سرور در حال اجرا تا پایان TTL کهنه می‌مانند)",
+    )
+    import_parser.add_argument("entity", choices=list(bulk.ENTITIES))
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=list(bulk.FORMATS))
+    import_parser.add_argument("--dry-run", action="store_true", help="فقط اعتبارسنجی")
+    import_parser.add_argument("--batch-size", type=int)
+
+    args = parser.parse_args()
+    init_db()
+    handler = {"list": command_list, "export": command_export, "import": command_import}[args.command]
+    sys.exit(handler(args) or 0)
+
+
+if __name__ == "__main__":
+    main()
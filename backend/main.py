@@ -1,15 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import os
 
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from app.config import settings
-from app.database import init_db, get_db
-from app.routes import articles, gallery, other, auth_routes, upload, admin, videos
-from app import models, auth, schemas
+from app.database import init_db, get_db, engine, async_engine, read_async_engines, mark_primary_sticky
+from app.routes import articles, gallery, other, auth_routes, upload, admin, videos, home
+from app import models, auth, schemas, search, view_counter, visit_dictionary, visit_queue, visit_rollup, visit_partitions
+from app.response_cache import ResponseCacheMiddleware
+from app.serialization import ORJSONResponse
 from sqlalchemy.orm import Session
 
 
@@ -21,6 +24,11 @@ async def lifespan(app: FastAPI):
     
     # ایجاد جداول دیتابیس
     init_db()
+    search.init_search_index()
+    visit_partitions.upgrade_month_tables(engine)
+    migrated = visit_dictionary.migrate_legacy(engine)
+    if migrated["converted"] or migrated["dropped"]:
+        print(f"✅ Visits dictionary-encoded: {migrated['converted']}, rollups rebuilt: {migrated['rebuilt']}")
     print("✅ Database initialized")
     
     # ایجاد کاربر ادمین اولیه
@@ -51,20 +59,46 @@ async def lifespan(app: FastAPI):
     backend_url = os.getenv("BACKEND_URL", "http://localhost:8000")
     print(f"🌐 BACKEND_URL: {backend_url}")
     
+    # flush دوره‌ای شمارنده‌های بازدید
+    view_flusher = asyncio.create_task(view_counter.run_flusher(async_engine))
+    visit_flusher = asyncio.create_task(visit_queue.run_flusher(async_engine))
+    rollup_worker = asyncio.create_task(visit_rollup.run_worker(engine))
+    partition_worker = asyncio.create_task(visit_partitions.run_worker(engine))
+    
     yield
     
     # Shutdown
     print("👋 Shutting down...")
+    for flusher in (view_flusher, visit_flusher, rollup_worker, partition_worker):
+        flusher.cancel()
+        try:
+            await flusher
+        except asyncio.CancelledError:
+            pass
+    flushed = await view_counter.flush(async_engine)
+    if flushed:
+        print(f"✅ Flushed views for {flushed} rows")
+    flushed = await visit_queue.flush(async_engine)
+    if flushed:
+        print(f"✅ Flushed {flushed} queued visits")
+    await async_engine.dispose()
+    for read_engine in read_async_engines:
+        await read_engine.dispose()
 
 
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc"
 )
 
+# کش پاسخ GETهای عمومی؛ پیش از CORS اضافه می‌شود تا داخل آن قرار بگیرد
+# و هدرهای CORS روی پاسخ‌های کش شده هم اعمال شوند
+app.add_middleware(ResponseCacheMiddleware)
+
 # CORS Configuration - Allow all origins in development, restrict in production
 allowed_origins = settings.get_allowed_origins()
 
@@ -76,6 +110,7 @@ if os.getenv("CODESPACES") == "true":
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
         allow_headers=["*"],
+        expose_headers=["Content-Disposition"],
         max_age=600,
     )
 else:
@@ -85,9 +120,18 @@ else:
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
         allow_headers=["*"],
+        expose_headers=["Content-Disposition"],
         max_age=600,
     )
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """پس از هر نوشتن موفق ادمین، خواندن‌های او مدتی از primary انجام شود"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_primary_sticky(request.headers.get("authorization"))
+    return response
+
 # Mount static files directory
 uploads_dir = Path(__file__).parent / "uploads"
 uploads_dir.mkdir(parents=True, exist_ok=True)
@@ -123,6 +167,7 @@ app.include_router(other.router)
 app.include_router(upload.router)
 app.include_router(admin.router)
 app.include_router(videos.router)
+app.include_router(home.router)
 
 @app.get("/")
 def root():
@@ -20,6 +20,56 @@ const useMockDataFallback = async (mockDataFn) => {
   }
 }
 
+// ============= HOME API =============
+
+// درخواست /api/home فقط تا وقتی در حال اجراست بین بخش‌های صفحه اصلی مشترک است؛
+// بعد از پایان، فراخوانی بعدی دوباره می‌پرسد تا ویرایش‌های ادمین دیده شود
+let homeRequest = null
+
+// اسلایدرهایی که از /api/home یا /api/sliders آمده‌اند (id -> { slider, at })
+const SLIDER_CACHE_TTL_MS = 60 * 1000
+const sliderCache = new Map()
+
+const rememberSliders = (sliders = []) => {
+  const at = Date.now()
+  sliders.forEach(slider => sliderCache.set(slider.id, { slider, at }))
+}
+
+// اسلایدر کش شده اگر هنوز تازه باشد؛ مورد منقضی حذف می‌شود
+const cachedSlider = (id) => {
+  const entry = sliderCache.get(id)
+  if (!entry) return undefined
+  if (Date.now() - entry.at > SLIDER_CACHE_TTL_MS) {
+    sliderCache.delete(id)
+    return undefined
+  }
+  return entry.slider
+}
+
+// اسلایدرهای embed شده با expand=slider در فیلد slider هر آیتم
+const rememberEmbeddedSliders = (items = []) => {
+  rememberSliders(items.map(item => item.slider).filter(Boolean))
+}
+
+/**
+ * دریافت همه بخش‌های صفحه اصلی در یک درخواست
+ * (sliders, services, statistics, testimonials, certificates, videos, articles, gallery)
+ * @returns {Promise<Object>} { data: { ...sections } }
+ */
+export const getHome = () => {
+  if (!homeRequest) {
+    homeRequest = apiClient.get('/api/home')
+      .then(response => {
+        rememberSliders(response.data?.data?.sliders)
+        return response.data
+      })
+      .finally(() => {
+        homeRequest = null
+      })
+  }
+  return homeRequest
+}
+
 // ============= SLIDERS API =============
 
 /**
@@ -30,7 +80,10 @@ const useMockDataFallback = async (mockDataFn) => {
 export const getSlider = async (sliderId) => {
   try {
     if (!sliderId) return { data: null }
+    const cached = cachedSlider(sliderId)
+    if (cached) return { data: cached }
     const response = await apiClient.get(`/api/sliders/${sliderId}`)
+    if (response.data?.data) rememberSliders([response.data.data])
     return response.data
   } catch (error) {
     console.error('Error fetching slider:', error)
@@ -38,6 +91,24 @@ export const getSlider = async (sliderId) => {
   }
 }
 
+/**
+ * دریافت چند اسلایدر با یک درخواست
+ * @param {Array<Number>} ids - شناسه‌های اسلایدر
+ * @returns {Promise<Object>} { data: [sliders...] }
+ */
+export const getSlidersByIds = async (ids = []) => {
+  const missing = [...new Set(ids.filter(id => id && !cachedSlider(id)))]
+  try {
+    if (missing.length) {
+      const response = await apiClient.get('/api/sliders', { params: { ids: missing.join(',') } })
+      rememberSliders(response.data?.data)
+    }
+  } catch (error) {
+    console.error('Error fetching sliders:', error)
+  }
+  return { data: ids.map(id => sliderCache.get(id)?.slider).filter(Boolean) }
+}
+
 /**
  * دریافت تمام اسلایدرها (عمومی)
  * @returns {Promise<Object>} { data: [sliders...] }
@@ -45,6 +116,7 @@ export const getSlider = async (sliderId) => {
 export const getSliders = async () => {
   try {
     const response = await apiClient.get('/api/sliders')
+    rememberSliders(response.data?.data)
     return response.data
   } catch (error) {
     console.error('Error fetching sliders:', error)
@@ -61,8 +133,9 @@ export const getSliders = async () => {
  */
 export const getArticles = async (params = {}) => {
   try {
-    // استفاده از API واقعی
-    const response = await apiClient.get('/api/articles', { params })
+    // استفاده از API واقعی؛ اسلایدر هر مقاله در همان پاسخ می‌آید
+    const response = await apiClient.get('/api/articles', { params: { expand: 'slider', ...params } })
+    rememberEmbeddedSliders(response.data?.data)
     return response.data
   } catch (error) {
     console.error('Error fetching articles:', error)
@@ -160,7 +233,8 @@ export const deleteArticle = async (id) => {
  */
 export const getGalleryItems = async (params = {}) => {
   try {
-    const response = await apiClient.get('/api/gallery', { params })
+    const response = await apiClient.get('/api/gallery', { params: { expand: 'slider', ...params } })
+    rememberEmbeddedSliders(response.data?.data)
     return response.data
   } catch (error) {
     console.error('Error fetching gallery items:', error)
@@ -246,7 +320,8 @@ export const createTestimonial = async (testimonialData) => {
  */
 export const getServices = async () => {
   try {
-    const response = await apiClient.get('/api/services')
+    const response = await apiClient.get('/api/services', { params: { expand: 'slider' } })
+    rememberEmbeddedSliders(response.data?.data)
     return response.data
   } catch (error) {
     console.error('Error fetching services:', error)
@@ -277,7 +352,8 @@ export const getService = async (id) => {
  */
 export const getCertificates = async () => {
   try {
-    const response = await apiClient.get('/api/certificates')
+    const response = await apiClient.get('/api/certificates', { params: { expand: 'slider' } })
+    rememberEmbeddedSliders(response.data?.data)
     return response.data
   } catch (error) {
     console.error('Error fetching certificates:', error)
@@ -326,18 +402,56 @@ export const getStatistics = async () => {
 
 // ============= VISITS API =============
 
-export const logVisit = async ({ path, referer }) => {
+// بازدیدها در مرورگر جمع و با یک درخواست به /api/visit/batch فرستاده می‌شوند
+const VISIT_BATCH_SIZE = 20
+const VISIT_FLUSH_DELAY_MS = 5000
+let pendingVisits = []
+let visitFlushTimer = null
+
+/**
+ * ارسال بازدیدهای صف شده
+ * @param {Boolean} useBeacon - هنگام بستن صفحه با navigator.sendBeacon
+ */
+export const flushVisits = async (useBeacon = false) => {
+  clearTimeout(visitFlushTimer)
+  visitFlushTimer = null
+  if (!pendingVisits.length) return
+  const events = pendingVisits
+  pendingVisits = []
+
+  // text/plain تا sendBeacon بین دامنه‌ای preflight نخواهد
+  if (useBeacon && navigator.sendBeacon) {
+    const body = new Blob([JSON.stringify(events)], { type: 'text/plain' })
+    if (navigator.sendBeacon(`${apiClient.defaults.baseURL}/api/visit/batch`, body)) return
+  }
   try {
-    await apiClient.post('/api/visit', {
-      path,
-      referer: referer || undefined
-    })
+    await apiClient.post('/api/visit/batch', events)
   } catch (error) {
     // Silent fail to avoid impacting UX
     console.warn('Visit log failed', error?.message || error)
   }
 }
 
+export const logVisit = ({ path, referer }) => {
+  pendingVisits.push({
+    path,
+    referer: referer || undefined,
+    client_ts: new Date().toISOString()
+  })
+  if (pendingVisits.length >= VISIT_BATCH_SIZE) {
+    flushVisits()
+  } else if (!visitFlushTimer) {
+    visitFlushTimer = setTimeout(() => flushVisits(), VISIT_FLUSH_DELAY_MS)
+  }
+}
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', () => flushVisits(true))
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushVisits(true)
+  })
+}
+
 // ============= CONTACT API =============
 
 /**
@@ -423,6 +537,82 @@ export const getVisitReport = async (params = {}) => {
   return response.data
 }
 
+/**
+ * اتصال به جریان زنده بازدیدها (Server-Sent Events)
+ * EventSource هدر Authorization نمی‌فرستد، پس جریان با fetch خوانده می‌شود؛
+ * پس از قطع یا بسته شدن اتصال با Last-Event-ID دوباره وصل می‌شود.
+ * @param {Object} handlers - onSnapshot، onVisits، onCounters و onStatus
+ * @returns {Function} تابع قطع اتصال
+ */
+export const subscribeLiveVisits = (handlers = {}) => {
+  const controller = new AbortController()
+  let lastEventId = null
+  let retryMs = 3000
+
+  const dispatch = (block) => {
+    let event = 'message'
+    let data = ''
+    for (const line of block.split('\n')) {
+      const separator = line.indexOf(':')
+      const field = separator === -1 ? line : line.slice(0, separator)
+      const value = separator === -1 ? '' : line.slice(separator + 1).replace(/^ /, '')
+      if (field === 'event') event = value
+      else if (field === 'data') data += value
+      else if (field === 'id') lastEventId = value
+      else if (field === 'retry' && /^\d+$/.test(value)) retryMs = Number(value)
+    }
+    if (!data) return
+    const payload = JSON.parse(data)
+    if (event === 'snapshot') handlers.onSnapshot?.(payload)
+    else if (event === 'visits') handlers.onVisits?.(payload)
+    else if (event === 'counters') handlers.onCounters?.(payload)
+  }
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const headers = { Accept: 'text/event-stream' }
+        const adminToken = localStorage.getItem('admin_token')
+        if (adminToken) headers.Authorization = `Bearer ${adminToken}`
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId
+        const response = await fetch(`${apiClient.defaults.baseURL}/api/admin/visits/stream`, {
+          headers,
+          signal: controller.signal
+        })
+        if (response.status === 401 || response.status === 403) {
+          handlers.onStatus?.('unauthorized')
+          return
+        }
+        if (!response.ok) throw new Error(`HTTP ${response.status}`)
+        handlers.onStatus?.('open')
+
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ''
+        for (;;) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true }).replace(/\r\n?/g, '\n')
+          let boundary
+          while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            dispatch(buffer.slice(0, boundary))
+            buffer = buffer.slice(boundary + 2)
+          }
+        }
+        // سرور هر اتصال را پس از مدتی می‌بندد؛ اتصال دوباره بدون تاخیر
+        continue
+      } catch (error) {
+        if (controller.signal.aborted) return
+        handlers.onStatus?.('reconnecting')
+      }
+      await delay(retryMs)
+    }
+  }
+
+  connect()
+  return () => controller.abort()
+}
+
 /**
  * دریافت تمام مقالات (ادمین)
  * @returns {Promise<Array>} لیست مقالات
@@ -432,6 +622,17 @@ export const getAdminArticles = async () => {
   return response.data
 }
 
+/**
+ * دریافت کامل یک مقاله برای ویرایش (ادمین)
+ * لیست ادمین full_content را برنمی‌گرداند
+ * @param {Number} id - شناسه مقاله
+ * @returns {Promise<Object>} مقاله
+ */
+export const getAdminArticle = async (id) => {
+  const response = await apiClient.get(`/api/admin/articles/${id}`)
+  return response.data
+}
+
 /**
  * ایجاد مقاله جدید (ادمین)
  * @param {Object} articleData - اطلاعات مقاله
@@ -582,6 +783,28 @@ export const deleteAdminContact = async (id) => {
   return response.data
 }
 
+/**
+ * دانلود خروجی CSV / NDJSON (ادمین)
+ * @param {String} dataset - visits، contacts یا newsletter
+ * @param {Object} params - format، start، end، gzip، read، active
+ */
+export const downloadAdminExport = async (dataset, params = {}) => {
+  const response = await apiClient.get(`/api/admin/exports/${dataset}`, {
+    params,
+    responseType: 'blob',
+    timeout: 0
+  })
+  const disposition = response.headers['content-disposition'] || ''
+  const match = disposition.match(/filename="([^"]+)"/)
+  const extension = `${params.format || 'csv'}${params.gzip ? '.gz' : ''}`
+  const url = URL.createObjectURL(response.data)
+  const link = document.createElement('a')
+  link.href = url
+  link.download = match ? match[1] : `${dataset}.${extension}`
+  link.click()
+  URL.revokeObjectURL(url)
+}
+
 /**
  * آپلود فایل (عکس)
  * @param {FormData} formData - فایل را در FormData قرار دهید
@@ -827,6 +1050,7 @@ export const adminService = {
   uploadFile: uploadFile,
   getDashboardStats: getAdminDashboardStats,
   getArticles: getAdminArticles,
+  getArticle: getAdminArticle,
   createArticle: createAdminArticle,
   updateArticle: updateAdminArticle,
   deleteArticle: deleteAdminArticle,
@@ -842,6 +1066,7 @@ export const adminService = {
   getContacts: getAdminContacts,
   markContactRead: markAdminContactRead,
   deleteContact: deleteAdminContact,
+  downloadExport: downloadAdminExport,
   getSliders: getAdminSliders,
   createSlider: createAdminSlider,
   updateSlider: updateAdminSlider,
@@ -860,6 +1085,7 @@ export const adminService = {
   // Visits
   getVisitSummary,
   getVisitReport,
+  subscribeLiveVisits,
   
   // Services
   getServices: getAdminServices,
@@ -882,6 +1108,9 @@ export default {
   // Admin
   adminService,
   
+  // Home
+  getHome,
+  
   // Services
   getServices,
   getService,
@@ -908,6 +1137,7 @@ export default {
   // Statistics
   getStatistics,
   logVisit,
+  flushVisits,
   
   // Contact
   sendContactForm,